@@ -0,0 +1,386 @@
+document.addEventListener('DOMContentLoaded', function () {
+    var modalEl = document.getElementById('historyModal');
+    if (!modalEl) {
+        return;
+    }
+
+    var triggers = document.querySelectorAll('[data-history-modal="true"]');
+    if (!triggers.length) {
+        return;
+    }
+
+    var closeButtons = modalEl.querySelectorAll('[data-dismiss="modal"], [data-bs-dismiss="modal"], [data-history-close="true"]');
+    var backdropEl = null;
+
+    var pages = Array.prototype.slice.call(modalEl.querySelectorAll('[data-history-page]'));
+    var gotoButtons = Array.prototype.slice.call(modalEl.querySelectorAll('[data-history-goto]'));
+    var currentPage = pages.length ? (pages.length - 1) : 0;
+    var historyScaleFactor = 0.90;
+    var historyFooterReserve = 76;
+    var historyScrollable = modalEl.getAttribute('data-history-scrollable') === '1';
+    var historyLazy = modalEl.getAttribute('data-history-lazy') === '1';
+    var viewerId = parseInt(modalEl.getAttribute('data-viewer-id') || '0', 10);
+    var requestedRounds = {};
+    var cachedUnifiedScale = null;
+
+    function escapeHtml(value) {
+        return String(value === null || value === undefined ? '' : value)
+            .replace(/&/g, '&amp;')
+            .replace(/</g, '&lt;')
+            .replace(/>/g, '&gt;')
+            .replace(/"/g, '&quot;');
+    }
+
+    function renderRoundTable(round) {
+        var players = round.players || [];
+        var html = [];
+        html.push('<table class="matrix-table matrix-table--inputs history-result-table">');
+        html.push('<colgroup><col style="width: var(--punish-label-width);">');
+        players.forEach(function () {
+            html.push('<col style="width: var(--punish-bar-width);">');
+        });
+        html.push('</colgroup><thead><tr><th></th>');
+        players.forEach(function (entry) {
+            var label = entry.id_in_group === viewerId ? 'あなた' : 'プレイヤー ' + entry.id_in_group;
+            html.push('<th>' + escapeHtml(label) + '</th>');
+        });
+        html.push('</tr><tr><th class="matrix-note">投資MU</th>');
+        players.forEach(function (entry) {
+            html.push(
+                '<th><div class="bar-track bar-track--compact bar-track--blue"' +
+                ' data-value="' + escapeHtml(entry.contribution_display) + '"' +
+                ' data-max="' + escapeHtml(entry.endowment_display) + '">' +
+                '<div class="bar-fill"></div>' +
+                '<span class="bar-text">' + escapeHtml(entry.contribution_display) + ' / ' + escapeHtml(entry.endowment_display) + '</span>' +
+                '</div></th>'
+            );
+        });
+        html.push('</tr>');
+        if (round.has_punishment) {
+            html.push('<tr><th class="matrix-note">減点コスト</th>');
+            players.forEach(function (entry) {
+                html.push(
+                    '<th><div class="dp-cost-box">' +
+                    '<div class="dp-cost-fill" style="width: ' + escapeHtml(entry.punishment_sent_fill_percent) + '%;"></div>' +
+                    '<span class="dp-cost-text">' + escapeHtml(entry.punishment_sent_total_display) + ' / ' + escapeHtml(round.max_total_dp_display) + '</span>' +
+                    '</div></th>'
+                );
+            });
+            html.push('</tr>');
+        }
+        html.push('</thead>');
+        if (round.has_punishment) {
+            html.push('<tbody>');
+            (round.result_matrix_rows || []).forEach(function (row) {
+                var rowLabel = row.is_self ? 'あなた' : 'プレイヤー ' + row.giver_id;
+                html.push(
+                    '<tr><td class="matrix-note"><div class="player-row-label">' +
+                    '<span class="player-name">' + escapeHtml(rowLabel) + '</span>' +
+                    '<span class="power-tag">【' + escapeHtml(row.power_display) + '】</span>' +
+                    '</div></td>'
+                );
+                (row.cells || []).forEach(function (cell) {
+                    if (cell.is_self) {
+                        html.push('<td class="is-self">--</td>');
+                        return;
+                    }
+                    html.push(
+                        '<td class="matrix-slider-cell--static" style="--punish-fill: ' + escapeHtml(cell.fill_percent) + '%;">' +
+                        '<span class="slider-value">' + escapeHtml(cell.points_display) + '/' + escapeHtml(round.per_target_dp_limit) + '</span>' +
+                        '<span class="slider-effect">【' + escapeHtml(cell.effect_display) + '】</span>' +
+                        '</td>'
+                    );
+                });
+                html.push('</tr>');
+            });
+            html.push('</tbody>');
+        }
+        html.push('</table>');
+        return html.join('');
+    }
+
+    function requestHistoryPage(pageEl) {
+        if (!historyLazy || !pageEl || typeof liveSend !== 'function') {
+            return;
+        }
+        var target = pageEl.querySelector('.history-round-scale-target');
+        if (!target || target.getAttribute('data-history-pending') !== '1') {
+            return;
+        }
+        var roundNumber = parseInt(pageEl.getAttribute('data-round-number') || '0', 10);
+        if (!roundNumber || requestedRounds[roundNumber]) {
+            return;
+        }
+        requestedRounds[roundNumber] = true;
+        liveSend({history_rounds: [roundNumber]});
+    }
+
+    function receiveHistoryRounds(data) {
+        if (!data || !Array.isArray(data.history_rounds)) {
+            return;
+        }
+        data.history_rounds.forEach(function (round) {
+            var pageEl = modalEl.querySelector('[data-history-page][data-round-number="' + round.round_number + '"]');
+            var target = pageEl ? pageEl.querySelector('.history-round-scale-target') : null;
+            if (!target) {
+                return;
+            }
+            // Rounds already fetched stay in the DOM, so reopening the modal
+            // or paging back never asks the server again.
+            target.innerHTML = renderRoundTable(round);
+            target.removeAttribute('data-history-pending');
+        });
+        cachedUnifiedScale = null;
+        renderPager();
+    }
+
+    if (historyLazy && Array.isArray(window.liveRecvHandlers)) {
+        window.liveRecvHandlers.push(receiveHistoryRounds);
+    }
+
+    function withPageMeasurable(pageEl, fn) {
+        if (!pageEl) {
+            return null;
+        }
+        var wasHidden = window.getComputedStyle(pageEl).display === 'none';
+        var prev = {
+            display: pageEl.style.display,
+            visibility: pageEl.style.visibility,
+            position: pageEl.style.position,
+            left: pageEl.style.left,
+            top: pageEl.style.top,
+            pointerEvents: pageEl.style.pointerEvents,
+        };
+        if (wasHidden) {
+            pageEl.style.display = 'block';
+            pageEl.style.visibility = 'hidden';
+            pageEl.style.position = 'absolute';
+            pageEl.style.left = '-100000px';
+            pageEl.style.top = '0';
+            pageEl.style.pointerEvents = 'none';
+        }
+        var result = fn();
+        if (wasHidden) {
+            pageEl.style.display = prev.display;
+            pageEl.style.visibility = prev.visibility;
+            pageEl.style.position = prev.position;
+            pageEl.style.left = prev.left;
+            pageEl.style.top = prev.top;
+            pageEl.style.pointerEvents = prev.pointerEvents;
+        }
+        return result;
+    }
+
+    function measureNaturalBounds(pageEl) {
+        return withPageMeasurable(pageEl, function () {
+            var target = pageEl.querySelector('.history-round-scale-target');
+            var head = pageEl.querySelector('.history-round-head');
+            if (!target) {
+                return { width: 0, height: 0, headHeight: 0 };
+            }
+            target.style.transform = 'scale(1)';
+            var width = target.scrollWidth || target.getBoundingClientRect().width || 0;
+            var height = target.scrollHeight || target.getBoundingClientRect().height || 0;
+            var headHeight = head ? head.offsetHeight : 0;
+            return { width: width, height: height, headHeight: headHeight };
+        });
+    }
+
+    function computeUnifiedScale() {
+        if (!pages.length) {
+            return 1;
+        }
+        var modalBody = modalEl.querySelector('.modal-body');
+        var visiblePage = pages[currentPage] || pages[0];
+        if (!visiblePage || !modalBody) {
+            return 1;
+        }
+        var host = visiblePage.querySelector('.history-round-scale-host');
+        var hostWidth = host ? (host.clientWidth || modalBody.clientWidth || 0) : (modalBody.clientWidth || 0);
+        var bodyHeight = modalBody.clientHeight || 0;
+        if (!hostWidth) {
+            return 1;
+        }
+
+        var maxWidth = 0;
+        var maxHeight = 0;
+        var maxHeadHeight = 0;
+        pages.forEach(function (pageEl) {
+            var m = measureNaturalBounds(pageEl);
+            maxWidth = Math.max(maxWidth, m.width || 0);
+            maxHeight = Math.max(maxHeight, m.height || 0);
+            maxHeadHeight = Math.max(maxHeadHeight, m.headHeight || 0);
+        });
+
+        if (!maxWidth || !maxHeight) {
+            return 1;
+        }
+
+        var scaleX = hostWidth / maxWidth;
+        var scale = 1;
+        if (historyScrollable) {
+            scale = Math.min(1, scaleX) * historyScaleFactor;
+        } else {
+            var availableHeight = Math.max(0, bodyHeight - maxHeadHeight - historyFooterReserve);
+            if (!availableHeight) {
+                return 1;
+            }
+            var scaleY = availableHeight / maxHeight;
+            scale = Math.min(1, scaleX, scaleY) * historyScaleFactor;
+        }
+        return Math.max(0.1, Math.min(1, scale));
+    }
+
+    function fitHistoryPage(pageEl, forcedScale) {
+        if (!pageEl) {
+            return;
+        }
+        var host = pageEl.querySelector('.history-round-scale-host');
+        var target = pageEl.querySelector('.history-round-scale-target');
+        if (!host || !target) {
+            return;
+        }
+
+        target.style.transform = 'scale(1)';
+        host.style.height = 'auto';
+
+        var naturalHeight = target.scrollHeight || target.getBoundingClientRect().height || 0;
+        if (!naturalHeight) {
+            return;
+        }
+
+        var scale = Number.isFinite(forcedScale) ? forcedScale : computeUnifiedScale();
+        scale = Math.max(0.1, Math.min(1, scale));
+
+        target.style.transform = 'scale(' + scale.toFixed(4) + ')';
+        host.style.height = Math.ceil(naturalHeight * scale) + 'px';
+    }
+
+    function renderPager() {
+        pages.forEach(function (pageEl, index) {
+            pageEl.style.display = index === currentPage ? 'block' : 'none';
+        });
+        gotoButtons.forEach(function (btn, index) {
+            if (index === currentPage) {
+                btn.classList.add('is-active');
+            } else {
+                btn.classList.remove('is-active');
+            }
+        });
+        if (typeof initBarTracks === 'function') {
+            initBarTracks();
+        }
+        if (!Number.isFinite(cachedUnifiedScale)) {
+            cachedUnifiedScale = computeUnifiedScale();
+        }
+        fitHistoryPage(pages[currentPage], cachedUnifiedScale);
+        if (modalEl.classList.contains('show')) {
+            requestHistoryPage(pages[currentPage]);
+        }
+    }
+
+    function resetPager() {
+        currentPage = pages.length ? (pages.length - 1) : 0;
+        cachedUnifiedScale = null;
+        renderPager();
+    }
+
+    if (gotoButtons.length) {
+        gotoButtons.forEach(function (btn) {
+            btn.addEventListener('click', function () {
+                var idx = parseInt(btn.getAttribute('data-history-goto') || '0', 10);
+                if (!Number.isFinite(idx) || idx < 0 || idx >= pages.length) {
+                    return;
+                }
+                currentPage = idx;
+                renderPager();
+            });
+        });
+    }
+
+    window.addEventListener('resize', function () {
+        cachedUnifiedScale = null;
+        renderPager();
+    });
+
+    function createBackdrop() {
+        backdropEl = document.createElement('div');
+        backdropEl.className = 'custom-history-backdrop';
+        document.body.appendChild(backdropEl);
+    }
+
+    function removeBackdrop() {
+        if (backdropEl && backdropEl.parentNode) {
+            backdropEl.parentNode.removeChild(backdropEl);
+        }
+        backdropEl = null;
+    }
+
+    function showModal(event) {
+        if (event) {
+            event.preventDefault();
+        }
+        resetPager();
+        requestHistoryPage(pages[currentPage]);
+
+        if (window.bootstrap && window.bootstrap.Modal) {
+            var modalInstance = window.bootstrap.Modal.getOrCreateInstance(modalEl);
+            modalInstance.show();
+            return;
+        }
+
+        var jq = window.jQuery || window.$;
+        if (jq && typeof jq(modalEl).modal === 'function') {
+            jq(modalEl).modal('show');
+            return;
+        }
+
+        if (modalEl.classList.contains('manual-show')) {
+            return;
+        }
+
+        modalEl.classList.add('manual-show', 'show');
+        modalEl.removeAttribute('aria-hidden');
+        createBackdrop();
+        document.body.classList.add('modal-open');
+    }
+
+    function hideModal(event) {
+        if (event) {
+            event.preventDefault();
+        }
+
+        if (window.bootstrap && window.bootstrap.Modal) {
+            var modalInstance = window.bootstrap.Modal.getOrCreateInstance(modalEl);
+            modalInstance.hide();
+            return;
+        }
+
+        var jq = window.jQuery || window.$;
+        if (jq && typeof jq(modalEl).modal === 'function') {
+            jq(modalEl).modal('hide');
+            return;
+        }
+
+        modalEl.classList.remove('manual-show', 'show');
+        modalEl.setAttribute('aria-hidden', 'true');
+        removeBackdrop();
+        document.body.classList.remove('modal-open');
+    }
+
+    triggers.forEach(function (btn) {
+        btn.addEventListener('click', showModal);
+    });
+
+    closeButtons.forEach(function (btn) {
+        btn.addEventListener('click', hideModal);
+    });
+
+    modalEl.addEventListener('click', function (event) {
+        if (event.target === modalEl) {
+            hideModal(event);
+        }
+    });
+
+    renderPager();
+});
@@ -0,0 +1,277 @@
+// Pages register handlers here; liveRecv fans each live_method reply out to them.
+window.liveRecvHandlers = window.liveRecvHandlers || [];
+
+function liveRecv(data) {
+    window.liveRecvHandlers.forEach(function (handler) {
+        handler(data);
+    });
+}
+
+function initBarTracks() {
+    document.querySelectorAll('.bar-track[data-max]').forEach(function(track) {
+        var value = parseFloat(track.dataset.value || '0');
+        var max = parseFloat(track.dataset.max || '0');
+        if (!Number.isFinite(value)) {
+            value = 0;
+        }
+        if (!Number.isFinite(max) || max <= 0) {
+            max = 1;
+        }
+        var pct = Math.max(0, Math.min(100, (value / max) * 100));
+        var fill = track.querySelector('.bar-fill');
+        if (fill) {
+            fill.style.width = pct.toFixed(2) + '%';
+        }
+    });
+}
+
+function initVerticalBars() {
+    document.querySelectorAll('.vertical-bar[data-power]').forEach(function(bar) {
+        var value = parseFloat(bar.dataset.power || '0');
+        if (!Number.isFinite(value)) {
+            value = 0;
+        }
+        var container = bar.closest('[data-power-max]');
+        var maxValue = container ? parseFloat(container.dataset.powerMax || '0') : 0;
+        if (!Number.isFinite(maxValue) || maxValue <= 0) {
+            maxValue = 1;
+        }
+        var pct = Math.max(0, Math.min(100, (value / maxValue) * 100));
+        var fill = bar.querySelector('.vertical-bar-fill');
+        if (fill) {
+            fill.style.height = pct.toFixed(2) + '%';
+        }
+    });
+}
+
+function formatTimerSeconds(totalSeconds) {
+    var minutes = Math.floor(totalSeconds / 60);
+    var seconds = Math.floor(totalSeconds % 60);
+    if (seconds < 10) {
+        return minutes + ':0' + seconds;
+    }
+    return minutes + ':' + seconds;
+}
+
+function resolveSliderColor(rangeInput) {
+    if (!rangeInput) {
+        return '#3b74c6';
+    }
+    if (rangeInput.classList.contains('ui-slider--yellow')) {
+        return '#c7972f';
+    }
+    return '#3b74c6';
+}
+
+function updateSliderFill(rangeInput) {
+    if (!rangeInput) {
+        return;
+    }
+    var min = parseFloat(rangeInput.min || '0');
+    var max = parseFloat(rangeInput.max || '0');
+    var value = parseFloat(rangeInput.value || '0');
+    if (!Number.isFinite(min)) {
+        min = 0;
+    }
+    if (!Number.isFinite(max) || max <= min) {
+        max = min + 1;
+    }
+    if (!Number.isFinite(value)) {
+        value = min;
+    }
+    var pct = ((value - min) / (max - min)) * 100;
+    pct = Math.max(0, Math.min(100, pct));
+    var color = resolveSliderColor(rangeInput);
+    if (rangeInput.classList.contains('ui-slider--vertical-rotated')) {
+        rangeInput.style.background = 'linear-gradient(to right, ' + color + ' 0%, ' + color + ' ' + pct.toFixed(2) + '%, #2a2a2a ' + pct.toFixed(2) + '%, #2a2a2a 100%)';
+    } else if (rangeInput.classList.contains('ui-slider--vertical')) {
+        rangeInput.style.background = 'linear-gradient(to top, ' + color + ' 0%, ' + color + ' ' + pct.toFixed(2) + '%, #2a2a2a ' + pct.toFixed(2) + '%, #2a2a2a 100%)';
+    } else {
+        rangeInput.style.background = 'linear-gradient(to right, ' + color + ' 0%, ' + color + ' ' + pct.toFixed(2) + '%, #2a2a2a ' + pct.toFixed(2) + '%, #2a2a2a 100%)';
+    }
+}
+window.updateSliderFill = updateSliderFill;
+
+function initInputSliders() {
+    document.querySelectorAll('.input-with-slider').forEach(function (wrapper) {
+        var numberInput = wrapper.querySelector('input.js-slider-input');
+        if (!numberInput) {
+            numberInput = wrapper.querySelector('input[type="number"]');
+        }
+        if (!numberInput) {
+            numberInput = wrapper.querySelector('input[type="text"]');
+        }
+        var rangeInput = wrapper.querySelector('input[type="range"]');
+        if (!numberInput || !rangeInput) {
+            return;
+        }
+        var alreadyBound = wrapper.dataset.sliderBound === '1';
+
+        var min = numberInput.getAttribute('min');
+        var max = numberInput.getAttribute('max');
+        var step = numberInput.getAttribute('step');
+        if (min !== null && min !== '') {
+            rangeInput.setAttribute('min', min);
+        }
+        if (max !== null && max !== '') {
+            rangeInput.setAttribute('max', max);
+        }
+        if (step !== null && step !== '') {
+            rangeInput.setAttribute('step', step);
+        }
+
+        var currentValue = parseFloat(numberInput.value);
+        if (Number.isFinite(currentValue)) {
+            rangeInput.value = currentValue;
+        }
+        updateSliderFill(rangeInput);
+
+        if (alreadyBound) {
+            return;
+        }
+
+        numberInput.addEventListener('input', function () {
+            var nextValue = parseFloat(numberInput.value);
+            if (Number.isFinite(nextValue)) {
+                rangeInput.value = nextValue;
+            }
+            updateSliderFill(rangeInput);
+        });
+
+        numberInput.addEventListener('change', function () {
+            var nextValue = parseFloat(numberInput.value);
+            if (Number.isFinite(nextValue)) {
+                rangeInput.value = nextValue;
+            }
+            updateSliderFill(rangeInput);
+        });
+
+        rangeInput.addEventListener('input', function () {
+            numberInput.value = rangeInput.value;
+            numberInput.dispatchEvent(new Event('input', { bubbles: true }));
+            updateSliderFill(rangeInput);
+        });
+
+        rangeInput.addEventListener('change', function () {
+            numberInput.value = rangeInput.value;
+            numberInput.dispatchEvent(new Event('change', { bubbles: true }));
+            updateSliderFill(rangeInput);
+        });
+        wrapper.dataset.sliderBound = '1';
+    });
+}
+window.initInputSliders = initInputSliders;
+
+function initFloatingTimer() {
+    var timerEl = document.querySelector('.round-timer-fixed');
+    if (!timerEl) {
+        return;
+    }
+    var seconds = parseFloat(timerEl.dataset.timeoutSeconds || '');
+    if (!Number.isFinite(seconds) || seconds <= 0) {
+        return;
+    }
+    var barEl = timerEl.querySelector('.round-timer-bar');
+    var remainingEl = timerEl.querySelector('.round-timer-remaining');
+    var start = Date.now();
+    var durationMs = seconds * 1000;
+
+    function tick() {
+        var elapsed = Date.now() - start;
+        var remainingMs = Math.max(0, durationMs - elapsed);
+        var remainingSec = Math.ceil(remainingMs / 1000);
+        var pct = (remainingMs / durationMs) * 100;
+        if (barEl) {
+            barEl.style.width = pct.toFixed(2) + '%';
+        }
+        if (remainingEl) {
+            remainingEl.textContent = formatTimerSeconds(remainingSec);
+        }
+        if (remainingMs <= 0) {
+            clearInterval(intervalId);
+        }
+    }
+
+    tick();
+    var intervalId = setInterval(tick, 200);
+}
+
+document.addEventListener('DOMContentLoaded', function() {
+    initFloatingTimer();
+    initInputSliders();
+    initBarTracks();
+    initVerticalBars();
+    if (document && document.documentElement) {
+        document.documentElement.setAttribute('lang', 'ja');
+    }
+    var warningEl = document.getElementById('dropout-warning-overlay');
+    var warningActive = false;
+    if (window.js_vars && typeof window.js_vars.dropout_warning_active !== 'undefined') {
+        warningActive = !!window.js_vars.dropout_warning_active;
+    } else if (warningEl) {
+        warningActive = warningEl.dataset.dropoutWarning === '1';
+    }
+    if (warningEl && warningActive) {
+        warningEl.classList.add('is-active');
+    }
+    var warningDismiss = document.getElementById('dropout-warning-dismiss');
+    if (warningDismiss && warningEl) {
+        warningDismiss.addEventListener('click', function () {
+            warningEl.classList.remove('is-active');
+            if (typeof liveSend === 'function') {
+                liveSend({dismiss_dropout_warning: true});
+            }
+        });
+    }
+    document.querySelectorAll('[required]').forEach(function(el) {
+        el.addEventListener('invalid', function () {
+            this.setCustomValidity('この項目は必須です。');
+        });
+        el.addEventListener('input', function () {
+            this.setCustomValidity('');
+        });
+        el.addEventListener('change', function () {
+            this.setCustomValidity('');
+            if (this.type === 'radio' && this.name) {
+                document.querySelectorAll('input[type="radio"][name="' + this.name + '"]').forEach(function(radio) {
+                    radio.setCustomValidity('');
+                });
+            }
+        });
+    });
+
+    document.addEventListener('keydown', function(event) {
+        if (event.key !== 'Enter') {
+            return;
+        }
+
+        var active = document.activeElement;
+        var tag = active ? active.tagName : '';
+        if (active && (
+            active.isContentEditable ||
+            tag === 'INPUT' ||
+            tag === 'TEXTAREA' ||
+            tag === 'SELECT'
+        )) {
+            return;
+        }
+
+        var nextButton = document.querySelector('button.otree-next-button');
+        if (nextButton && nextButton.disabled) {
+            return;
+        }
+
+        var form = document.querySelector('form.otree-form');
+        if (!form) {
+            return;
+        }
+
+        event.preventDefault();
+
+        if (typeof form.requestSubmit === 'function') {
+            form.requestSubmit();
+        } else {
+            form.submit();
+        }
+    });
+});
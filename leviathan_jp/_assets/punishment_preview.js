@@ -0,0 +1,57 @@
+// Live preview of the punishment stage for the Punishment page. project()
+// applies the payoff engine (game/payoff.py compute_punishment_outcome) to
+// this player's own points, with js_vars.punishment_preview as input, and
+// rounds like the Currency fields the server stores.
+(function (root) {
+    // Currency(x): the exact value of x rounded half away from zero
+    function currency(value, decimals) {
+        if (value < 0) {
+            return -Number((-value).toFixed(decimals));
+        }
+        return Number(value.toFixed(decimals));
+    }
+
+    // pointsByTarget: {target id: points}. Losses and projected MU leave out
+    // what the other members give, which the page cannot know.
+    function project(preview, pointsByTarget) {
+        var decimals = preview.decimals;
+        var selfIndex = preview.ids.indexOf(preview.self_id);
+        var lossPerPoint = preview.effectiveness * preview.power[selfIndex];
+        var rawLoss = {};
+        var rawCost = 0;
+        var totalPoints = 0;
+        preview.ids.forEach(function (id) {
+            var points = id === preview.self_id ? 0 : Number(pointsByTarget[id] || 0);
+            rawLoss[id] = 0;
+            if (!Number.isFinite(points) || points <= 0) {
+                return;
+            }
+            rawLoss[id] = points * lossPerPoint;
+            rawCost += points * preview.cost_per_point;
+            totalPoints += points;
+        });
+        // Punishment.before_next_page caps the cost at the attempted cost (a Currency)
+        var attemptedCost = currency(totalPoints * preview.cost_per_point, decimals);
+        var cost = Math.min(rawCost, attemptedCost);
+
+        var loss = {};
+        var available = {};
+        preview.ids.forEach(function (id, index) {
+            var spent = id === preview.self_id ? cost : 0;
+            loss[id] = currency(rawLoss[id], decimals);
+            available[id] = currency(preview.available[index] - spent - rawLoss[id], decimals);
+        });
+        return {
+            points: totalPoints,
+            cost: currency(cost, decimals),
+            loss: loss,
+            available: available
+        };
+    }
+
+    var api = { project: project, currency: currency };
+    root.punishmentPreview = api;
+    if (typeof module === 'object' && module.exports) {
+        module.exports = api;
+    }
+})(typeof window !== 'undefined' ? window : this);
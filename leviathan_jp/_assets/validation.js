@@ -0,0 +1,242 @@
+// Browser side of game/validation.py: applies the page's js_vars.validation
+// spec (validation.client_spec) to the form before it is submitted. Keep the
+// checks in step with the Python module; the server still validates every
+// submission, including the quiz answers, which the browser never receives.
+(function (root) {
+    // Same resolution as ledger.INPUT_DECIMALS (9 decimals)
+    var INPUT_SCALE = 1e9;
+
+    var INT_PATTERN = /^\s*[+-]?\d+(?:_\d+)*\s*$/;
+    var FLOAT_PATTERN = /^\s*[+-]?(?:(?:\d+(?:_\d+)*)?\.?\d+(?:_\d+)*|\d+(?:_\d+)*\.)(?:e[+-]?\d+(?:_\d+)*)?\s*$/i;
+    var SPECIAL_FLOAT_PATTERN = /^\s*([+-]?)(nan|inf|infinity)\s*$/i;
+
+    // int(key) in Python; null when it would raise
+    function pyInt(key) {
+        if (!INT_PATTERN.test(key)) {
+            return null;
+        }
+        return parseInt(key.replace(/_/g, ''), 10);
+    }
+
+    // float(value) in Python; null when it would raise
+    function pyFloat(value) {
+        if (typeof value === 'number') {
+            return value;
+        }
+        if (typeof value === 'boolean') {
+            return value ? 1 : 0;
+        }
+        if (typeof value !== 'string') {
+            return null;
+        }
+        var special = SPECIAL_FLOAT_PATTERN.exec(value);
+        if (special) {
+            if (special[2].toLowerCase() === 'nan') {
+                return NaN;
+            }
+            return special[1] === '-' ? -Infinity : Infinity;
+        }
+        if (!FLOAT_PATTERN.test(value)) {
+            return null;
+        }
+        return Number(value.replace(/_/g, '').trim());
+    }
+
+    function parseEdges(raw, targets) {
+        if (raw === null || raw === undefined || raw === '') {
+            return {};
+        }
+        var data;
+        try {
+            data = JSON.parse(raw);
+        } catch (error) {
+            return null;
+        }
+        if (data === null || typeof data !== 'object' || Array.isArray(data)) {
+            return null;
+        }
+        var edges = {};
+        var keys = Object.keys(data);
+        for (var i = 0; i < keys.length; i++) {
+            var target = pyInt(keys[i]);
+            var amount = pyFloat(data[keys[i]]);
+            if (target === null || amount === null || targets.indexOf(target) < 0) {
+                return null;
+            }
+            edges[target] = amount;
+        }
+        return edges;
+    }
+
+    // Units of one amount on the rule's step (half to even) and whether it is on the grid
+    function amountUnits(amount, rule) {
+        var numerator = Math.round(amount * INPUT_SCALE) * rule.step_scale;
+        var denominator = rule.step_units * INPUT_SCALE;
+        var quotient = Math.floor(numerator / denominator);
+        var remainder = numerator - quotient * denominator;
+        if (remainder < 0) {
+            quotient -= 1;
+            remainder += denominator;
+        } else if (remainder >= denominator) {
+            quotient += 1;
+            remainder -= denominator;
+        }
+        var exact = remainder === 0;
+        if (2 * remainder > denominator || (2 * remainder === denominator && Math.abs(quotient % 2) === 1)) {
+            quotient += 1;
+        }
+        return { units: quotient, exact: exact };
+    }
+
+    function checkNumber(rule, values) {
+        var messages = rule.messages;
+        var value = values[rule.field];
+        if (value === null || value === undefined) {
+            return messages.required;
+        }
+        var amount = Number(value);
+        if (!Number.isFinite(amount)) {
+            return messages.not_finite;
+        }
+        if ((rule.min !== null && amount < rule.min) || (rule.max !== null && amount > rule.max)) {
+            return messages.range;
+        }
+        if (rule.integer && !Number.isInteger(amount)) {
+            return messages.integer;
+        }
+        return null;
+    }
+
+    function checkEdges(rule, values) {
+        var messages = rule.messages;
+        var edges = parseEdges(values[rule.field], rule.targets);
+        if (edges === null) {
+            return messages.malformed;
+        }
+        var targets = Object.keys(edges).map(Number).sort(function (a, b) { return a - b; });
+        var totalUnits = 0;
+        for (var i = 0; i < targets.length; i++) {
+            var amount = edges[targets[i]];
+            if (!Number.isFinite(amount) || amount < 0) {
+                return messages.negative;
+            }
+            if (rule.integer && !Number.isInteger(amount)) {
+                return messages.integer;
+            }
+            if (rule.max_each !== null && amount > rule.max_each) {
+                return messages.max_each;
+            }
+            if (rule.step_units !== undefined) {
+                var result = amountUnits(amount, rule);
+                if (rule.grid && !result.exact) {
+                    return messages.grid;
+                }
+                totalUnits += result.units;
+            }
+        }
+        if (rule.max_total_units !== null && totalUnits > rule.max_total_units) {
+            return messages.max_total;
+        }
+        return null;
+    }
+
+    function checkRequired(rule, values) {
+        for (var i = 0; i < rule.fields.length; i++) {
+            if (values[rule.fields[i]] === null || values[rule.fields[i]] === undefined) {
+                return rule.message;
+            }
+        }
+        return null;
+    }
+
+    var CHECKS = { number: checkNumber, edges: checkEdges, required: checkRequired };
+
+    // The first rule message that values violate, or null
+    function validate(formSpec, values) {
+        for (var i = 0; i < formSpec.rules.length; i++) {
+            var rule = formSpec.rules[i];
+            var message = CHECKS[rule.kind](rule, values);
+            if (message) {
+                return message;
+            }
+        }
+        return null;
+    }
+
+    function fieldValue(form, name) {
+        var field = form.elements[name];
+        if (!field) {
+            return null;
+        }
+        // A RadioNodeList's value is the checked radio's value
+        var raw = field.value;
+        if (raw === undefined || raw === null || String(raw).trim() === '') {
+            return null;
+        }
+        return raw;
+    }
+
+    // Form values in the shape error_message receives
+    function collect(form, formSpec) {
+        var values = {};
+        formSpec.rules.forEach(function (rule) {
+            var fields = rule.kind === 'required' ? rule.fields : [rule.field];
+            fields.forEach(function (name) {
+                var raw = fieldValue(form, name);
+                values[name] = raw === null || rule.kind === 'edges' ? raw : Number(raw);
+            });
+        });
+        return values;
+    }
+
+    function showError(form, message) {
+        var box = document.querySelector('.otree-form-errors');
+        if (!box) {
+            box = document.createElement('div');
+            box.className = 'otree-form-errors alert alert-danger';
+            form.parentNode.insertBefore(box, form);
+        }
+        box.textContent = message;
+        box.style.display = '';
+    }
+
+    function attach(form, formSpec) {
+        // Listen on the document so page handlers that fill hidden fields run first.
+        document.addEventListener('submit', function (event) {
+            if (event.target !== form || event.defaultPrevented) {
+                return;
+            }
+            var message = validate(formSpec, collect(form, formSpec));
+            if (!message) {
+                return;
+            }
+            event.preventDefault();
+            showError(form, message);
+            // oTree disables the next button on submit; the form stays open.
+            form.querySelectorAll('.otree-btn-next').forEach(function (button) {
+                button.disabled = false;
+            });
+        });
+    }
+
+    var api = {
+        validate: validate,
+        collect: collect,
+        attach: attach,
+        amountUnits: amountUnits
+    };
+    root.formValidation = api;
+    if (typeof module === 'object' && module.exports) {
+        module.exports = api;
+    }
+
+    if (typeof document !== 'undefined') {
+        document.addEventListener('DOMContentLoaded', function () {
+            var formSpec = typeof js_vars !== 'undefined' && js_vars ? js_vars.validation : null;
+            var form = document.getElementById('form');
+            if (formSpec && form) {
+                attach(form, formSpec);
+            }
+        });
+    }
+})(typeof window !== 'undefined' ? window : this);
@@ -0,0 +1,132 @@
+function setDecisionSubmitLabel() {
+var submitButton = document.querySelector('button.otree-next-button, button.otree-btn-next');
+if (submitButton) {
+submitButton.textContent = '決定';
+}
+}
+function sum_list(list) {
+if (!Array.isArray(list)) return 0;
+return list.reduce((a, b) => a + (b || 0), 0);
+}
+if (typeof otree !== 'undefined' && otree.api && typeof otree.api.setTemplateFilters === 'function') {
+otree.api.setTemplateFilters({ sum_list: sum_list });
+}
+document.addEventListener('DOMContentLoaded', function () {
+setDecisionSubmitLabel();
+var contributionInput = document.querySelector('input[name="contribution"]');
+if (!contributionInput) {
+return;
+}
+contributionInput.classList.add('ui-input');
+contributionInput.classList.add('js-slider-input');
+var configEl = document.getElementById('contribution-config');
+var config = configEl ? configEl.dataset : {};
+var maxVal = parseFloat(config.availableEndowment);
+if (!Number.isFinite(maxVal)) {
+maxVal = 0;
+}
+var maxIntVal = Math.max(0, Math.floor(maxVal));
+var initialVal = parseFloat(config.initialContribution);
+if (!Number.isFinite(initialVal) || initialVal < 0) {
+initialVal = 0;
+}
+initialVal = Math.min(maxIntVal, Math.round(initialVal));
+var current = parseFloat(contributionInput.value);
+if (Number.isNaN(current) || current < 0) {
+contributionInput.value = initialVal.toString();
+} else {
+current = Math.round(current);
+if (current === 0 && initialVal > 0) {
+current = initialVal;
+}
+contributionInput.value = current.toString();
+}
+contributionInput.setAttribute('step', '1');
+contributionInput.setAttribute('min', '0');
+contributionInput.setAttribute('max', maxIntVal.toString());
+var rangeInput = document.getElementById('contribution-range');
+var valueEl = document.getElementById('contribution-range-value');
+var thumbEl = document.getElementById('contribution-thumb');
+var originalUpdateSliderFill = window.updateSliderFill;
+var form = document.querySelector('form.otree-form');
+function normalizeContributionValue(rawValue) {
+var value = parseFloat(rawValue);
+if (!Number.isFinite(value)) {
+value = 0;
+}
+value = Math.round(value);
+if (value < 0) {
+value = 0;
+}
+if (value > maxIntVal) {
+value = maxIntVal;
+}
+return value;
+}
+function updateContributionThumb() {
+if (!rangeInput || !thumbEl) {
+return;
+}
+var min = parseFloat(rangeInput.min || '0');
+var max = parseFloat(rangeInput.max || '0');
+var value = parseFloat(rangeInput.value || '0');
+if (!Number.isFinite(min)) {
+min = 0;
+}
+if (!Number.isFinite(max) || max <= min) {
+max = min + 1;
+}
+if (!Number.isFinite(value)) {
+value = min;
+}
+var pct = (value - min) / (max - min);
+pct = Math.max(0, Math.min(1, pct));
+var trackWidth = rangeInput.getBoundingClientRect().width || 0;
+var thumbWidth = thumbEl.getBoundingClientRect().width || 0;
+var left = pct * Math.max(0, trackWidth - thumbWidth);
+thumbEl.style.left = left.toFixed(2) + 'px';
+}
+if (typeof originalUpdateSliderFill === 'function') {
+window.updateSliderFill = function (targetRangeInput) {
+originalUpdateSliderFill(targetRangeInput);
+if (targetRangeInput === rangeInput) {
+updateContributionThumb();
+}
+};
+}
+function updateBar() {
+var value = normalizeContributionValue(contributionInput.value);
+contributionInput.value = value.toString();
+if (rangeInput) {
+rangeInput.value = value.toString();
+}
+if (valueEl) {
+valueEl.textContent = value.toString();
+}
+if (window.updateSliderFill) {
+window.updateSliderFill(rangeInput);
+}
+}
+contributionInput.addEventListener('input', updateBar);
+contributionInput.addEventListener('change', updateBar);
+contributionInput.addEventListener('blur', updateBar);
+if (rangeInput) {
+rangeInput.addEventListener('input', updateContributionThumb);
+rangeInput.addEventListener('change', updateContributionThumb);
+}
+if (form) {
+form.addEventListener('submit', function () {
+var clamped = normalizeContributionValue(contributionInput.value);
+contributionInput.value = clamped.toString();
+if (rangeInput) {
+rangeInput.value = clamped.toString();
+}
+});
+}
+window.addEventListener('resize', updateContributionThumb);
+updateBar();
+if (window.initInputSliders) {
+window.initInputSliders();
+}
+updateContributionThumb();
+});
@@ -0,0 +1,267 @@
+document.addEventListener('DOMContentLoaded', function () {
+var submitButtonLabel = document.querySelector('button.otree-next-button, button.otree-btn-next');
+if (submitButtonLabel) {
+submitButtonLabel.textContent = '決定';
+}
+var configEl = document.getElementById('transfer-config');
+if (!configEl) {
+return;
+}
+var maxTransfer = parseFloat(configEl.dataset.maxTransfer || '1');
+if (!Number.isFinite(maxTransfer) || maxTransfer <= 0) {
+maxTransfer = 1;
+}
+var transferUnit = parseFloat(configEl.dataset.transferUnit || '0.1');
+if (!Number.isFinite(transferUnit) || transferUnit <= 0) {
+transferUnit = 0.1;
+}
+var unitString = transferUnit.toString();
+var decimalPart = unitString.indexOf('.') >= 0 ? unitString.split('.')[1] : '';
+var decimals = decimalPart.length;
+if (decimals === 0 && transferUnit < 1) {
+decimals = 1;
+}
+decimals = Math.min(Math.max(decimals, 1), 4);
+var displayDecimals = Math.max(decimals, 1);
+var tolerance = 1e-6;
+var isCostly = configEl.dataset.isCostly === 'true';
+var costPerUnit = parseFloat(configEl.dataset.costPerUnit || '0');
+var singularLabel = configEl.dataset.currencySingular || '';
+var pluralLabel = configEl.dataset.currencyPlural || singularLabel;
+var inputs = Array.from(document.querySelectorAll('.js-transfer-input'));
+var errorEl = document.getElementById('transfer-error');
+var selfDisplayInput = document.getElementById('self-power-display');
+var costEl = document.getElementById('preview-cost');
+var costUnitEl = document.getElementById('preview-cost-unit');
+var form = document.querySelector('form.otree-form');
+var submitButton = form ? form.querySelector('button.otree-next-button') : null;
+var validationSpec = window.formValidation && typeof js_vars !== 'undefined' && js_vars
+? js_vars.validation
+: null;
+var selfId = configEl.dataset.selfId || '';
+var selfBar = document.querySelector('.vertical-bar[data-self="true"]');
+var previousTotalOut = 0;
+var powerMax = 0;
+var powerGrid = document.querySelector('.power-grid[data-power-max]');
+if (powerGrid) {
+powerMax = parseFloat(powerGrid.dataset.powerMax || '0');
+}
+if (!Number.isFinite(powerMax) || powerMax <= 0) {
+powerMax = 1;
+}
+var barsById = {};
+document.querySelectorAll('.vertical-bar[data-member-id]').forEach(function (bar) {
+var id = bar.dataset.memberId || '';
+if (!id) {
+return;
+}
+var base = parseFloat(bar.dataset.basePower || bar.dataset.power || '0');
+if (!Number.isFinite(base)) {
+base = 0;
+}
+barsById[id] = { el: bar, base: base };
+});
+inputs.forEach(function (input) {
+previousTotalOut += normalizeTransfer(input.value || '0');
+});
+function normalizeTransfer(rawValue) {
+var value = parseFloat(rawValue);
+if (!Number.isFinite(value) || value < 0) {
+value = 0;
+}
+value = Math.round(value / transferUnit) * transferUnit;
+value = Math.max(0, Math.min(maxTransfer, value));
+return parseFloat(value.toFixed(decimals + 1));
+}
+function parseTransferInput(input) {
+var rawValue = (input.value || '').trim();
+var maxDisplay = maxTransfer.toFixed(displayDecimals);
+var unitDisplay = transferUnit.toFixed(displayDecimals);
+if (rawValue === '') {
+return { valid: true, value: 0 };
+}
+var value = Number(rawValue);
+if (!Number.isFinite(value)) {
+return {
+valid: false,
+value: 0,
+message: '譲渡量は数値で入力してください。'
+};
+}
+if (value < -tolerance || value > maxTransfer + tolerance) {
+return {
+valid: false,
+value: 0,
+message: '譲渡量は 0.0 から ' + maxDisplay + ' までで入力してください。'
+};
+}
+if (transferUnit > 0) {
+var multiples = value / transferUnit;
+if (Math.abs(multiples - Math.round(multiples)) > tolerance) {
+return {
+valid: false,
+value: 0,
+message: '譲渡量は ' + unitDisplay + ' 刻みで入力してください。'
+};
+}
+}
+if (Math.abs(value) < tolerance) {
+value = 0;
+}
+return {
+valid: true,
+value: parseFloat(value.toFixed(decimals + 1))
+};
+}
+function setBarValue(barEl, nextValue) {
+if (!barEl) {
+return;
+}
+var baseValue = parseFloat(barEl.dataset.basePower || barEl.dataset.power || '0');
+if (!Number.isFinite(baseValue)) {
+baseValue = 0;
+}
+var finalValue = parseFloat(nextValue);
+if (!Number.isFinite(finalValue)) {
+finalValue = 0;
+}
+finalValue = Math.max(0, Math.min(powerMax, finalValue));
+var basePct = Math.max(0, Math.min(100, (baseValue / powerMax) * 100));
+var finalPct = Math.max(0, Math.min(100, (finalValue / powerMax) * 100));
+var deltaPct = Math.abs(finalPct - basePct);
+var fillBottomPct = Math.min(basePct, finalPct);
+var baseEl = barEl.querySelector('.vertical-bar-base-fill');
+var fillEl = barEl.querySelector('.vertical-bar-fill');
+var valueEl = barEl.querySelector('.vertical-bar-value');
+if (baseEl) {
+baseEl.style.height = basePct.toFixed(2) + '%';
+}
+if (fillEl) {
+fillEl.style.height = deltaPct.toFixed(2) + '%';
+fillEl.style.bottom = fillBottomPct.toFixed(2) + '%';
+}
+if (valueEl) {
+valueEl.textContent = finalValue.toFixed(displayDecimals);
+}
+}
+function updateState(enforceFormat) {
+var totalOut = 0;
+var transferByTarget = {};
+var allInputsValid = true;
+var firstErrorMessage = '';
+inputs.forEach(function (input) {
+var parsed = parseTransferInput(input);
+if (!parsed.valid) {
+allInputsValid = false;
+if (!firstErrorMessage) {
+firstErrorMessage = parsed.message;
+}
+input.setCustomValidity(parsed.message);
+return;
+}
+var normalized = parsed.value;
+input.setCustomValidity('');
+if (enforceFormat) {
+input.value = normalized.toFixed(displayDecimals);
+}
+var targetId = input.dataset.target || '';
+if (targetId) {
+transferByTarget[targetId] = normalized;
+}
+totalOut += normalized;
+});
+totalOut = parseFloat(totalOut.toFixed(decimals + 1));
+var selfBase = selfBar ? parseFloat(selfBar.dataset.basePower || selfBar.dataset.power || '0') : 0;
+if (!Number.isFinite(selfBase)) {
+selfBase = 0;
+}
+var remainingSelf = selfBase + previousTotalOut - totalOut;
+if (Math.abs(remainingSelf) < tolerance) {
+remainingSelf = 0;
+}
+if (selfDisplayInput) {
+selfDisplayInput.value = Math.max(0, remainingSelf).toFixed(displayDecimals);
+}
+setBarValue(selfBar, remainingSelf);
+Object.keys(barsById).forEach(function (id) {
+if (id === selfId) {
+return;
+}
+var info = barsById[id];
+if (!info || !info.el) {
+return;
+}
+var transferValue = transferByTarget[id] || 0;
+var inputEl = document.querySelector('.js-transfer-input[data-target="' + id + '"]');
+var previousTransferValue = inputEl ? normalizeTransfer(inputEl.defaultValue || '0') : 0;
+var nextValue = info.base - previousTransferValue + transferValue;
+setBarValue(info.el, nextValue);
+});
+if (isCostly && costEl) {
+var units = totalOut / transferUnit;
+var totalCost = units * costPerUnit;
+costEl.textContent = totalCost.toFixed(displayDecimals);
+if (costUnitEl) {
+costUnitEl.textContent = Math.abs(totalCost - 1) < tolerance ? singularLabel : pluralLabel;
+}
+}
+var ruleMessage = null;
+if (allInputsValid && validationSpec) {
+ruleMessage = window.formValidation.validate(validationSpec, {
+power_transfer_edges: JSON.stringify(transferByTarget)
+});
+} else if (allInputsValid && totalOut > maxTransfer + tolerance) {
+ruleMessage = '譲渡量の合計は ' + maxTransfer.toFixed(displayDecimals) + ' までです。';
+}
+var isValidTotal = allInputsValid && !ruleMessage;
+if (errorEl) {
+if (firstErrorMessage) {
+errorEl.textContent = firstErrorMessage;
+errorEl.style.display = 'block';
+} else if (ruleMessage) {
+errorEl.textContent = ruleMessage;
+errorEl.style.display = 'block';
+} else {
+errorEl.textContent = '';
+errorEl.style.display = 'none';
+}
+}
+if (submitButton) {
+submitButton.disabled = !isValidTotal;
+}
+return isValidTotal;
+}
+inputs.forEach(function (input) {
+input.setAttribute('min', '0');
+input.setAttribute('max', maxTransfer.toString());
+input.setAttribute('step', transferUnit.toString());
+input.addEventListener('input', function () { updateState(false); });
+input.addEventListener('change', function () { updateState(true); });
+input.addEventListener('blur', function () { updateState(true); });
+});
+var edgesInput = document.getElementById('power-transfer-edges');
+function syncTransferEdges() {
+var edges = {};
+inputs.forEach(function (input) {
+var parsed = parseTransferInput(input);
+var targetId = input.dataset.target || '';
+if (targetId && parsed.valid && parsed.value !== 0) {
+edges[targetId] = parsed.value;
+}
+});
+if (edgesInput) {
+edgesInput.value = JSON.stringify(edges);
+}
+}
+if (form) {
+form.addEventListener('submit', function (event) {
+var valid = updateState(true);
+syncTransferEdges();
+if (!valid) {
+event.preventDefault();
+event.stopPropagation();
+}
+});
+}
+updateState(true);
+});
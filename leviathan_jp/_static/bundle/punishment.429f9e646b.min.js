@@ -0,0 +1,246 @@
+document.addEventListener('DOMContentLoaded', function() {
+var submitButtonLabel = document.querySelector('button.otree-next-button, button.otree-btn-next');
+if (submitButtonLabel) {
+submitButtonLabel.textContent = '決定';
+}
+const inputs = document.querySelectorAll('.punishment-input');
+const dpCostSelf = document.getElementById('dp-cost-self');
+const dpCostInline = document.getElementById('dp-cost-inline');
+const dpCostFill = document.querySelector('.dp-cost-box--fill .dp-cost-fill');
+const configEl = document.getElementById('punishment-config');
+const config = configEl ? configEl.dataset : {};
+const powerValue = parseFloat(config.selfPower);
+const powerText = Number.isFinite(powerValue) ? powerValue : 1.0;
+const effectBase = parseFloat(config.powerEffectiveness) || 1.0;
+const sliders = document.querySelectorAll('.punish-slider');
+const nextButton = document.querySelector('button.otree-next-button');
+const maxPerTarget = parseInt(config.perTargetLimit, 10);
+const preview = window.punishmentPreview && typeof js_vars !== 'undefined' && js_vars
+? js_vars.punishment_preview
+: null;
+const dpCostMu = document.getElementById('dp-cost-mu');
+function parsePunishValue(input) {
+const raw = input.value;
+if (raw === '' || raw === null) {
+return null;
+}
+const value = Number(raw);
+if (!Number.isFinite(value)) {
+return NaN;
+}
+return value;
+}
+function isValidPunish(value) {
+if (!Number.isFinite(value)) {
+return false;
+}
+if (!Number.isInteger(value)) {
+return false;
+}
+if (value < 0) {
+return false;
+}
+if (Number.isFinite(maxPerTarget) && value > maxPerTarget) {
+return false;
+}
+return true;
+}
+function validateInput(input, showMessage) {
+const value = parsePunishValue(input);
+if (value === null) {
+input.setCustomValidity('');
+return true;
+}
+if (isValidPunish(value)) {
+input.setCustomValidity('');
+return true;
+}
+input.setCustomValidity('減点は0〜' + maxPerTarget + 'の整数で入力してください。');
+if (showMessage && typeof input.reportValidity === 'function') {
+input.reportValidity();
+}
+return false;
+}
+function updatePunishThumb(slider) {
+if (!slider) {
+return;
+}
+const cell = slider.closest('.matrix-slider-cell');
+if (!cell) {
+return;
+}
+const thumb = cell.querySelector('.slider-thumb');
+if (!thumb) {
+return;
+}
+const styles = getComputedStyle(cell);
+const frame = parseFloat(styles.getPropertyValue('--punish-frame')) || 0;
+const thumbBorder = parseFloat(styles.getPropertyValue('--punish-thumb-border')) || frame;
+const min = parseFloat(slider.min || '0');
+const max = parseFloat(slider.max || '0');
+const value = parseFloat(slider.value || '0');
+const denom = Number.isFinite(max) && max !== min ? (max - min) : 1;
+const pct = Math.max(0, Math.min(1, (value - min) / denom));
+const trackWidth = slider.getBoundingClientRect().width || 0;
+const thumbWidth = thumb.getBoundingClientRect().width || 0;
+const left = pct * Math.max(0, trackWidth - thumbWidth);
+thumb.style.left = left.toFixed(2) + 'px';
+const innerHeight = cell.clientHeight || 0;
+const thumbInner = Math.max(0, innerHeight - (thumbBorder * 2));
+cell.style.setProperty('--punish-cell-height', innerHeight + 'px');
+cell.style.setProperty('--punish-thumb-inner', thumbInner + 'px');
+}
+function updatePunishCellFill(slider) {
+if (!slider) {
+return;
+}
+const cell = slider.closest('.matrix-slider-cell');
+if (!cell) {
+return;
+}
+const min = parseFloat(slider.min || '0');
+const max = parseFloat(slider.max || '0');
+const value = parseFloat(slider.value || '0');
+const denom = Number.isFinite(max) && max !== min ? (max - min) : 1;
+const pct = Math.max(0, Math.min(100, ((value - min) / denom) * 100));
+cell.style.setProperty('--punish-fill', pct.toFixed(2) + '%');
+slider.style.background = 'transparent';
+updatePunishThumb(slider);
+}
+function updateTotal(showMessage) {
+let totalUsed = 0;
+let allValid = true;
+inputs.forEach(function(input) {
+const valid = validateInput(input, showMessage);
+if (!valid) {
+allValid = false;
+return;
+}
+const value = parsePunishValue(input);
+if (value === null) {
+return;
+}
+totalUsed += value;
+});
+if (dpCostSelf) {
+dpCostSelf.innerText = totalUsed.toString();
+}
+if (dpCostInline) {
+dpCostInline.innerText = totalUsed.toString();
+}
+if (dpCostFill) {
+const maxDp = parseFloat(config.maxTotalDp);
+const denom = Number.isFinite(maxDp) && maxDp > 0 ? maxDp : 1;
+const pct = Math.max(0, Math.min(100, (totalUsed / denom) * 100));
+dpCostFill.style.width = pct.toFixed(2) + '%';
+}
+let projection = null;
+if (preview) {
+const pointsByTarget = {};
+inputs.forEach(function(input) {
+const value = parsePunishValue(input);
+if (input.dataset.target && isValidPunish(value)) {
+pointsByTarget[input.dataset.target] = value;
+}
+});
+projection = window.punishmentPreview.project(preview, pointsByTarget);
+if (dpCostMu) {
+dpCostMu.textContent = projection.cost.toFixed(preview.decimals);
+}
+document.querySelectorAll('.projected-mu').forEach(function(projectedEl) {
+const projected = projection.available[projectedEl.dataset.projectedFor];
+if (projected !== undefined) {
+projectedEl.textContent = projected.toFixed(preview.decimals);
+}
+});
+}
+document.querySelectorAll('.slider-effect').forEach(function(effectEl) {
+const targetId = effectEl.dataset.effectFor;
+const inputEl = document.querySelector('.punishment-input[data-target="' + targetId + '"]');
+if (!inputEl) {
+return;
+}
+const value = parsePunishValue(inputEl);
+if (!Number.isFinite(value) || value <= 0) {
+effectEl.textContent = '【0.0】';
+return;
+}
+const loss = projection ? projection.loss[targetId] : value * effectBase * powerText;
+effectEl.textContent = '【' + loss.toFixed(1) + '】';
+});
+document.querySelectorAll('.slider-value').forEach(function(valueEl) {
+const targetId = valueEl.dataset.valueFor;
+const inputEl = document.querySelector('.punishment-input[data-target="' + targetId + '"]');
+const value = inputEl ? parsePunishValue(inputEl) : null;
+const displayValue = Number.isFinite(value) ? value : 0;
+valueEl.textContent = displayValue + '/' + maxPerTarget;
+});
+if (nextButton) {
+nextButton.disabled = !allValid;
+}
+sliders.forEach(function(slider) {
+const targetId = slider.dataset.target;
+const inputEl = document.querySelector('.punishment-input[data-target="' + targetId + '"]');
+if (!inputEl) {
+return;
+}
+const value = parsePunishValue(inputEl);
+if (value === null || !Number.isFinite(value)) {
+return;
+}
+slider.value = value;
+updatePunishCellFill(slider);
+});
+}
+inputs.forEach(function(input) {
+input.setAttribute('step', '1');
+input.setAttribute('min', '0');
+input.setAttribute('max', config.perTargetLimit);
+input.removeAttribute('required');
+input.addEventListener('input', function () { updateTotal(false); });
+input.addEventListener('change', function () { updateTotal(true); });
+input.addEventListener('blur', function () { updateTotal(true); });
+});
+sliders.forEach(function(slider) {
+slider.addEventListener('input', function () {
+const targetId = slider.dataset.target;
+const inputEl = document.querySelector('.punishment-input[data-target="' + targetId + '"]');
+if (!inputEl) {
+return;
+}
+inputEl.value = slider.value;
+updatePunishCellFill(slider);
+updateTotal(false);
+});
+updatePunishCellFill(slider);
+});
+window.addEventListener('resize', function () {
+sliders.forEach(function (slider) {
+updatePunishThumb(slider);
+});
+});
+updateTotal(false);
+if (window.initInputSliders) {
+window.initInputSliders();
+}
+const form = document.querySelector('form.otree-form') || document.querySelector('form');
+if (form) {
+form.addEventListener('submit', function () {
+const edges = {};
+inputs.forEach(function (input) {
+if (input.value === '' || input.value === null) {
+input.value = '0';
+}
+const points = Number(input.value);
+if (input.dataset.target && points !== 0) {
+edges[input.dataset.target] = Number.isFinite(points) ? points : input.value;
+}
+});
+const edgesInput = document.getElementById('punishment-edges');
+if (edgesInput) {
+edgesInput.value = JSON.stringify(edges);
+}
+updateTotal(false);
+});
+}
+});
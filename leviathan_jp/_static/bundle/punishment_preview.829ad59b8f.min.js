@@ -0,0 +1,46 @@
+(function (root) {
+function currency(value, decimals) {
+if (value < 0) {
+return -Number((-value).toFixed(decimals));
+}
+return Number(value.toFixed(decimals));
+}
+function project(preview, pointsByTarget) {
+var decimals = preview.decimals;
+var selfIndex = preview.ids.indexOf(preview.self_id);
+var lossPerPoint = preview.effectiveness * preview.power[selfIndex];
+var rawLoss = {};
+var rawCost = 0;
+var totalPoints = 0;
+preview.ids.forEach(function (id) {
+var points = id === preview.self_id ? 0 : Number(pointsByTarget[id] || 0);
+rawLoss[id] = 0;
+if (!Number.isFinite(points) || points <= 0) {
+return;
+}
+rawLoss[id] = points * lossPerPoint;
+rawCost += points * preview.cost_per_point;
+totalPoints += points;
+});
+var attemptedCost = currency(totalPoints * preview.cost_per_point, decimals);
+var cost = Math.min(rawCost, attemptedCost);
+var loss = {};
+var available = {};
+preview.ids.forEach(function (id, index) {
+var spent = id === preview.self_id ? cost : 0;
+loss[id] = currency(rawLoss[id], decimals);
+available[id] = currency(preview.available[index] - spent - rawLoss[id], decimals);
+});
+return {
+points: totalPoints,
+cost: currency(cost, decimals),
+loss: loss,
+available: available
+};
+}
+var api = { project: project, currency: currency };
+root.punishmentPreview = api;
+if (typeof module === 'object' && module.exports) {
+module.exports = api;
+}
+})(typeof window !== 'undefined' ? window : this);
@@ -1,6 +1,8 @@
 from otree.api import *
 
 from .models import Constants as C, Subsession, Group, Player  # type: ignore
+from .export import custom_export  # type: ignore
+from . import assets, compression, grouping, timing
 from .pages import (
     ExperimentGroupWait,
     PowerTransfer,
@@ -13,6 +15,7 @@ from .pages import (
     PunishmentWaitPage,
     PunishmentResult,
     RoundResult,
+    MergedResult,
     FinalResult,
 )  # type: ignore
 
@@ -32,5 +35,26 @@ page_sequence = [
     PunishmentWaitPage,
     PunishmentResult,
     RoundResult,
+    MergedResult,
     FinalResult,
 ]
+
+
+def creating_session(subsession):
+    # oTree only calls this module-level hook for the game app, so it runs the same
+    # Subsession.creating_session as the simulator (headcount check, grouping, initial state)
+    subsession.creating_session()
+    if subsession.round_number == 1:
+        grouping.reserve_agent_seats(subsession.session, subsession.get_players())
+
+
+def vars_for_admin_report(subsession):
+    page_size_rows = compression.snapshot(subsession.round_number)
+    return dict(
+        page_timing_enabled=bool(subsession.session.config.get('page_timing')),
+        page_timing_rows=timing.snapshot(subsession.round_number),
+        compress_pages=bool(subsession.session.config.get('compress_pages', True)),
+        page_size_rows=page_size_rows + compression.round_totals(page_size_rows),
+        bundle_size_rows=assets.bundle_sizes(),
+        group_wait_rows=grouping.admin_rows(subsession.session),
+    )
@@ -0,0 +1,348 @@
+# game/assets.py
+
+"""
+Static bundle build for the page CSS and JS.
+
+The styles and scripts shared by every page (_templates/global/Page.html) and
+those of the heavy game pages are kept as source files in _assets/:
+
+    _assets/page.css, page.js                      global/Page.html
+    _assets/contribution.css, contribution.js      game/Contribution.html
+    _assets/history_modal.css, history_modal.js    game/_HistoryModal.html
+    _assets/power_transfer.css, power_transfer.js  game/PowerTransfer.html
+    _assets/punishment.css, punishment.js          game/Punishment.html
+    _assets/punishment_preview.js                  game/Punishment.html (live preview)
+    _assets/validation.js                          global/Page.html (game.validation)
+
+After editing one of them, run from the oTree project directory:
+
+    python -m game.assets            # rebuild the bundles
+    python -m game.assets --check    # exit 1 if a bundle is out of date
+
+Each source is minified and written to _static/bundle/ under a
+content-hashed name (<name>.<hash>.min.css). The templates load it through a
+generated include, _templates/bundle/<name>.css.html, which holds the
+<link> or <script> tag with the current name. The hashed files are served
+with a long-lived, immutable Cache-Control (see install_cache_headers), so a
+tablet downloads each bundle once per session and any change gets a new URL.
+oTree offers no hook for static-file headers: its Starlette app ignores added
+middleware, and the /static mount is only created after the apps are
+imported. install_cache_headers therefore wraps the static files app's
+file_response. It first checks the signatures it relies on, and if they have
+changed it logs a warning and leaves oTree alone. The bundles are then still
+served, just with oTree's default headers.
+
+Next to each bundle, the build writes a gzip copy (.gz) and, when the brotli
+package is installed, a brotli copy (.br). Both use maximum compression. The
+static app serves the best copy the browser accepts (see game.compression).
+
+Template values are not available in the bundles. Pages pass them in data
+attributes of a hidden config element (e.g. #punishment-config).
+
+The minifiers are conservative and need no extra packages. CSS loses its
+comments and the whitespace around punctuation. JS keeps one statement per
+line and loses only indentation, blank lines and whole-line // comments.
+"""
+
+import argparse
+import hashlib
+import inspect
+import logging
+import mimetypes
+import os
+import re
+import sys
+
+from . import compression
+
+
+logger = logging.getLogger(__name__)
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SOURCE_DIR = os.path.join(PROJECT_DIR, '_assets')
+BUNDLE_DIR = os.path.join(PROJECT_DIR, '_static', 'bundle')
+INCLUDE_DIR = os.path.join(PROJECT_DIR, '_templates', 'bundle')
+
+# Hex digits of the content hash in a bundle file name
+HASH_LENGTH = 10
+
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+# Leading parameters of the static files app methods install_cache_headers wraps or calls
+STATIC_FILES_SIGNATURES = dict(
+    file_response=('full_path', 'stat_result', 'scope', 'status_code'),
+    is_not_modified=('response_headers', 'request_headers'),
+)
+
+_BUNDLE_NAME = re.compile(r'^[a-z0-9_]+\.[0-9a-f]{%d}\.min\.(css|js)$' % HASH_LENGTH)
+
+INCLUDE_TAGS = dict(
+    css='<link rel="stylesheet" href="{%% static \'bundle/%s\' %%}">',
+    js='<script src="{%% static \'bundle/%s\' %%}"></script>',
+)
+
+_CSS_TOKENS = re.compile(r'''("(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*'|/\*.*?\*/)''', re.S)
+
+
+def minify_css(text):
+    parts = []
+    for index, token in enumerate(_CSS_TOKENS.split(text)):
+        if index % 2:
+            if not token.startswith('/*'):
+                parts.append(token)
+            continue
+        token = re.sub(r'\s+', ' ', token)
+        token = re.sub(r'\s*([{};,>])\s*', r'\1', token)
+        token = re.sub(r':\s+', ':', token)
+        parts.append(token)
+    return re.sub(r';}', '}', ''.join(parts)).strip() + '\n'
+
+
+def minify_js(text):
+    lines = []
+    in_template = False
+    for line in text.splitlines():
+        if in_template:
+            lines.append(line)
+        else:
+            stripped = line.strip()
+            if not stripped or stripped.startswith('//'):
+                continue
+            lines.append(stripped)
+        # Lines inside a multi-line template literal are kept verbatim.
+        if line.count('`') % 2:
+            in_template = not in_template
+    return '\n'.join(lines) + '\n'
+
+
+MINIFIERS = dict(css=minify_css, js=minify_js)
+
+
+def sources():
+    """(name, kind, path) of every bundle source, sorted."""
+    if not os.path.isdir(SOURCE_DIR):
+        return []
+    found = []
+    for filename in sorted(os.listdir(SOURCE_DIR)):
+        name, ext = os.path.splitext(filename)
+        kind = ext[1:]
+        if kind in MINIFIERS:
+            found.append((name, kind, os.path.join(SOURCE_DIR, filename)))
+    return found
+
+
+def bundle_filename(name, kind, content):
+    digest = hashlib.sha256(content.encode('utf-8')).hexdigest()[:HASH_LENGTH]
+    return f'{name}.{digest}.min.{kind}'
+
+
+def include_text(name, kind, filename):
+    return (
+        f'{{# Generated by python -m game.assets from _assets/{name}.{kind}; do not edit. #}}\n'
+        + INCLUDE_TAGS[kind] % filename
+        + '\n'
+    )
+
+
+def _read(path):
+    if not os.path.isfile(path):
+        return None
+    with open(path, encoding='utf-8') as source_file:
+        return source_file.read()
+
+
+def _write(path, text):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8', newline='\n') as output:
+        output.write(text)
+    os.replace(tmp_path, path)
+
+
+def _stale_bundles(name, kind, keep):
+    if not os.path.isdir(BUNDLE_DIR):
+        return []
+    prefix, suffix = f'{name}.', f'.min.{kind}'
+    return [
+        filename
+        for filename in sorted(os.listdir(BUNDLE_DIR))
+        if filename != keep
+        and filename.startswith(prefix)
+        and filename.endswith(suffix)
+        and _BUNDLE_NAME.match(filename)
+    ]
+
+
+def _precompressed_current(bundle_path, content):
+    data = content.encode('utf-8')
+    for encoding in compression.available_encodings():
+        path = bundle_path + compression.SUFFIXES[encoding]
+        if not os.path.isfile(path):
+            return False
+        with open(path, 'rb') as compressed:
+            if compression.decompress(compressed.read(), encoding) != data:
+                return False
+    return True
+
+
+def _write_precompressed(bundle_path, content):
+    data = content.encode('utf-8')
+    for encoding in compression.available_encodings():
+        path = bundle_path + compression.SUFFIXES[encoding]
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'wb') as output:
+            output.write(compression.compress(data, encoding, best=True))
+        os.replace(tmp_path, path)
+
+
+def _remove_bundle(filename):
+    for suffix in ('',) + tuple(compression.SUFFIXES.values()):
+        path = os.path.join(BUNDLE_DIR, filename + suffix)
+        if os.path.isfile(path):
+            os.remove(path)
+
+
+def build(check=False):
+    """
+    Rebuild every bundle whose output or include is out of date; returns the
+    out-of-date bundles as '<name>.<kind>'. With check, nothing is written.
+    """
+    outdated = []
+    for name, kind, path in sources():
+        content = MINIFIERS[kind](_read(path))
+        filename = bundle_filename(name, kind, content)
+        bundle_path = os.path.join(BUNDLE_DIR, filename)
+        include_path = os.path.join(INCLUDE_DIR, f'{name}.{kind}.html')
+        include = include_text(name, kind, filename)
+        stale = _stale_bundles(name, kind, filename)
+        if (
+            _read(bundle_path) == content
+            and _read(include_path) == include
+            and _precompressed_current(bundle_path, content)
+            and not stale
+        ):
+            continue
+        outdated.append(f'{name}.{kind}')
+        if check:
+            continue
+        _write(bundle_path, content)
+        _write_precompressed(bundle_path, content)
+        _write(include_path, include)
+        for old in stale:
+            _remove_bundle(old)
+    return outdated
+
+
+def bundle_sizes():
+    """Bytes of each current bundle file, plain and precompressed (None if missing)."""
+    rows = []
+    for name, kind, _ in sources():
+        include = _read(os.path.join(INCLUDE_DIR, f'{name}.{kind}.html'))
+        match = re.search(r"bundle/([^']+)'", include or '')
+        if match is None:
+            continue
+        path = os.path.join(BUNDLE_DIR, match.group(1))
+        sizes = {}
+        for encoding, suffix in (('plain', ''),) + tuple(compression.SUFFIXES.items()):
+            sizes[encoding] = os.path.getsize(path + suffix) if os.path.isfile(path + suffix) else None
+        rows.append(dict(bundle=match.group(1), bytes=sizes['plain'], gzip_bytes=sizes['gzip'], br_bytes=sizes['br']))
+    return rows
+
+
+def is_bundle_file(path):
+    return os.path.basename(os.path.dirname(path)) == 'bundle' and bool(
+        _BUNDLE_NAME.match(os.path.basename(path))
+    )
+
+
+def _signature_mismatches(static_files_app):
+    """Methods of the static files app whose leading parameters are not the expected ones."""
+    mismatches = []
+    for name, expected in STATIC_FILES_SIGNATURES.items():
+        method = getattr(static_files_app, name, None)
+        try:
+            parameters = tuple(inspect.signature(method).parameters)
+        except (TypeError, ValueError):
+            parameters = None
+        if parameters is None or parameters[: len(expected)] != expected:
+            mismatches.append(f'{name}{parameters}')
+    return mismatches
+
+
+def install_cache_headers():
+    """
+    Serve the hashed bundle files with IMMUTABLE_CACHE_CONTROL, as their
+    precompressed copy when the browser accepts one. Other static files are
+    unchanged. Returns whether the headers are installed. When the installed
+    oTree no longer matches, it logs a warning and returns False.
+    """
+    try:
+        from otree.common2 import static_files_app
+        from starlette.datastructures import Headers
+        from starlette.responses import FileResponse
+        from starlette.staticfiles import NotModifiedResponse
+    except ImportError as exc:
+        logger.warning('bundle cache headers not installed: %s', exc)
+        return False
+
+    if getattr(static_files_app, '_bundle_cache_headers', False):
+        return True
+    mismatches = _signature_mismatches(static_files_app)
+    if mismatches:
+        logger.warning(
+            'bundle cache headers not installed: oTree static files app changed (%s); '
+            'bundles are served with default headers',
+            ', '.join(mismatches),
+        )
+        return False
+    file_response = static_files_app.file_response
+
+    def bundle_file_response(full_path, stat_result, scope, status_code=200):
+        full_path = str(full_path)
+        if not is_bundle_file(full_path):
+            return file_response(full_path, stat_result, scope, status_code)
+        request_headers = Headers(scope=scope)
+        # Same negotiation as compressed pages (compression.choose_encoding), over the copies on disk
+        precompressed = [
+            encoding
+            for encoding in compression.PREFERENCE
+            if os.path.isfile(full_path + compression.SUFFIXES[encoding])
+        ]
+        encoding = compression.choose_encoding(request_headers.get('accept-encoding'), precompressed)
+        if encoding is None:
+            response = file_response(full_path, stat_result, scope, status_code)
+        else:
+            path = full_path + compression.SUFFIXES[encoding]
+            response = FileResponse(
+                path,
+                status_code=status_code,
+                stat_result=os.stat(path),
+                method=scope['method'],
+                media_type=mimetypes.guess_type(full_path)[0],
+            )
+            response.headers['Content-Encoding'] = encoding
+        response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+        response.headers['Vary'] = 'Accept-Encoding'
+        if isinstance(response, FileResponse) and static_files_app.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        return response
+
+    static_files_app.file_response = bundle_file_response
+    static_files_app._bundle_cache_headers = True
+    return True
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Build the minified, content-hashed CSS/JS bundles.')
+    parser.add_argument('--check', action='store_true', help='only report bundles that are out of date')
+    args = parser.parse_args(argv)
+
+    outdated = build(check=args.check)
+    for bundle in outdated:
+        print(f"{'out of date' if args.check else 'built'}: {bundle}", file=sys.stderr)
+    if args.check and outdated:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
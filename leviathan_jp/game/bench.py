@@ -0,0 +1,248 @@
+# game/bench.py
+
+"""
+Benchmarks for the game's hot paths.
+
+Each case builds one synthetic session with game.simulator. A case is a
+treatment (one of the SESSION_CONFIGS), a group size and a round count. The
+session has a single group of that size, random decisions and a fixed seed.
+The session is played with render=True and page_timing on, so the
+instrumentation in game.timing times every vars_for_template,
+before_next_page, error_message and after_all_players_arrive call (including
+PowerTransferWait) of every round. Payload sizes are not measured: encoding
+the history payloads of a 50-member group would dominate the run.
+Afterwards, on the final round's in-memory models, the case times these
+directly:
+
+    build_history_rounds     pages.build_history_rounds, once per member
+    Group.adjust_punishments the reference punishment calculation
+    Group.set_payoff         the matrix payoff engine
+    Player.set_payoff        the reference payoff calculation, once per member
+
+Round counts above Constants.num_rounds are run by raising num_rounds for
+the duration of the case. Early stop is disabled so every round is played.
+
+Run from the oTree project directory:
+
+    python -m game.bench --output bench.json
+    python -m game.bench --group-sizes 5,50 --rounds 20 --output new.json --compare bench.json
+
+The JSON holds one entry per case, with per-call milliseconds for each
+function and page method. --compare reports the functions and page methods
+whose mean time grew by more than --threshold against an earlier file. It
+exits with status 1 when there are any.
+"""
+
+import argparse
+import json
+import platform
+import statistics
+import sys
+import time
+from contextlib import contextmanager
+
+from . import pages, simulator, timing
+from .models import Constants
+
+
+TREATMENTS = ('pggp_fixed', 'pggp_transfer_free', 'pggp_transfer_cost')
+GROUP_SIZES = (5, 10, 20, 50)
+ROUND_COUNTS = (1, 10, 20, 40)
+
+# Seed of every synthetic session, so all cases and commits play the same decisions
+SEED = 20240601
+
+# Baseline timings (ms) below this are timer noise and never reported as slower
+MIN_COMPARE_MS = 0.02
+
+
+@contextmanager
+def num_rounds(rounds):
+    """Temporarily run the game app with rounds rounds."""
+    # Constants is read-only through its metaclass; type.__setattr__ skips the guard.
+    previous = Constants.num_rounds
+    type.__setattr__(Constants, 'num_rounds', rounds)
+    try:
+        yield
+    finally:
+        type.__setattr__(Constants, 'num_rounds', previous)
+
+
+def _time_calls(func, args_list, repeat):
+    """Per-call milliseconds of func over args_list: mean_ms of the fastest pass, median_ms over passes."""
+    passes = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for args in args_list:
+            func(*args)
+        passes.append((time.perf_counter() - start) * 1000 / max(len(args_list), 1))
+    return dict(
+        calls=len(args_list),
+        mean_ms=round(min(passes), 4),
+        median_ms=round(statistics.median(passes), 4),
+    )
+
+
+def run_case(treatment, size, rounds, repeat=3):
+    """Build and time one synthetic session; returns the case's result dict."""
+    config = simulator.load_session_config(
+        treatment,
+        players_per_group=size,
+        group_by_arrival_time=False,
+        early_stop_dropout_count=0,
+        page_timing=True,
+        page_timing_file=None,
+        page_timing_payload=False,
+        event_log_dir=None,
+        checkpoint_dir=None,
+        metrics_port=None,
+    )
+    timing.reset()
+    with num_rounds(rounds):
+        start = time.perf_counter()
+        result = simulator.simulate_session(
+            config,
+            strategy=simulator.RandomStrategy(seed=SEED, timeout_rate=0),
+            num_participants=size,
+            seed=SEED,
+            render=True,
+            keep_models=True,
+        )
+        simulate_seconds = time.perf_counter() - start
+
+        final_round = result['subsessions'][-1]
+        group = final_round.get_groups()[0]
+        members = group.get_players()
+        functions = {
+            'build_history_rounds': _time_calls(pages.build_history_rounds, [(p,) for p in members], repeat),
+            'Group.adjust_punishments': _time_calls(lambda g: g.adjust_punishments(), [(group,)], repeat),
+            'Group.set_payoff': _time_calls(lambda g: g.set_payoff(), [(group,)], repeat),
+            'Player.set_payoff': _time_calls(lambda p: p.set_payoff(), [(p,) for p in members], repeat),
+        }
+        simulator._forget_session(final_round.session)
+
+    page_methods = {
+        f"{row['page']}.{row['method']}": dict(
+            calls=row['count'],
+            mean_ms=row['mean_ms'],
+            p95_ms=row['p95_ms'],
+            max_ms=row['max_ms'],
+            mean_queries=row['mean_queries'],
+        )
+        for row in timing.snapshot(merge_rounds=True)
+    }
+    timing.reset()
+    return dict(
+        treatment=treatment,
+        group_size=size,
+        rounds=rounds,
+        rounds_played=result['rounds_played'],
+        simulate_seconds=round(simulate_seconds, 4),
+        functions=functions,
+        page_methods=dict(sorted(page_methods.items())),
+    )
+
+
+def run(treatments=TREATMENTS, group_sizes=GROUP_SIZES, round_counts=ROUND_COUNTS, repeat=3, progress=None):
+    cases = []
+    for treatment in treatments:
+        for size in group_sizes:
+            for rounds in round_counts:
+                case = run_case(treatment, size, rounds, repeat)
+                cases.append(case)
+                if progress:
+                    progress(case)
+    return dict(
+        generated_at=time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        python=platform.python_version(),
+        platform=platform.platform(),
+        seed=SEED,
+        cases=cases,
+    )
+
+
+def _case_key(case):
+    return (case['treatment'], case['group_size'], case['rounds'])
+
+
+def compare(baseline, current, threshold=1.25):
+    """Timings in current whose mean_ms exceeds threshold x the baseline's."""
+    baseline_cases = {_case_key(case): case for case in baseline['cases']}
+    regressions = []
+    for case in current['cases']:
+        old_case = baseline_cases.get(_case_key(case))
+        if old_case is None:
+            continue
+        for section in ('functions', 'page_methods'):
+            for name, stats in case[section].items():
+                old = old_case[section].get(name)
+                if not old or old['mean_ms'] < MIN_COMPARE_MS:
+                    continue
+                ratio = stats['mean_ms'] / old['mean_ms']
+                if ratio > threshold:
+                    regressions.append(
+                        dict(
+                            case=dict(zip(('treatment', 'group_size', 'rounds'), _case_key(case))),
+                            name=name,
+                            baseline_ms=old['mean_ms'],
+                            current_ms=stats['mean_ms'],
+                            ratio=round(ratio, 2),
+                        )
+                    )
+    return regressions
+
+
+def _int_list(text):
+    return [int(value) for value in text.split(',') if value]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the game hot paths on synthetic sessions.')
+    parser.add_argument('--treatments', default=','.join(TREATMENTS))
+    parser.add_argument('--group-sizes', type=_int_list, default=list(GROUP_SIZES))
+    parser.add_argument('--rounds', type=_int_list, default=list(ROUND_COUNTS))
+    parser.add_argument('--repeat', type=int, default=3, help='passes per direct timing (best is kept)')
+    parser.add_argument('--output', help='JSON file to write (default: stdout)')
+    parser.add_argument('--compare', help='earlier JSON output to check for regressions')
+    parser.add_argument('--threshold', type=float, default=1.25)
+    args = parser.parse_args(argv)
+
+    def progress(case):
+        slowest = max(case['page_methods'].items(), key=lambda item: item[1]['mean_ms'], default=('-', {}))
+        print(
+            f"{case['treatment']:<20} size {case['group_size']:>3}  rounds {case['rounds']:>3}  "
+            f"{case['simulate_seconds']:8.3f}s  slowest page method: {slowest[0]}",
+            file=sys.stderr,
+        )
+
+    results = run(
+        treatments=[name for name in args.treatments.split(',') if name],
+        group_sizes=args.group_sizes,
+        round_counts=args.rounds,
+        repeat=args.repeat,
+        progress=progress,
+    )
+    text = json.dumps(results, indent=1)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as output:
+            output.write(text)
+    else:
+        print(text)
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as baseline_file:
+            regressions = compare(json.load(baseline_file), results, args.threshold)
+        for regression in regressions:
+            case = regression['case']
+            print(
+                f"slower: {regression['name']} ({case['treatment']}, size {case['group_size']}, "
+                f"rounds {case['rounds']}): {regression['baseline_ms']} -> {regression['current_ms']} ms "
+                f"(x{regression['ratio']})",
+                file=sys.stderr,
+            )
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,351 @@
+# game/checkpoint.py
+
+"""
+Per-group checkpoints at the wait-page barriers, and a resume command.
+
+When the session config sets checkpoint_dir, every completed contribution,
+transfer and punishment wait page writes the group's state to
+<checkpoint_dir>/<session_code>/r<round>-g<group>.json. A file holds:
+
+- the Player fields that the barrier and the earlier barriers of the round
+  have settled
+- each member's punishment_power_before for the next round, which
+  PowerTransferWait writes ahead of time
+- the group's totals
+- the participant.vars that carry state between rounds (punishment power,
+  cumulative payoff, dropout flags and the per-round submission marks)
+
+Files are written to a temporary file, fsynced and renamed, so a checkpoint
+is either complete or absent.
+
+A checkpoint is written inside the wait page's transaction, so the server
+can crash after the file exists but before the database commits. Each
+checkpoint therefore also sets participant.vars['checkpoint_barrier'] to its
+[round, page], which commits together with the barrier. On resume, a
+checkpoint whose barrier the members' marker has not reached is left alone:
+the wait page runs again and applies the payoffs once.
+
+After a restart, run
+
+    python -m game.checkpoint <session_code>            # report only
+    python -m game.checkpoint <session_code> --apply    # restore
+
+from the oTree project directory, with the DATABASE_URL of the server. Every
+checkpoint is compared with the database. A group whose settled fields or
+carried-over vars differ is restored to its last barrier. Groups that
+match are left untouched.
+"""
+
+import argparse
+import json
+import os
+import tempfile
+from collections import defaultdict
+
+from otree.api import Currency as c
+
+
+# Barriers in the order they complete within a round
+BARRIER_ORDER = ('PowerTransferWait', 'ContributionWaitPage', 'PunishmentWaitPage')
+
+# Player fields each barrier settles for the rest of its round
+PAYOFF_FIELDS = (
+    'punishment_points_given_actual',
+    'punishment_points_received_actual',
+    'punishment_given',
+    'punishment_received',
+    'available_endowment',
+    'payoff',
+)
+SETTLED_FIELDS = dict(
+    PowerTransferWait=(
+        'power_transfer_edges',
+        'power_transfer_out_total',
+        'power_transfer_in_total',
+        'power_transfer_cost',
+        'punishment_power_before',
+        'punishment_power_after',
+    ),
+    ContributionWaitPage=('contribution', 'available_before_contribution'),
+    PunishmentWaitPage=(
+        'punishment_edges',
+        'attempted_punishment_cost',
+        'attempted_punishment_points',
+        'available_before_punishment',
+    ) + PAYOFF_FIELDS,
+)
+GROUP_FIELDS = ('total_contribution', 'individual_share')
+
+# participant.vars carried between rounds
+CARRIED_VARS = (
+    'punishment_power',
+    'cumulative_payoff',
+    'consecutive_timeouts',
+    'auto_play',
+    'dropout_warning_active',
+    'dropout_confirmed',
+    'power_transfer_submitted_round',
+    'contribution_submitted_round',
+    'punishment_submitted_round',
+)
+# Of those, the vars that only change at a barrier (checked against the latest checkpoint)
+BARRIER_VARS = ('punishment_power', 'cumulative_payoff')
+CURRENCY_VARS = frozenset(['cumulative_payoff'])
+
+# participant.vars key of the last barrier checkpointed for the participant, as [round, page]
+APPLIED_VAR = 'checkpoint_barrier'
+
+
+def checkpoint_dir(session):
+    """Directory of the session's checkpoints, or None when checkpoints are off."""
+    root = session.config.get('checkpoint_dir')
+    if not root:
+        return None
+    return os.path.join(root, session.code)
+
+
+def settled_fields(page_name, round_number):
+    fields = []
+    for barrier in BARRIER_ORDER:
+        fields.extend(SETTLED_FIELDS[barrier])
+        if barrier == page_name:
+            break
+    if round_number == 1 and page_name == 'ContributionWaitPage':
+        # Round 1 has no punishment stage, so its payoff is settled here.
+        fields.extend(PAYOFF_FIELDS)
+    return tuple(fields)
+
+
+def _position(round_number, page_name):
+    return (round_number, BARRIER_ORDER.index(page_name))
+
+
+def applied_barrier(participant):
+    """(round, barrier index) of the participant's last committed checkpoint, or None."""
+    marker = participant.vars.get(APPLIED_VAR)
+    if not marker:
+        return None
+    return _position(*marker)
+
+
+def _plain(value):
+    return float(value) if isinstance(value, c) else value
+
+
+def _write_atomic(path, payload):
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as tmp_file:
+            json.dump(payload, tmp_file, ensure_ascii=False)
+            tmp_file.flush()
+            os.fsync(tmp_file.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def save(group, page_name, players, next_round_players=None):
+    """
+    Checkpoint group at the barrier page_name. next_round_players maps
+    participant code to that member's Player in the next round.
+    """
+    directory = checkpoint_dir(group.session)
+    if directory is None:
+        return None
+    round_number = group.round_number
+    fields = settled_fields(page_name, round_number)
+    members = []
+    for player in sorted(players, key=lambda p: p.id_in_group):
+        participant = player.participant
+        participant.vars[APPLIED_VAR] = [round_number, page_name]
+        member = dict(
+            code=participant.code,
+            id_in_session=participant.id_in_session,
+            id_in_group=player.id_in_group,
+            fields={field: _plain(player.field_maybe_none(field)) for field in fields},
+            vars={key: _plain(participant.vars[key]) for key in CARRIED_VARS if key in participant.vars},
+        )
+        next_player = (next_round_players or {}).get(participant.code)
+        if next_player is not None:
+            member['next_round'] = dict(
+                punishment_power_before=next_player.field_maybe_none('punishment_power_before')
+            )
+        members.append(member)
+    payload = dict(
+        session_code=group.session.code,
+        round=round_number,
+        group=group.id_in_subsession,
+        page=page_name,
+        group_fields={field: _plain(group.field_maybe_none(field)) for field in GROUP_FIELDS},
+        members=members,
+    )
+    path = os.path.join(directory, f'r{round_number:02d}-g{group.id_in_subsession}.json')
+    _write_atomic(path, payload)
+    return path
+
+
+def load(directory):
+    """All checkpoints in directory, oldest barrier first."""
+    checkpoints = []
+    if not os.path.isdir(directory):
+        return checkpoints
+    for name in os.listdir(directory):
+        if name.endswith('.json') and not name.startswith('.'):
+            with open(os.path.join(directory, name), encoding='utf-8') as checkpoint_file:
+                checkpoints.append(json.load(checkpoint_file))
+    checkpoints.sort(key=lambda cp: (cp['round'], BARRIER_ORDER.index(cp['page']), cp['group']))
+    return checkpoints
+
+
+def _differences(expected, actual, label):
+    return [
+        f'{label}.{key}: checkpoint={value!r} database={_plain(actual(key))!r}'
+        for key, value in expected.items()
+        if _plain(actual(key)) != value
+    ]
+
+
+def check(checkpoint, players, group, next_round_players, latest):
+    """
+    Differences between one checkpoint and the database. players and
+    next_round_players map participant code to Player. latest is True when
+    this is the members' last committed barrier, so their barrier vars must
+    still match it.
+    """
+    problems = _differences(checkpoint['group_fields'], group.field_maybe_none, 'group')
+    for member in checkpoint['members']:
+        player = players.get(member['code'])
+        label = f"participant {member['id_in_session']}"
+        if player is None:
+            problems.append(f'{label}: missing from round {checkpoint["round"]}')
+            continue
+        problems += _differences(member['fields'], player.field_maybe_none, label)
+        next_player = next_round_players.get(member['code'])
+        if 'next_round' in member and next_player is not None:
+            problems += _differences(member['next_round'], next_player.field_maybe_none, f'{label} next round')
+        if latest:
+            barrier_vars = {key: member['vars'][key] for key in BARRIER_VARS if key in member['vars']}
+            problems += _differences(barrier_vars, player.participant.vars.get, f'{label} vars')
+    return problems
+
+
+def restore(checkpoint, players, group, next_round_players, latest):
+    """
+    Write the checkpointed state back to the database objects. The carried-over
+    vars are only restored from the members' last committed barrier.
+    """
+    for field, value in checkpoint['group_fields'].items():
+        setattr(group, field, value)
+    for member in checkpoint['members']:
+        player = players[member['code']]
+        for field, value in member['fields'].items():
+            setattr(player, field, value)
+        if latest:
+            for key, value in member['vars'].items():
+                if key in CURRENCY_VARS and value is not None:
+                    value = c(value)
+                player.participant.vars[key] = value
+        next_player = next_round_players.get(member['code'])
+        if 'next_round' in member and next_player is not None:
+            power = member['next_round']['punishment_power_before']
+            next_player.punishment_power_before = power
+            # Until the next round's transfer is submitted, its power equals the carried power.
+            if (player.participant.vars.get('power_transfer_submitted_round') or 0) < next_player.round_number:
+                next_player.punishment_power_after = power
+
+
+def resume_session(session, apply=False):
+    """
+    Check every checkpoint of session against the database, and with apply
+    restore the groups that differ. Returns one report dict per checkpoint.
+    A checkpoint whose barrier never committed is reported with
+    committed=False and neither checked nor restored.
+    """
+    from .models import Group, Player
+
+    directory = checkpoint_dir(session)
+    if directory is None:
+        raise ValueError(f'Session {session.code} has no checkpoint_dir in its config')
+    checkpoints = load(directory)
+
+    players_by_round = defaultdict(dict)
+    for player in Player.objects_filter(session_id=session.id):
+        players_by_round[player.round_number][player.participant.code] = player
+    groups = {
+        (group.round_number, group.id_in_subsession): group
+        for group in Group.objects_filter(session_id=session.id)
+    }
+
+    report = []
+    for checkpoint in checkpoints:
+        round_number = checkpoint['round']
+        players = players_by_round[round_number]
+        next_round_players = players_by_round.get(round_number + 1, {})
+        group = groups[(round_number, checkpoint['group'])]
+        position = _position(round_number, checkpoint['page'])
+        applied = [
+            applied_barrier(players[member['code']].participant)
+            for member in checkpoint['members']
+            if member['code'] in players
+        ]
+        committed = all(barrier is not None and barrier >= position for barrier in applied)
+        problems = []
+        restored = False
+        if committed:
+            is_latest = all(barrier == position for barrier in applied)
+            problems = check(checkpoint, players, group, next_round_players, is_latest)
+            if problems and apply:
+                restore(checkpoint, players, group, next_round_players, is_latest)
+                restored = True
+        report.append(
+            dict(
+                round=round_number,
+                group=checkpoint['group'],
+                page=checkpoint['page'],
+                committed=committed,
+                problems=problems,
+                restored=restored,
+            )
+        )
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Check and restore a session from its checkpoints.')
+    parser.add_argument('session_code')
+    parser.add_argument('--apply', action='store_true', help='restore the groups that differ')
+    args = parser.parse_args(argv)
+
+    import otree.main
+
+    otree.main.setup()
+    from otree.database import session_scope
+    from otree.models import Session
+
+    with session_scope():
+        session = Session.objects_get(code=args.session_code)
+        report = resume_session(session, apply=args.apply)
+
+    for entry in report:
+        if not entry['committed']:
+            print(
+                f"round {entry['round']} group {entry['group']} ({entry['page']}): "
+                'not committed, the wait page runs again'
+            )
+    inconsistent = [entry for entry in report if entry['problems']]
+    for entry in inconsistent:
+        action = 'restored' if entry['restored'] else 'differs'
+        print(f"round {entry['round']} group {entry['group']} ({entry['page']}): {action}")
+        for problem in entry['problems']:
+            print(f'  {problem}')
+    print(f'{len(report)} checkpoints, {len(inconsistent)} inconsistent')
+    if inconsistent and not args.apply:
+        print('Run again with --apply to restore them.')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,303 @@
+# game/columnar.py
+
+"""
+Columnar (Parquet) export of whole sessions.
+
+Run from the oTree project directory, with the DATABASE_URL of the server:
+
+    python -m game.columnar OUTPUT_DIR                      # every session
+    python -m game.columnar OUTPUT_DIR --session CODE ...   # some sessions
+
+Each session is written as five typed tables, in a hive-partitioned layout:
+
+    OUTPUT_DIR/<table>/treatment_name=<treatment>/session_code=<code>/part-0.parquet
+
+    players            one row per game Player (participant and round)
+    groups             one row per game Group
+    punishment_edges   one row per non-zero deduction, giver -> receiver
+    transfer_edges     one row per non-zero power transfer, giver -> receiver
+    survey             one row per survey Player, with every survey field
+
+treatment_name and session_code are not stored in the files. They come back
+as columns when the directory is read with hive partitioning. Participant
+codes are dictionary-encoded. Re-exporting a session overwrites its files.
+To read a table of every exported session at once:
+
+    load_table(OUTPUT_DIR, 'players')      # pyarrow Table
+    SELECT * FROM read_parquet('OUTPUT_DIR/players/*/*/*.parquet', hive_partitioning = true)   -- DuckDB
+
+The export needs pyarrow (pip install pyarrow), which the experiment itself
+does not use. Sessions are read and written one at a time.
+"""
+
+import argparse
+import os
+
+from . import export
+
+
+# Column kinds: id (dictionary-encoded string), int, float, str
+PLAYER_COLUMNS = (
+    ('participant_code', 'id'),
+    ('id_in_session', 'int'),
+    ('round_number', 'int'),
+    ('group_id', 'int'),
+    ('id_in_group', 'int'),
+    ('contribution', 'float'),
+    ('payoff', 'float'),
+    ('punishment_given', 'float'),
+    ('punishment_received', 'float'),
+    ('punishment_points_given_actual', 'float'),
+    ('punishment_points_received_actual', 'float'),
+    ('power_transfer_out_total', 'float'),
+    ('power_transfer_in_total', 'float'),
+    ('power_transfer_cost', 'float'),
+    ('punishment_power_before', 'float'),
+    ('punishment_power_after', 'float'),
+    ('available_endowment', 'float'),
+)
+GROUP_COLUMNS = (
+    ('round_number', 'int'),
+    ('group_id', 'int'),
+    ('total_contribution', 'float'),
+    ('individual_share', 'float'),
+)
+EDGE_KEY_COLUMNS = (
+    ('round_number', 'int'),
+    ('group_id', 'int'),
+    ('giver_id_in_group', 'int'),
+    ('giver_participant_code', 'id'),
+    ('receiver_id_in_group', 'int'),
+    ('receiver_participant_code', 'id'),
+)
+PUNISHMENT_EDGE_COLUMNS = EDGE_KEY_COLUMNS + (
+    ('punishment_points', 'int'),
+    ('effective_power', 'float'),
+    ('punishment_cost', 'float'),
+    ('punishment_loss', 'float'),
+)
+TRANSFER_EDGE_COLUMNS = EDGE_KEY_COLUMNS + (
+    ('power_transfer', 'float'),
+    ('power_transfer_cost', 'float'),
+)
+SURVEY_KEY_COLUMNS = (
+    ('participant_code', 'id'),
+    ('id_in_session', 'int'),
+)
+
+# oTree's own Player columns, left out of the survey table
+_OTREE_PLAYER_COLUMNS = frozenset(
+    ['id', 'participant_id', 'session_id', 'subsession_id', 'group_id', 'round_number', 'id_in_group']
+)
+
+
+def treatment_name(session):
+    return session.config.get('treatment_name') or session.config['name']
+
+
+def _float(value):
+    return None if value is None else float(value)
+
+
+def _column_kind(column):
+    sql_type = getattr(column.type, 'impl', column.type)
+    name = type(sql_type).__name__.lower()
+    if 'int' in name or 'bool' in name:
+        return 'int'
+    if 'float' in name or 'numeric' in name or 'currency' in name:
+        return 'float'
+    return 'str'
+
+
+def survey_columns():
+    from survey import Player as SurveyPlayer
+
+    return tuple(
+        (column.name, _column_kind(column))
+        for column in SurveyPlayer.__table__.columns
+        if not column.name.startswith('_') and column.name not in _OTREE_PLAYER_COLUMNS
+    )
+
+
+def _empty(columns):
+    return {name: [] for name, _ in columns}
+
+
+def _append(table, columns, values):
+    for (name, _), value in zip(columns, values):
+        table[name].append(value)
+
+
+def session_tables(session):
+    """
+    The five tables of one session as {table: {column: list of values}},
+    plus the column kinds as {table: columns}.
+    """
+    from otree.database import dbq
+    from otree.models import Participant
+    from survey import Player as SurveyPlayer
+
+    from .models import Group, Player
+
+    player_fields = [name for name, _ in PLAYER_COLUMNS[5:]]
+    players = _empty(PLAYER_COLUMNS)
+    query = (
+        dbq(
+            Participant.code,
+            Participant.id_in_session,
+            Player.round_number,
+            Group.id_in_subsession,
+            Player.id_in_group,
+            *[Player._payoff if name == 'payoff' else getattr(Player, name) for name in player_fields],
+        )
+        .join(Participant, Player.participant_id == Participant.id)
+        .join(Group, Player.group_id == Group.id)
+        .filter(Player.session_id == session.id)
+        .order_by(Player.round_number, Group.id_in_subsession, Player.id_in_group)
+    )
+    for row in query:
+        _append(players, PLAYER_COLUMNS, list(row[:5]) + [_float(value) for value in row[5:]])
+
+    groups = _empty(GROUP_COLUMNS)
+    query = (
+        dbq(Group.round_number, Group.id_in_subsession, Group.total_contribution, Group.individual_share)
+        .filter(Group.session_id == session.id)
+        .order_by(Group.round_number, Group.id_in_subsession)
+    )
+    for round_number, group_id, total, share in query:
+        _append(groups, GROUP_COLUMNS, [round_number, group_id, _float(total), _float(share)])
+
+    punishment_edges = _empty(PUNISHMENT_EDGE_COLUMNS)
+    transfer_edges = _empty(TRANSFER_EDGE_COLUMNS)
+    index = {name: i for i, name in enumerate(export.HEADER)}
+    for row in export.iter_rows(session.code):
+        if row[index['punishment_points']]:
+            _append(punishment_edges, PUNISHMENT_EDGE_COLUMNS,
+                    [row[index[name]] for name, _ in PUNISHMENT_EDGE_COLUMNS])
+        if row[index['power_transfer']]:
+            _append(transfer_edges, TRANSFER_EDGE_COLUMNS,
+                    [row[index[name]] for name, _ in TRANSFER_EDGE_COLUMNS])
+
+    survey_fields = survey_columns()
+    survey_kinds = SURVEY_KEY_COLUMNS + survey_fields
+    survey = _empty(survey_kinds)
+    query = (
+        dbq(
+            Participant.code,
+            Participant.id_in_session,
+            *[getattr(SurveyPlayer, name) for name, _ in survey_fields],
+        )
+        .join(Participant, SurveyPlayer.participant_id == Participant.id)
+        .filter(SurveyPlayer.session_id == session.id)
+        .order_by(Participant.id_in_session)
+    )
+    for row in query:
+        _append(survey, survey_kinds, row)
+
+    tables = dict(
+        players=players,
+        groups=groups,
+        punishment_edges=punishment_edges,
+        transfer_edges=transfer_edges,
+        survey=survey,
+    )
+    kinds = dict(
+        players=PLAYER_COLUMNS,
+        groups=GROUP_COLUMNS,
+        punishment_edges=PUNISHMENT_EDGE_COLUMNS,
+        transfer_edges=TRANSFER_EDGE_COLUMNS,
+        survey=survey_kinds,
+    )
+    return tables, kinds
+
+
+def _arrow_types():
+    import pyarrow as pa
+
+    return dict(
+        id=pa.dictionary(pa.int32(), pa.string()),
+        int=pa.int32(),
+        float=pa.float64(),
+        str=pa.string(),
+    )
+
+
+def arrow_table(columns, kinds):
+    """pyarrow Table of {name: values} typed by kinds, a sequence of (name, kind)."""
+    import pyarrow as pa
+
+    arrow_types = _arrow_types()
+    return pa.table(
+        {name: pa.array(columns[name], type=arrow_types[kind]) for name, kind in kinds}
+    )
+
+
+def parquet_writer(path, kinds):
+    """Open a Parquet file that arrow_table(columns, kinds) batches are appended to with write_table()."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    arrow_types = _arrow_types()
+    return pq.ParquetWriter(path, pa.schema([(name, arrow_types[kind]) for name, kind in kinds]))
+
+
+def write_session(output_dir, session):
+    """Write one session's tables under output_dir; returns {table: rows written}."""
+    import pyarrow.parquet as pq
+
+    tables, kinds = session_tables(session)
+    written = {}
+    for table_name, columns in tables.items():
+        directory = os.path.join(
+            output_dir,
+            table_name,
+            f'treatment_name={treatment_name(session)}',
+            f'session_code={session.code}',
+        )
+        os.makedirs(directory, exist_ok=True)
+        table = arrow_table(columns, kinds[table_name])
+        pq.write_table(table, os.path.join(directory, 'part-0.parquet'))
+        written[table_name] = table.num_rows
+    return written
+
+
+def load_table(output_dir, table_name):
+    """Read one table of every exported session, with the partition columns."""
+    import pyarrow.dataset as ds
+
+    return ds.dataset(
+        os.path.join(output_dir, table_name), format='parquet', partitioning='hive'
+    ).to_table()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Export sessions as partitioned Parquet tables.')
+    parser.add_argument('output_dir')
+    parser.add_argument('--session', action='append', help='session code (repeatable; default: all)')
+    args = parser.parse_args(argv)
+
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        parser.error('the columnar export needs pyarrow: pip install pyarrow')
+
+    import otree.main
+
+    otree.main.setup()
+    from otree.database import dbq, session_scope
+    from otree.models import Session
+
+    with session_scope():
+        sessions = dbq(Session).order_by(Session.id)
+        if args.session:
+            sessions = sessions.filter(Session.code.in_(args.session))
+        for session in sessions:
+            if 'game' not in session.config.get('app_sequence', []):
+                continue
+            written = write_session(args.output_dir, session)
+            summary = ', '.join(f'{name} {rows}' for name, rows in written.items())
+            print(f'{session.code} ({treatment_name(session)}): {summary}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,178 @@
+# game/compression.py
+
+"""
+Compressed game page responses and a per-page size report.
+
+The lab's tablets share one access point, and after every wait page a whole
+group loads its next page at once. BasePage.render_page passes every rendered
+game page through compress_response(), which:
+
+- encodes the pages in COMPRESSED_PAGES (the decision tables and the history
+  modal) with brotli or gzip, when the browser accepts it and the session
+  config's compress_pages is on
+- records, per page and round, the responses served, the HTML bytes and the
+  bytes actually sent
+
+Browser-bot responses are not compressed, because oTree appends its
+auto-submit script to their body afterwards.
+
+The static bundles (game.assets) are compressed once, at build time, and the
+static app serves their .br/.gz files. Brotli needs the brotli package
+(pip install brotli); without it, pages and bundles use gzip only.
+
+The size report covers the server process, like the page_timing histogram.
+It is shown in the game app's admin report, and snapshot() returns its rows.
+"""
+
+import gzip
+import threading
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+# Pages worth compressing on the fly
+COMPRESSED_PAGES = ('Contribution', 'PowerTransfer', 'Punishment', 'PunishmentResult')
+
+# Responses smaller than this are sent as they are
+MIN_COMPRESS_BYTES = 1024
+
+# Encodings in order of preference
+PREFERENCE = ('br', 'gzip')
+SUFFIXES = dict(br='.br', gzip='.gz')
+
+# On-the-fly levels favour speed; build-time compression uses the maximum
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+_lock = threading.Lock()
+
+# (page, round_number) -> [responses, html_bytes, sent_bytes]
+_SIZES = {}
+
+
+def available_encodings():
+    """Encodings this process can produce, in order of preference."""
+    return tuple(encoding for encoding in PREFERENCE if encoding != 'br' or brotli is not None)
+
+
+def accepted_encodings(header):
+    """Encodings an Accept-Encoding header allows (q > 0), lowercased."""
+    accepted = set()
+    for item in (header or '').split(','):
+        token, _, params = item.partition(';')
+        token = token.strip().lower()
+        if not token:
+            continue
+        quality = 1.0
+        params = params.strip().lower()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        if quality > 0:
+            accepted.add(token)
+    return accepted
+
+
+def choose_encoding(header, encodings=None):
+    """
+    The preferred encoding that header accepts, or None. encodings limits the
+    choice (default: available_encodings()), e.g. to the precompressed copies
+    of a file.
+    """
+    accepted = accepted_encodings(header)
+    for encoding in available_encodings() if encodings is None else encodings:
+        if encoding in accepted or '*' in accepted:
+            return encoding
+    return None
+
+
+def compress(data, encoding, best=False):
+    if encoding == 'br':
+        return brotli.compress(data, quality=11 if best else BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=9 if best else GZIP_LEVEL, mtime=0)
+
+
+def decompress(data, encoding):
+    if encoding == 'br':
+        return brotli.decompress(data)
+    return gzip.decompress(data)
+
+
+def record(page_name, round_number, html_bytes, sent_bytes):
+    key = (page_name, round_number)
+    with _lock:
+        sizes = _SIZES.get(key)
+        if sizes is None:
+            sizes = _SIZES[key] = [0, 0, 0]
+        sizes[0] += 1
+        sizes[1] += html_bytes
+        sizes[2] += sent_bytes
+
+
+def compress_response(response, request, page_name, player):
+    """Compress one rendered page if it qualifies, and record its size."""
+    body = response.body
+    sent_bytes = len(body)
+    config = player.session.config
+    if (
+        page_name in COMPRESSED_PAGES
+        and config.get('compress_pages', True)
+        and not player.participant.is_browser_bot
+        and len(body) >= MIN_COMPRESS_BYTES
+        and 'content-encoding' not in response.headers
+    ):
+        encoding = choose_encoding(request.headers.get('accept-encoding'))
+        if encoding is not None:
+            compressed = compress(body, encoding)
+            response.body = compressed
+            response.headers['Content-Encoding'] = encoding
+            response.headers['Content-Length'] = str(len(compressed))
+            response.headers['Vary'] = 'Accept-Encoding'
+            sent_bytes = len(compressed)
+    record(page_name, player.round_number, len(body), sent_bytes)
+    return response
+
+
+def _row(page_name, round_number, responses, html_bytes, sent_bytes):
+    return dict(
+        page=page_name,
+        round_number=round_number,
+        responses=responses,
+        html_bytes=html_bytes,
+        sent_bytes=sent_bytes,
+        mean_html_bytes=round(html_bytes / responses) if responses else 0,
+        mean_sent_bytes=round(sent_bytes / responses) if responses else 0,
+        saved_pct=round(100 * (1 - sent_bytes / html_bytes), 1) if html_bytes else 0.0,
+    )
+
+
+def snapshot(round_number=None):
+    """Size rows by round and page; round_number keeps only that round."""
+    with _lock:
+        items = list(_SIZES.items())
+    return [
+        _row(page_name, row_round, *sizes)
+        for (page_name, row_round), sizes in sorted(items, key=lambda item: (item[0][1], item[0][0]))
+        if round_number is None or row_round == round_number
+    ]
+
+
+def round_totals(rows):
+    """One row per round summing the page rows (page is None)."""
+    totals = {}
+    for row in rows:
+        total = totals.setdefault(row['round_number'], [0, 0, 0])
+        total[0] += row['responses']
+        total[1] += row['html_bytes']
+        total[2] += row['sent_bytes']
+    return [_row(None, round_number, *total) for round_number, total in sorted(totals.items())]
+
+
+def reset():
+    with _lock:
+        _SIZES.clear()
@@ -0,0 +1,349 @@
+# game/eventlog.py
+
+"""
+Append-only decision event log and deterministic replay.
+
+When the session config sets event_log_dir, each session appends one JSON
+line per event to <event_log_dir>/<session_code>.jsonl:
+
+    session   config and number of participants (written when a process
+              first logs for the session)
+    page      a game page submission: round, page, participant, whether it
+              timed out, and for decision pages the values that were stored
+    dismiss   a participant dismissed the dropout warning
+    barrier   a group completed a wait page, with its members in id order
+    group_wait
+              ExperimentGroupWait formed a group: why, its size, each
+              member's wait and any agents (see game.grouping)
+
+Events are buffered in memory. The buffer is flushed at every barrier and
+whenever it holds FLUSH_EVERY events. A crash therefore loses at most the
+submissions since the group's last wait page, and those are the
+submissions replay ignores anyway.
+
+replay() rebuilds a session from its log alone. It runs the game's own
+page code through game.simulator. Groups come from the barrier events, and
+every participant re-submits their logged pages in order. It stops after
+the last round in which every group logged the wait page that settles
+payoffs. Timeouts are replayed as timeouts, so the defaults, dropout
+streaks and early stop are recomputed rather than copied. Each logged
+decision is checked against the replayed one, and any difference raises
+ReplayError. The result has the same shape as simulate_session(), with
+every payoff, power and endowment per player and round.
+
+Run from the oTree project directory:
+
+    python -m game.eventlog event_logs/<session_code>.jsonl
+"""
+
+import argparse
+import atexit
+import json
+import os
+from collections import defaultdict
+
+from .models import decode_edges
+
+
+# Buffered events per session before a write is forced
+FLUSH_EVERY = 50
+
+# Decision pages and the stored fields their events carry
+DECISION_FIELDS = dict(
+    Contribution=('contribution',),
+    PowerTransfer=('power_transfer_edges',),
+    Punishment=('punishment_edges',),
+)
+
+# session code -> EventWriter
+_WRITERS = {}
+
+
+class ReplayError(Exception):
+    pass
+
+
+class EventWriter:
+    """Buffers the events of one session and appends them to its log file."""
+
+    def __init__(self, path, session):
+        self.path = path
+        self.buffer = []
+        self.write(
+            dict(
+                event='session',
+                session_code=session.code,
+                num_participants=session.num_participants,
+                config=dict(session.config),
+            )
+        )
+
+    def write(self, event):
+        self.buffer.append(json.dumps(event, default=str, ensure_ascii=False) + '\n')
+        if len(self.buffer) >= FLUSH_EVERY:
+            self.flush()
+
+    def flush(self):
+        if not self.buffer:
+            return
+        with open(self.path, 'a', encoding='utf-8') as log_file:
+            log_file.writelines(self.buffer)
+        self.buffer = []
+
+
+def log_path(session):
+    """Path of the session's event log, or None when logging is off."""
+    log_dir = session.config.get('event_log_dir')
+    if not log_dir:
+        return None
+    return os.path.join(log_dir, f'{session.code}.jsonl')
+
+
+def _writer(session):
+    writer = _WRITERS.get(session.code)
+    if writer is None:
+        path = log_path(session)
+        if path is None:
+            return None
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        writer = EventWriter(path, session)
+        _WRITERS[session.code] = writer
+    return writer
+
+
+def _stored_value(player, field):
+    value = player.field_maybe_none(field)
+    if field.endswith('_edges'):
+        return {str(target): amount for target, amount in decode_edges(value, float).items()}
+    return float(value) if value is not None else None
+
+
+def record_page(player, page_name, timeout_happened, server=False):
+    """
+    Log one page submission. Call it at the end of before_next_page, so
+    decision events carry the values that were actually stored. server marks
+    submissions that the server made for autoplayed dropouts.
+    """
+    writer = _writer(player.session)
+    if writer is None:
+        return
+    event = dict(
+        event='page',
+        round=player.round_number,
+        page=page_name,
+        participant=player.participant.id_in_session,
+        timeout=bool(timeout_happened),
+    )
+    if server:
+        event['server'] = True
+    fields = DECISION_FIELDS.get(page_name)
+    if fields:
+        event['values'] = {field: _stored_value(player, field) for field in fields}
+    writer.write(event)
+
+
+def record_dismiss(player):
+    writer = _writer(player.session)
+    if writer is not None:
+        writer.write(
+            dict(event='dismiss', round=player.round_number, participant=player.participant.id_in_session)
+        )
+
+
+def record_barrier(group, page_name, players):
+    """Log that group completed the wait page page_name, and flush the buffer."""
+    writer = _writer(group.session)
+    if writer is None:
+        return
+    writer.write(
+        dict(
+            event='barrier',
+            round=group.round_number,
+            page=page_name,
+            group=group.id_in_subsession,
+            members=[
+                p.participant.id_in_session
+                for p in sorted(players, key=lambda p: p.id_in_group)
+            ],
+        )
+    )
+    writer.flush()
+
+
+def record_group_wait(session, entry):
+    writer = _writer(session)
+    if writer is not None:
+        writer.write(dict(event='group_wait', **entry))
+        writer.flush()
+
+
+@atexit.register
+def flush_all():
+    for writer in _WRITERS.values():
+        writer.flush()
+
+
+def forget(session_code):
+    """Flush and drop the writer of a session."""
+    writer = _WRITERS.pop(session_code, None)
+    if writer is not None:
+        writer.flush()
+
+
+def read_events(path):
+    with open(path, encoding='utf-8') as log_file:
+        return [json.loads(line) for line in log_file if line.strip()]
+
+
+# =============================================================================
+# Replay
+# =============================================================================
+def _payoff_page(round_number):
+    return 'ContributionWaitPage' if round_number == 1 else 'PunishmentWaitPage'
+
+
+def settled_rounds(events):
+    """
+    Group matrices (id_in_session) per round, for the rounds in which every
+    group completed the wait page that settles payoffs.
+    """
+    matrices = defaultdict(dict)
+    settled = defaultdict(set)
+    for event in events:
+        if event['event'] != 'barrier':
+            continue
+        round_number = event['round']
+        matrices[round_number][event['group']] = event['members']
+        if event['page'] == _payoff_page(round_number):
+            settled[round_number].add(event['group'])
+
+    rounds = {}
+    for round_number in sorted(matrices):
+        groups = matrices[round_number]
+        if round_number - 1 not in rounds and round_number > 1:
+            break
+        if settled[round_number] != set(groups):
+            break
+        rounds[round_number] = [groups[group] for group in sorted(groups)]
+    return rounds
+
+
+class ReplayStrategy:
+    """Re-submits one participant's logged pages in order (see game.simulator.Strategy)."""
+
+    def __init__(self, events, last_round):
+        self.events = [
+            event
+            for event in events
+            if event['event'] in ('page', 'dismiss')
+            and not event.get('server')
+            and event['round'] <= last_round
+        ]
+        self.position = 0
+        self.pending = None
+
+    def decide(self, page, player):
+        # Imported here because pages imports this module.
+        from . import pages, simulator
+
+        self.verify()
+        name = page.__name__
+        while self.position < len(self.events) and self.events[self.position]['event'] == 'dismiss':
+            pages._reset_dropout_state(player)
+            self.position += 1
+        if self.position == len(self.events):
+            if name in DECISION_FIELDS:
+                raise ReplayError(
+                    f'Log ends before participant {player.participant.id_in_session} '
+                    f'submitted {name} in round {player.round_number}'
+                )
+            # The log was cut after this round settled.
+            return {}
+        event = self.events[self.position]
+        self.position += 1
+        if event['page'] != name or event['round'] != player.round_number:
+            raise ReplayError(
+                f'Participant {player.participant.id_in_session} reached {name} in round '
+                f'{player.round_number}, but the log has {event["page"]} in round {event["round"]}'
+            )
+        if name in DECISION_FIELDS:
+            self.pending = (player, event)
+        if event['timeout']:
+            return simulator.TIMEOUT
+        values = event.get('values') or {}
+        return {
+            field: json.dumps(value) if field.endswith('_edges') else value
+            for field, value in values.items()
+        }
+
+    def verify(self):
+        """Check that the last replayed decision stored what the log recorded."""
+        if self.pending is None:
+            return
+        player, event = self.pending
+        self.pending = None
+        replayed = {field: _stored_value(player, field) for field in event['values']}
+        if replayed != event['values']:
+            raise ReplayError(
+                f'Replay diverged: participant {player.participant.id_in_session} '
+                f'{event["page"]} round {event["round"]}: logged={event["values"]} '
+                f'replayed={replayed}'
+            )
+
+
+def replay(path):
+    """Rebuild the session logged at path; returns a simulate_session()-style result."""
+    from . import simulator  # see ReplayStrategy.decide
+
+    events = read_events(path)
+    header = next((event for event in events if event['event'] == 'session'), None)
+    if header is None:
+        raise ReplayError(f'{path} has no session header')
+    rounds = settled_rounds(events)
+    if not rounds:
+        raise ReplayError(f'{path} has no settled round to replay')
+
+    last_round = max(rounds)
+    by_participant = defaultdict(list)
+    for event in events:
+        if 'participant' in event:
+            by_participant[event['participant']].append(event)
+    num_participants = header['num_participants']
+    strategies = [
+        ReplayStrategy(by_participant[id_in_session], last_round)
+        for id_in_session in range(1, num_participants + 1)
+    ]
+
+    config = dict(header['config'], event_log_dir=None)
+    result = simulator.simulate_session(
+        config,
+        strategy=strategies,
+        num_participants=num_participants,
+        group_matrices=rounds,
+        rounds=last_round,
+    )
+    for strategy in strategies:
+        strategy.verify()
+    result['session_code'] = header['session_code']
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Replay a session from its event log.')
+    parser.add_argument('path')
+    parser.add_argument('--json', action='store_true', help='print the full replay result as JSON')
+    args = parser.parse_args(argv)
+
+    result = replay(args.path)
+    if args.json:
+        print(json.dumps(result, indent=2, default=str))
+        return
+    print(f"session: {result['session_code']}  rounds replayed: {result['rounds_played']}  "
+          f"early stop: {result['early_stop_round']}")
+    for participant in result['participants']:
+        print(f"  participant {participant['id_in_session']}: payoff {participant['payoff']:.1f}  "
+              f"power {participant['punishment_power']}  dropout {participant['dropout']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,225 @@
+# game/export.py
+
+"""
+Long-format (edge-list) export of the game app.
+
+Every row is one ordered pair of group members in one round: giver ->
+receiver, with the deduction points the giver assigned, the giver's
+effective power, the resulting cost and loss, and the power transferred
+along the same edge. Every ordered pair of members gets a row, including
+pairs with no deduction or transfer. Rounds a group never reached (for
+example after an early stop) are skipped.
+
+Two entry points share the row builder:
+
+- custom_export(players) is oTree's custom export ("game" app, Data page).
+  oTree hands it the players already loaded, ordered by id, so the rows of
+  one subsession are contiguous. The generator buffers one subsession at a
+  time and yields its rows before reading the next.
+- python -m game.export reads the database itself in CHUNK_SIZE slices of
+  plain columns (no ORM objects and no participant.vars) and writes the CSV
+  as it goes. Memory stays flat however many sessions are exported:
+
+      python -m game.export -o edges.csv                 # all sessions
+      python -m game.export -o edges.csv --session CODE  # one session
+"""
+
+import argparse
+import csv
+import sys
+from collections import namedtuple
+
+from . import ledger
+from .models import Constants, decode_edges
+
+
+HEADER = [
+    'session_code',
+    'round_number',
+    'group_id',
+    'giver_id_in_group',
+    'giver_participant_code',
+    'receiver_id_in_group',
+    'receiver_participant_code',
+    'punishment_points',
+    'effective_power',
+    'punishment_cost',
+    'punishment_loss',
+    'power_transfer',
+    'power_transfer_cost',
+]
+
+# Player rows per database read in the command-line export
+CHUNK_SIZE = 2000
+
+# What the row builder needs from one group member
+Member = namedtuple(
+    'Member', 'id_in_group code punishment_edges power_transfer_edges power'
+)
+
+
+class ExportParams:
+    """The session settings that turn points and transfers into MU."""
+
+    def __init__(self, session):
+        config = session.config
+        self.session_code = session.code
+        self.cost_per_point = config.get('punishment_cost', 1)
+        self.effectiveness = config.get('power_effectiveness', Constants.power_effectiveness)
+        self.step = ledger.power_step(session)
+        rate = config.get('power_transfer_cost_rate', 0)
+        costly = config.get('costly_punishment_transfer') and ledger.has_transfer_grid(session)
+        self.transfer_cost_rate = rate if costly else 0
+
+
+def group_rows(params, round_number, group_id, members):
+    """Rows for every ordered pair of one group's members in one round."""
+    members = sorted(members, key=lambda m: m.id_in_group)
+    for giver in members:
+        points_to = decode_edges(giver.punishment_edges, int)
+        transfer_to = decode_edges(giver.power_transfer_edges, float)
+        # Same power as Group.set_payoff (see payoff.load_group_state).
+        power = giver.power if giver.power is not None else 1.0
+        for receiver in members:
+            if receiver.id_in_group == giver.id_in_group:
+                continue
+            points = points_to.get(receiver.id_in_group, 0)
+            transfer = transfer_to.get(receiver.id_in_group, 0)
+            yield [
+                params.session_code,
+                round_number,
+                group_id,
+                giver.id_in_group,
+                giver.code,
+                receiver.id_in_group,
+                receiver.code,
+                points,
+                power,
+                points * params.cost_per_point,
+                points * params.effectiveness * power,
+                transfer,
+                ledger.power_units(transfer, params.step) * params.transfer_cost_rate,
+            ]
+
+
+def _subsession_rows(params, groups):
+    for (round_number, group_id) in sorted(groups):
+        reached, members = groups[(round_number, group_id)]
+        if reached:
+            yield from group_rows(params, round_number, group_id, members)
+
+
+def custom_export(players):
+    """oTree custom export: one row per (round, group, giver, receiver)."""
+    yield HEADER
+    params_by_session = {}
+    subsession_id = None
+    groups = {}
+    params = None
+    for player in players:
+        if player.subsession_id != subsession_id:
+            if groups:
+                yield from _subsession_rows(params, groups)
+            subsession_id = player.subsession_id
+            groups = {}
+            params = params_by_session.get(player.session_id)
+            if params is None:
+                params = params_by_session[player.session_id] = ExportParams(player.session)
+        group = player.group
+        key = (player.round_number, group.id_in_subsession)
+        entry = groups.setdefault(key, (group.field_maybe_none('total_contribution') is not None, []))
+        entry[1].append(
+            Member(
+                player.id_in_group,
+                player.participant.code,
+                player.field_maybe_none('punishment_edges'),
+                player.field_maybe_none('power_transfer_edges'),
+                player.field_maybe_none('punishment_power_after'),
+            )
+        )
+    if groups:
+        yield from _subsession_rows(params, groups)
+
+
+def iter_rows(session_code=None, chunk_size=CHUNK_SIZE):
+    """
+    Rows (after HEADER) for one session or all sessions, read from the
+    database in chunks of chunk_size Player rows.
+    """
+    from otree.database import dbq
+    from otree.models import Participant, Session
+
+    from .models import Group, Player
+
+    sessions = dbq(Session)
+    if session_code:
+        sessions = sessions.filter(Session.code == session_code)
+    params_by_session = {session.id: ExportParams(session) for session in sessions}
+    if not params_by_session:
+        return
+
+    columns = dbq(
+        Player.id,
+        Player.session_id,
+        Player.subsession_id,
+        Player.round_number,
+        Player.id_in_group,
+        Player.punishment_edges,
+        Player.power_transfer_edges,
+        Player.punishment_power_after,
+        Participant.code,
+        Group.id_in_subsession,
+        Group.total_contribution,
+    ).join(Participant, Player.participant_id == Participant.id).join(
+        Group, Player.group_id == Group.id
+    ).filter(Player.session_id.in_(list(params_by_session)))
+
+    subsession_id = None
+    groups = {}
+    params = None
+    last_id = 0
+    while True:
+        chunk = columns.filter(Player.id > last_id).order_by(Player.id).limit(chunk_size).all()
+        if not chunk:
+            break
+        last_id = chunk[-1][0]
+        for (_, session_id, row_subsession_id, round_number, id_in_group, punishment_edges,
+             power_transfer_edges, power, code, group_id, total_contribution) in chunk:
+            if row_subsession_id != subsession_id:
+                if groups:
+                    yield from _subsession_rows(params, groups)
+                subsession_id = row_subsession_id
+                groups = {}
+                params = params_by_session[session_id]
+            entry = groups.setdefault((round_number, group_id), (total_contribution is not None, []))
+            entry[1].append(Member(id_in_group, code, punishment_edges, power_transfer_edges, power))
+    if groups:
+        yield from _subsession_rows(params, groups)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Export the game app as an edge list.')
+    parser.add_argument('-o', '--output', help='CSV file to write (default: stdout)')
+    parser.add_argument('--session', help='export only this session code')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    args = parser.parse_args(argv)
+
+    import otree.main
+
+    otree.main.setup()
+    from otree.database import session_scope
+
+    output = open(args.output, 'w', newline='', encoding='utf-8') if args.output else sys.stdout
+    try:
+        writer = csv.writer(output)
+        writer.writerow(HEADER)
+        with session_scope():
+            for row in iter_rows(args.session, args.chunk_size):
+                writer.writerow(row)
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,257 @@
+# game/grouping.py
+
+"""
+Group formation at ExperimentGroupWait.
+
+Participants finish the introduction app at different speeds. oTree calls
+Subsession.group_by_arrival_time_method every time someone loads the wait
+page, which reloads itself every 2 seconds. choose_group() then decides:
+
+- when at least a full group is waiting, the longest-waiting members form a
+  group at once, since any further wait only adds idle time
+- otherwise it predicts when each participant still in the introduction will
+  arrive, from the pages they have completed (intro_page_times, recorded by
+  the introduction app) and their own pace, or the median pace of everyone
+  when they have none yet. A participant with rules_completed is on the way.
+  A participant who has not opened their link is assumed to start now
+- the members wait while the group is predicted to fill before the longest
+  waiter has waited group_wait_max_seconds. Once that deadline passes, or
+  as soon as the group is predicted to miss it, they stop waiting and the
+  session config's group_wait_fallback applies:
+
+    'bots'     the empty seats go to reserved agent seats. They become
+               server-side agents (group_wait_agent): their game pages are
+               skipped and each wait page submits the timeout defaults for
+               them, like dropouts under dropout_server_autoplay. If too few
+               seats are left, 'smaller' applies
+    'smaller'  the waiting members form a smaller group, if there are at
+               least group_wait_min_size of them
+
+This is a deadline rule, not an optimizer: stopping as soon as a full group
+is predicted to miss the deadline is what saves idle time, and nothing
+trades one group's wait against another's.
+
+Agent seats are the last group_wait_agent_seats participants of the session,
+so the session is created with that many participants on top of the ones
+recruited. creating_session marks them visited, which keeps session-wide
+links and rooms from ever handing them to a person, and they never count as
+someone on the way. A participant who opens their link late is therefore
+never replaced: they arrive at the wait page and are grouped like anyone
+else. Unused seats simply stay at the start of the session.
+
+With group_wait_max_seconds unset (the default), the wait page waits for
+full groups as before.
+
+Every group formed here is logged: session.vars['group_waits'] keeps one
+entry per group (reason, size, each member's wait in seconds, the agents and
+how far off the predicted full group was), which the admin report shows. The
+event log (event_log_dir) gets the same entry as a group_wait event.
+"""
+
+import math
+import statistics
+import time
+
+
+INTRO_APP = 'introduction'
+GAME_APP = 'game'
+
+# Seconds per introduction page assumed before any page has been completed
+DEFAULT_PAGE_SECONDS = 60
+
+
+def agent_seats(session):
+    """Reserved agent seats; only arrival-time grouping uses them."""
+    if not session.config.get('group_by_arrival_time', True):
+        return 0
+    return int(session.config.get('group_wait_agent_seats') or 0)
+
+
+def reserve_agent_seats(session, players):
+    """Set aside the last agent_seats(session) participants (players of round 1) as agent seats."""
+    seats = agent_seats(session)
+    if not seats:
+        return
+    for player in sorted(players, key=lambda p: p.participant.id_in_session)[-seats:]:
+        player.participant.visited = True
+        player.participant.vars['group_wait_agent_seat'] = True
+
+
+def _is_agent_seat(participant):
+    return bool(participant.vars.get('group_wait_agent_seat'))
+
+
+def record_intro_start(player):
+    player.participant.vars.setdefault('intro_started_at', time.time())
+
+
+def record_intro_page(player):
+    """Timestamp one completed introduction page."""
+    participant_vars = player.participant.vars
+    now = time.time()
+    participant_vars.setdefault('intro_started_at', now)
+    participant_vars['intro_page_times'] = list(participant_vars.get('intro_page_times') or []) + [now]
+
+
+def intro_progress(participant):
+    participant_vars = participant.vars
+    return dict(
+        visited=bool(participant.visited),
+        started_at=participant_vars.get('intro_started_at'),
+        page_times=list(participant_vars.get('intro_page_times') or []),
+        rules_completed=bool(participant_vars.get('rules_completed')),
+    )
+
+
+def page_seconds(progress):
+    """Mean seconds per completed introduction page, or None before the first one."""
+    times = progress['page_times']
+    if not times or progress['started_at'] is None:
+        return None
+    return max(0.0, (times[-1] - progress['started_at']) / len(times))
+
+
+def typical_page_seconds(progresses, default=DEFAULT_PAGE_SECONDS):
+    observed = [seconds for seconds in map(page_seconds, progresses) if seconds is not None]
+    return statistics.median(observed) if observed else default
+
+
+def predict_arrival(progress, now, typical, intro_pages):
+    """Predicted time (time.time() scale) at which a participant reaches the wait page."""
+    if progress['rules_completed']:
+        return now
+    if not progress['visited']:
+        return now + intro_pages * typical
+    times = progress['page_times']
+    pace = page_seconds(progress)
+    if pace is None:
+        pace = typical
+    last = times[-1] if times else (progress['started_at'] or now)
+    remaining = max(intro_pages - len(times), 1)
+    return max(now, last + remaining * pace)
+
+
+def _intro_pages(session):
+    from otree import lookup
+
+    start = lookup.get_min_idx_for_app(session.code, INTRO_APP)
+    end = lookup.get_min_idx_for_app(session.code, GAME_APP)
+    if start is None or end is None:
+        return 0
+    return max(0, end - start)
+
+
+def _index_after_game(session, participant):
+    """Page index of the first page after the game app."""
+    from otree import lookup
+
+    app_sequence = session.config['app_sequence']
+    position = app_sequence.index(GAME_APP)
+    if position + 1 < len(app_sequence):
+        return lookup.get_min_idx_for_app(session.code, app_sequence[position + 1])
+    return participant._max_page_index + 1
+
+
+def _wait_since(player):
+    return player.participant.vars['group_wait_since']
+
+
+def _make_agent(player, session):
+    """Seat a server-side agent on a reserved agent seat."""
+    participant = player.participant
+    participant.vars['group_wait_agent'] = True
+    # Past the game app, so the group's wait pages never wait for this seat.
+    participant._index_in_pages = _index_after_game(session, participant)
+
+
+def log_wait(session, entry):
+    session.vars['group_waits'] = list(session.vars.get('group_waits') or []) + [entry]
+    from . import eventlog
+
+    eventlog.record_group_wait(session, entry)
+
+
+def admin_rows(session):
+    """The logged groups as admin report rows."""
+    return [
+        dict(
+            reason=entry['reason'],
+            size=entry['size'],
+            waits=', '.join('{}: {}'.format(m['participant'], m['wait_seconds']) for m in entry['members']),
+            agents=', '.join(str(agent) for agent in entry['agents']) or '-',
+            full_group_in_seconds=entry['full_group_in_seconds'],
+        )
+        for entry in session.vars.get('group_waits') or []
+    ]
+
+
+def _form_group(session, members, agents, now, reason, expected_full_at=None):
+    for player in agents:
+        _make_agent(player, session)
+    group = members + agents
+    for player in group:
+        player.participant.vars['group_members'] = len(group)
+    log_wait(
+        session,
+        dict(
+            formed_at=round(now, 3),
+            reason=reason,
+            size=len(group),
+            members=[
+                dict(participant=player.participant.id_in_session, wait_seconds=round(now - _wait_since(player), 1))
+                for player in members
+            ],
+            agents=[player.participant.id_in_session for player in agents],
+            full_group_in_seconds=(
+                None
+                if expected_full_at is None or math.isinf(expected_full_at)
+                else round(expected_full_at - now, 1)
+            ),
+        ),
+    )
+    return group
+
+
+def choose_group(subsession, waiting_players, size, now=None):
+    """The players of the next group, or None to keep waiting (see the module docstring)."""
+    session = subsession.session
+    config = session.config
+    now = time.time() if now is None else now
+    for player in waiting_players:
+        player.participant.vars.setdefault('group_wait_since', now)
+    waiting = sorted(waiting_players, key=lambda p: (_wait_since(p), p.participant.id_in_session))
+    if len(waiting) >= size:
+        return _form_group(session, waiting[:size], [], now, 'full')
+
+    max_wait = config.get('group_wait_max_seconds')
+    if not waiting or max_wait is None:
+        return None
+
+    waiting_ids = {player.participant.id_in_session for player in waiting}
+    ungrouped = sorted(
+        (
+            player
+            for player in subsession.get_players()
+            if not player.participant._gbat_grouped
+            and player.participant.id_in_session not in waiting_ids
+        ),
+        key=lambda p: p.participant.id_in_session,
+    )
+    pending = [player for player in ungrouped if not _is_agent_seat(player.participant)]
+    progresses = [intro_progress(player.participant) for player in pending]
+    typical = typical_page_seconds(progresses + [intro_progress(player.participant) for player in waiting])
+    intro_pages = _intro_pages(session)
+    arrivals = sorted(predict_arrival(progress, now, typical, intro_pages) for progress in progresses)
+    needed = size - len(waiting)
+    expected_full_at = arrivals[needed - 1] if len(arrivals) >= needed else math.inf
+    deadline = _wait_since(waiting[0]) + max_wait
+    if now < deadline and expected_full_at <= deadline:
+        return None
+
+    if config.get('group_wait_fallback', 'smaller') == 'bots':
+        agents = [player for player in ungrouped if _is_agent_seat(player.participant)][:needed]
+        if len(agents) == needed:
+            return _form_group(session, waiting, agents, now, 'bots', expected_full_at)
+    if len(waiting) >= config.get('group_wait_min_size', 2):
+        return _form_group(session, waiting, [], now, 'smaller', expected_full_at)
+    return None
@@ -0,0 +1,84 @@
+# game/ledger.py
+
+"""
+Fixed-point ledger for MU and deduction power.
+
+MU amounts are Currency values, and with POINTS_DECIMAL_PLACES = 1 every
+stored amount is a whole number of tenths. Deduction power only moves in
+multiples of punishment_transfer_unit. The transfer and payoff code converts
+both to integers on the way in: MU to tenths, and power to transfer units.
+It does its sums and comparisons on those integers and converts back only
+when it writes a model field. Integer sums are exact, so neither value drifts
+over the rounds. A transfer is on the grid exactly when it converts to a
+whole number of units.
+
+The model fields keep their Currency and Float types, so stored data and
+exports do not change.
+"""
+
+from decimal import Decimal, InvalidOperation
+
+from otree.api import Currency as c
+
+
+# Tenths per MU (POINTS_DECIMAL_PLACES = 1)
+MU_SCALE = 10
+
+# Power resolution when punishment_transfer_unit is 0 (no grid): three decimals
+POWER_RESOLUTION = Decimal('0.001')
+
+# Float noise below this many decimals is dropped before a grid check
+INPUT_DECIMALS = 9
+
+
+def to_tenths(amount):
+    """Currency or number -> whole tenths of an MU (None counts as 0)."""
+    return int(round(float(amount or 0) * MU_SCALE))
+
+
+def from_tenths(tenths):
+    """Whole tenths of an MU -> Currency."""
+    return c(tenths / MU_SCALE)
+
+
+def power_step(session):
+    """Size of one power unit in this session, as a Decimal."""
+    unit = session.config.get('punishment_transfer_unit', 0.1)
+    try:
+        step = Decimal(str(float(unit or 0)))
+    except (TypeError, ValueError, InvalidOperation):
+        return POWER_RESOLUTION
+    return step if step > 0 else POWER_RESOLUTION
+
+
+def has_transfer_grid(session):
+    """True when transfers must be multiples of punishment_transfer_unit."""
+    try:
+        return float(session.config.get('punishment_transfer_unit', 0.1) or 0) > 0
+    except (TypeError, ValueError):
+        return False
+
+
+def _decimal(amount):
+    return Decimal(str(round(float(amount or 0), INPUT_DECIMALS)))
+
+
+def power_units(amount, step):
+    """Power -> nearest whole number of units (half to even, like round())."""
+    return int(round(_decimal(amount) / step))
+
+
+def exact_power_units(amount, step):
+    """Power -> whole number of units, or None when amount is off the grid."""
+    try:
+        units = _decimal(amount) / step
+    except (TypeError, ValueError, OverflowError, InvalidOperation):
+        return None
+    if not units.is_finite() or units != units.to_integral_value():
+        return None
+    return int(units)
+
+
+def from_power_units(units, step):
+    """Whole units of power -> float for the model fields."""
+    return float(units * step)
@@ -0,0 +1,288 @@
+# game/metrics.py
+
+"""
+Live session health, served from memory on a local HTTP port.
+
+When a session's config sets metrics_port, the game pages report to this
+module. They report each page submission, each completed wait page and each
+dismissed dropout warning. From those reports it keeps, per group:
+
+    round, phase     the round and stage the group is in: power_transfer,
+                     contribution, punishment, results or finished
+    phase_seconds    time since the group entered that phase
+    submitted        members who submitted the phase's decision page
+    dropouts         members with dropout_confirmed
+    timeout streaks  each member's consecutive_timeouts
+
+and per session the early stop round (session.vars['early_stop_round']).
+
+The first report starts a small HTTP server thread on 127.0.0.1:<metrics_port>.
+It serves
+
+    /metrics         Prometheus text format
+    /metrics.json    the same data as JSON
+
+Both are built from the in-memory state alone, so polling never touches the
+database. metrics_port = 0 binds a free port, and server_port(0) returns it.
+The state covers the sessions of this server process since it started.
+"""
+
+import json
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from .models import Constants
+
+
+logger = logging.getLogger(__name__)
+
+# Phase a group enters when one of its wait pages completes
+PHASE_AFTER_BARRIER = dict(
+    PowerTransferWait='contribution',
+    ContributionWaitPage='punishment',
+    PunishmentWaitPage='results',
+)
+
+# Decision page -> the phase it belongs to
+DECISION_PHASES = dict(
+    PowerTransfer='power_transfer',
+    Contribution='contribution',
+    Punishment='punishment',
+)
+
+# Pages whose submission ends a member's round
+ROUND_END_PAGES = ('RoundResult', 'MergedResult')
+
+_lock = threading.Lock()
+
+# session code -> SessionHealth
+_SESSIONS = {}
+
+# configured port -> ThreadingHTTPServer
+_SERVERS = {}
+
+
+class GroupHealth:
+    def __init__(self, group_id, round_number, phase, now):
+        self.group_id = group_id
+        self.round_number = round_number
+        self.phase = phase
+        self.phase_since = now
+        self.submitted = set()
+        self.timeout_streaks = {}
+        self.dropouts = set()
+
+    def enter(self, round_number, phase, now):
+        if (round_number, phase) == (self.round_number, self.phase):
+            return
+        self.round_number = round_number
+        self.phase = phase
+        self.phase_since = now
+        self.submitted = set()
+
+    def as_dict(self, now):
+        return dict(
+            group=self.group_id,
+            round=self.round_number,
+            phase=self.phase,
+            phase_seconds=round(now - self.phase_since, 3),
+            submitted=len(self.submitted),
+            dropouts=len(self.dropouts),
+            timeout_streaks={str(member): streak for member, streak in sorted(self.timeout_streaks.items())},
+        )
+
+
+class SessionHealth:
+    def __init__(self, code):
+        self.code = code
+        self.early_stop_round = None
+        self.groups = {}
+
+    def as_dict(self, now):
+        return dict(
+            session=self.code,
+            early_stop_armed=bool(self.early_stop_round),
+            early_stop_round=self.early_stop_round,
+            groups=[self.groups[group_id].as_dict(now) for group_id in sorted(self.groups)],
+        )
+
+
+def _port(session):
+    return session.config.get('metrics_port')
+
+
+def _first_phase(session, round_number):
+    # Same rounds as PowerTransfer.is_displayed
+    if session.config.get('power_transfer_allowed') and round_number >= 3:
+        return 'power_transfer'
+    return 'contribution'
+
+
+def _group_health(session, group, now):
+    """The GroupHealth of group; starts serving metrics on the first report. Call with _lock held."""
+    health = _SESSIONS.get(session.code)
+    if health is None:
+        health = _SESSIONS[session.code] = SessionHealth(session.code)
+        _ensure_server(_port(session))
+    health.early_stop_round = session.vars.get('early_stop_round')
+    group_health = health.groups.get(group.id_in_subsession)
+    if group_health is None:
+        group_health = health.groups[group.id_in_subsession] = GroupHealth(
+            group.id_in_subsession, group.round_number, _first_phase(session, group.round_number), now
+        )
+    return group_health
+
+
+def _update_member(group_health, player):
+    member = player.participant.id_in_session
+    participant_vars = player.participant.vars
+    group_health.timeout_streaks[member] = participant_vars.get('consecutive_timeouts', 0)
+    if participant_vars.get('dropout_confirmed'):
+        group_health.dropouts.add(member)
+    else:
+        group_health.dropouts.discard(member)
+
+
+def record_page(player, page_name):
+    """Report a page submission. Call it at the end of before_next_page."""
+    session = player.session
+    if _port(session) is None:
+        return
+    now = time.time()
+    round_number = player.round_number
+    with _lock:
+        group_health = _group_health(session, player.group, now)
+        phase = DECISION_PHASES.get(page_name)
+        if phase is not None:
+            group_health.enter(round_number, phase, now)
+            group_health.submitted.add(player.participant.id_in_session)
+        elif page_name in ROUND_END_PAGES and round_number == group_health.round_number:
+            if session.vars.get('early_stop_round') or round_number == Constants.num_rounds:
+                group_health.enter(round_number, 'finished', now)
+            else:
+                group_health.enter(round_number + 1, _first_phase(session, round_number + 1), now)
+        elif page_name == 'FinalResult':
+            group_health.enter(round_number, 'finished', now)
+        _update_member(group_health, player)
+
+
+def record_barrier(group, page_name, players):
+    """Report a completed wait page."""
+    session = group.session
+    if _port(session) is None:
+        return
+    now = time.time()
+    phase = PHASE_AFTER_BARRIER[page_name]
+    if group.round_number == 1 and page_name == 'ContributionWaitPage':
+        # Round 1 has no punishment stage.
+        phase = 'results'
+    with _lock:
+        group_health = _group_health(session, group, now)
+        group_health.enter(group.round_number, phase, now)
+        for player in players:
+            _update_member(group_health, player)
+
+
+def record_member(player):
+    """Report a change of a member's dropout state outside a page submission."""
+    session = player.session
+    if _port(session) is None:
+        return
+    with _lock:
+        _update_member(_group_health(session, player.group, time.time()), player)
+
+
+def forget(session_code):
+    with _lock:
+        _SESSIONS.pop(session_code, None)
+
+
+def snapshot():
+    now = time.time()
+    with _lock:
+        return dict(
+            generated_at=now,
+            sessions=[_SESSIONS[code].as_dict(now) for code in sorted(_SESSIONS)],
+        )
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def prometheus_text(data=None):
+    data = snapshot() if data is None else data
+    metrics = dict(
+        leviathan_group_round=('gauge', 'Current round of the group.', []),
+        leviathan_group_phase_seconds=('gauge', 'Seconds since the group entered its current phase.', []),
+        leviathan_group_submitted=('gauge', "Members who submitted the current phase's decision page.", []),
+        leviathan_group_dropouts=('gauge', 'Members of the group with dropout_confirmed.', []),
+        leviathan_member_consecutive_timeouts=('gauge', 'Consecutive timed-out pages of a member.', []),
+        leviathan_session_early_stop_armed=('gauge', '1 once session.vars early_stop_round is set.', []),
+        leviathan_session_early_stop_round=('gauge', 'Round the session stops after (0 if not armed).', []),
+    )
+    for session in data['sessions']:
+        code = _label(session['session'])
+        metrics['leviathan_session_early_stop_armed'][2].append((f'session="{code}"', int(session['early_stop_armed'])))
+        metrics['leviathan_session_early_stop_round'][2].append((f'session="{code}"', session['early_stop_round'] or 0))
+        for group in session['groups']:
+            labels = f'session="{code}",group="{group["group"]}"'
+            phase_labels = f'{labels},phase="{_label(group["phase"])}"'
+            metrics['leviathan_group_round'][2].append((labels, group['round']))
+            metrics['leviathan_group_phase_seconds'][2].append((phase_labels, group['phase_seconds']))
+            metrics['leviathan_group_submitted'][2].append((phase_labels, group['submitted']))
+            metrics['leviathan_group_dropouts'][2].append((labels, group['dropouts']))
+            for member, streak in group['timeout_streaks'].items():
+                metrics['leviathan_member_consecutive_timeouts'][2].append(
+                    (f'{labels},participant="{member}"', streak)
+                )
+    lines = []
+    for name, (metric_type, help_text, samples) in metrics.items():
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {metric_type}')
+        lines.extend(f'{name}{{{labels}}} {value}' for labels, value in samples)
+    return '\n'.join(lines) + '\n'
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        path = self.path.split('?', 1)[0]
+        if path == '/metrics':
+            body = prometheus_text().encode('utf-8')
+            content_type = 'text/plain; version=0.0.4; charset=utf-8'
+        elif path == '/metrics.json':
+            body = json.dumps(snapshot()).encode('utf-8')
+            content_type = 'application/json'
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def _ensure_server(port):
+    if port in _SERVERS:
+        return
+    try:
+        server = ThreadingHTTPServer(('127.0.0.1', int(port)), MetricsHandler)
+    except (OSError, TypeError, ValueError) as exc:
+        logger.warning('metrics endpoint not started on port %r: %s', port, exc)
+        _SERVERS[port] = None
+        return
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='game-metrics', daemon=True).start()
+    _SERVERS[port] = server
+
+
+def server_port(port):
+    """Port actually bound for the configured metrics_port (useful with 0), or None."""
+    server = _SERVERS.get(port)
+    return server.server_address[1] if server else None
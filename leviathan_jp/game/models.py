@@ -1,3 +1,6 @@
+import json
+import random
+
 from otree.api import (
     models,
     widgets,
@@ -9,13 +12,19 @@ from otree.api import (
     currency_range,
 )
 
+from .grouping import agent_seats, choose_group
+from .ledger import from_tenths, to_tenths
+from .payoff import apply_group_payoffs, compute_punishment_outcome, load_group_state
+
 doc = """
 Public goods game with deduction and deduction-effect transfer.
 """
 
 class Constants(BaseConstants):
     name_in_url = 'game'
-    players_per_group = 5
+    # グループ人数は session.config['players_per_group'] で決める（group_size を参照）
+    players_per_group = None
+    default_players_per_group = 5
     num_rounds = 20
     
     # settings.py からパラメータを取得
@@ -26,11 +35,67 @@ class Constants(BaseConstants):
     punishment_cost = 1
     power_effectiveness = 1
 
+def group_size(session):
+    """セッション設定のグループ人数（未設定なら Constants.default_players_per_group）"""
+    size = session.config.get('players_per_group') or Constants.default_players_per_group
+    return int(size)
+
+
+def player_group_size(player):
+    """参加者のグループの人数（到着待ちの打ち切りで小さいグループになった場合はその人数）"""
+    session = player.session
+    if session.config.get('group_wait_max_seconds') is None:
+        # 打ち切りが無効なら常に満員（participant を読み込まない）
+        return group_size(session)
+    return int(player.participant.vars.get('group_members') or group_size(session))
+
+
+def decode_edges(raw, cast=float):
+    """JSON {"相手のid_in_group": 値} を {int: 値} に変換する（不正な値は無視）"""
+    if not raw:
+        return {}
+    try:
+        data = json.loads(raw)
+    except (TypeError, ValueError):
+        return {}
+    if not isinstance(data, dict):
+        return {}
+    edges = {}
+    for key, value in data.items():
+        try:
+            target = int(key)
+            amount = cast(value)
+        except (TypeError, ValueError):
+            continue
+        if amount:
+            edges[target] = amount
+    return edges
+
+
+def encode_edges(edges):
+    """非ゼロの相手だけを id 順に JSON 化する"""
+    return json.dumps(
+        {str(target): amount for target, amount in sorted(edges.items()) if amount},
+        separators=(',', ':'),
+    )
+
+
 class Subsession(BaseSubsession):
     def creating_session(self):
         # session.config から実験設定を読み込み、settings.py で柔軟に変更可能にする
+        size = group_size(self.session)
+        # エージェント席（grouping.py）は参加者数に含めない
+        recruited = len(self.get_players()) - agent_seats(self.session)
+        if self.round_number == 1 and recruited % size != 0:
+            raise ValueError(
+                f'参加者数 {recruited} はグループ人数 {size} の倍数である必要があります。'
+            )
         if not self.session.config.get('group_by_arrival_time', True):
-            self.group_randomly()
+            players = self.get_players()
+            random.shuffle(players)
+            self.set_group_matrix(
+                [players[i:i + size] for i in range(0, len(players), size)]
+            )
         players = self.get_players()
 
         for p in players:
@@ -55,32 +120,42 @@ class Subsession(BaseSubsession):
             p.attempted_punishment_points = 0
             p.punishment_points_given_actual = 0
             p.punishment_points_received_actual = 0
+            p.power_transfer_edges = encode_edges({})
 
-            for i in range(1, Constants.players_per_group + 1):
-                setattr(p, f'power_transfer_p{i}', 0)
+    def group_by_arrival_time_method(self, waiting_players):
+        # 到着予測と最大待ち時間にもとづいてグループを作る（grouping.py）
+        return choose_group(self, waiting_players, group_size(self.session))
 
 
 class Group(BaseGroup):
     total_contribution = models.CurrencyField()
     individual_share = models.CurrencyField()
+    history_snapshot = models.LongStringField(blank=True, doc="確定したラウンド結果の履歴表示用スナップショット(JSON)")
+    result_snapshot = models.LongStringField(blank=True, doc="結果ページ用にグループ単位で一度だけ構築した表示モデル(JSON, フェーズ別)")
 
     def set_group_contribution(self):
         """グループの総投資額と各自の取り分を計算"""
         players = self.get_players()
-        contributions = [p.contribution or 0 for p in players]
-        self.total_contribution = sum(contributions)
+        # 投資額は 0.1 MU 単位の整数で合計する
+        self.total_contribution = from_tenths(sum(to_tenths(p.contribution) for p in players))
         group_size = len(players) or 1
         multiplier = self.session.config.get('contribution_multiplier', Constants.multiplier)
         share_value = float(self.total_contribution) * float(multiplier) / group_size
         self.individual_share = c(share_value)
 
     def set_payoff(self):
-        """減点フェーズ終了後に各プレイヤーの利得を確定"""
-        self.adjust_punishments()
-        for player in self.get_players():
-            player.set_payoff()
+        """減点フェーズ終了後に各プレイヤーの利得を確定（グループ単位の行列計算で一括処理）"""
+        config = self.session.config
+        state = load_group_state(self.get_players())
+        outcome = compute_punishment_outcome(
+            state,
+            cost_per_point=config.get('punishment_cost', 1),
+            effectiveness=config.get('power_effectiveness', Constants.power_effectiveness),
+        )
+        apply_group_payoffs(state, outcome, self.individual_share, config['endowment'])
 
     def adjust_punishments(self):
+        """旧実装の減点処理。payoff.py の計算と一致することを tests.py の差分テストで確認する"""
         session = self.session
         players = self.get_players()
         cost_per_point = session.config.get('punishment_cost', 1)
@@ -95,7 +170,7 @@ class Group(BaseGroup):
             for punisher in players:
                 if punisher.id_in_group == victim.id_in_group:
                     continue
-                attempted_points = getattr(punisher, f'punish_p{victim.id_in_group}', 0) or 0
+                attempted_points = punisher.punishment_targets().get(victim.id_in_group, 0)
                 if attempted_points <= 0:
                     continue
                 effective_power = punisher.punishment_power_after or punisher.participant.vars.get('punishment_power', 1.0)
@@ -247,23 +322,15 @@ class Player(BasePlayer):
             return self.available_endowment
         return self.session.config['endowment']
 
-    # 各プレイヤーに与える減点を入力するフィールド
-    # グループは最大5人を想定し、id_in_group は 1〜5
-    punish_p1 = models.IntegerField(min=0, initial=0, label="プレイヤー1への減点")
-    punish_p2 = models.IntegerField(min=0, initial=0, label="プレイヤー2への減点")
-    punish_p3 = models.IntegerField(min=0, initial=0, label="プレイヤー3への減点")
-    punish_p4 = models.IntegerField(min=0, initial=0, label="プレイヤー4への減点")
-    punish_p5 = models.IntegerField(min=0, initial=0, label="プレイヤー5への減点")
+    # 各プレイヤーに与える減点
+    # 非ゼロの相手だけを JSON {"相手のid_in_group": 減点} で保持し、グループ人数に依存しない
+    punishment_edges = models.LongStringField(initial='{}', blank=True)
 
     punishment_given = models.CurrencyField(doc="与えた減点の総コスト")
     punishment_received = models.CurrencyField(doc="受けた減点による総損失")
 
-    # 減点効果の移譲に関するフィールド
-    power_transfer_p1 = models.FloatField(min=0, initial=0, blank=True)
-    power_transfer_p2 = models.FloatField(min=0, initial=0, blank=True)
-    power_transfer_p3 = models.FloatField(min=0, initial=0, blank=True)
-    power_transfer_p4 = models.FloatField(min=0, initial=0, blank=True)
-    power_transfer_p5 = models.FloatField(min=0, initial=0, blank=True)
+    # 減点効果の移譲に関するフィールド（JSON {"相手のid_in_group": 移譲量}、非ゼロのみ）
+    power_transfer_edges = models.LongStringField(initial='{}', blank=True)
 
     power_transfer_out_total = models.FloatField(initial=0, blank=True)
     power_transfer_in_total = models.FloatField(initial=0, blank=True)
@@ -280,17 +347,30 @@ class Player(BasePlayer):
 
     # payoff フィールドは oTree が自動生成するため、後で値を代入する
 
+    def punishment_targets(self):
+        """{相手のid_in_group: 減点} （0 の相手は含まない）"""
+        return decode_edges(self.field_maybe_none('punishment_edges'), int)
+
+    def set_punishment_targets(self, targets):
+        self.punishment_edges = encode_edges(targets)
+
+    def power_transfer_targets(self):
+        """{相手のid_in_group: 移譲量} （0 の相手は含まない）"""
+        return decode_edges(self.field_maybe_none('power_transfer_edges'), float)
+
+    def set_power_transfer_targets(self, targets):
+        self.power_transfer_edges = encode_edges(targets)
+
     def set_payoff(self):
-        """今ラウンドの最終利得を計算"""
+        """今ラウンドの最終利得を計算（旧実装。Group.set_payoff との差分テスト用に残している）"""
         # 減点に関する計算
         # 1. 自分が与えた減点とコストを集計
         punishment_points_given = self.punishment_points_given_actual
         if punishment_points_given in (None, 0):
             punishment_points_given = 0
-            punishment_fields = [self.punish_p1, self.punish_p2, self.punish_p3, self.punish_p4, self.punish_p5]
-            for i in range(len(punishment_fields)):
-                if (i + 1) != self.id_in_group:
-                    punishment_points_given += punishment_fields[i] if punishment_fields[i] is not None else 0
+            for target, points in self.punishment_targets().items():
+                if target != self.id_in_group:
+                    punishment_points_given += points
             self.punishment_points_given_actual = punishment_points_given
             self.punishment_given = c(punishment_points_given * self.session.config['punishment_cost'])
 
@@ -301,8 +381,7 @@ class Player(BasePlayer):
             punishment_loss = 0
             effectiveness_base = self.session.config.get('power_effectiveness', Constants.power_effectiveness)
             for other_player in self.get_others_in_group():
-                field_name = f'punish_p{self.id_in_group}'
-                points = getattr(other_player, field_name, 0) or 0
+                points = other_player.punishment_targets().get(self.id_in_group, 0)
                 punishment_points_received += points
                 effective_power = other_player.punishment_power_after or other_player.participant.vars.get('punishment_power', 1.0)
                 punishment_loss += points * effectiveness_base * effective_power
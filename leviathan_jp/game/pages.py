@@ -1,14 +1,51 @@
 # game/pages.py
 
-import math
+import json
+from collections import OrderedDict
 
 from otree import settings as otree_settings
 from otree.api import Page, WaitPage
+from otree.channels import utils as channel_utils
 
-from .models import Constants
+from .models import Constants, Player, group_size, player_group_size
+from . import assets, checkpoint, compression, eventlog, ledger, metrics, payoff, quiz, timing, validation
+from .prefetch import group_rounds
+from .watchdog import release_stalled, stall_threshold
 from otree.api import Currency as c # Currency をインポートするための別名
 
 
+class _LRUCache(OrderedDict):
+    """dict that keeps only the maxsize most recently used entries."""
+
+    def __init__(self, maxsize):
+        super().__init__()
+        self.maxsize = maxsize
+
+    def get(self, key, default=None):
+        if key not in self:
+            return default
+        self.move_to_end(key)
+        return self[key]
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self.move_to_end(key)
+        while len(self) > self.maxsize:
+            self.popitem(last=False)
+
+
+# Entries kept per snapshot cache; evicted snapshots are reloaded from the Group row
+SNAPSHOT_CACHE_SIZE = 2048
+# (session code, group id) -> frozen history record of a finished round
+_HISTORY_SNAPSHOT_CACHE = _LRUCache(SNAPSHOT_CACHE_SIZE)
+# (session code, group id) -> frozen result-page models of the current round
+_RESULT_SNAPSHOT_CACHE = _LRUCache(SNAPSHOT_CACHE_SIZE)
+# Upper bound on rounds returned by one lazy history-modal request
+HISTORY_PAGE_MAX_ROUNDS = 5
+# How often a waiting browser pings its wait page so the stall watchdog can run
+WAIT_PAGE_STALL_CHECK_SECONDS = 10
+
+
 def _int_display(value):
     """Format numeric-like values as integer strings for UI bars."""
     try:
@@ -25,217 +62,779 @@ def _currency_labels():
     return label, label
 
 
+def _group_rounds(session, group_id):
+    """Request-scoped accessor for one group's Player rows across all rounds."""
+    in_memory_rounds = getattr(session, 'in_memory_rounds', None)
+    if in_memory_rounds is not None:
+        # Headless simulator sessions (game/simulator.py) hold every round in memory.
+        return in_memory_rounds
+    if session.config.get('group_wait_max_seconds') is None:
+        return group_rounds(Player, group_id, group_size(session))
+    # グループが players_per_group より小さい場合がある（grouping.py）ので、そのグループの実際の人数を期待する
+    return group_rounds(Player, group_id)
+
+
 def _previous_transfer_total(player):
     """Sum this player's outgoing transfer decisions from the previous round."""
     if player.round_number < 4:
         return 0.0
-    prev_player = player.in_round(player.round_number - 1)
+    prev_player = _group_rounds(player.session, player.group_id).in_round(
+        player, player.round_number - 1
+    )
     total = 0.0
-    for i in range(1, Constants.players_per_group + 1):
-        if i == player.id_in_group:
-            continue
-        field_name = f"power_transfer_p{i}"
-        value = getattr(prev_player, field_name, 0)
-        try:
-            total += max(0.0, float(value or 0))
-        except (TypeError, ValueError):
+    for target, value in prev_player.power_transfer_targets().items():
+        if target == player.id_in_group:
             continue
+        total += max(0.0, value)
     return total
 
 
-def build_history_rounds(player):
-    """Collect per-round history data for templates."""
+def _other_member_ids(player):
+    return [
+        id_in_group
+        for id_in_group in range(1, player_group_size(player) + 1)
+        if id_in_group != player.id_in_group
+    ]
+
+
+def _parse_edge_input(raw, allowed_targets):
+    """
+    Parse a submitted {"target id": amount} JSON object.
+    Returns None when the payload is malformed or names a non-member target.
+    """
+    return validation.parse_edges(raw, allowed_targets)
+
+
+_MALFORMED_INPUT_MESSAGE = "入力内容を読み取れませんでした。もう一度入力してください。"
+
+
+def _contribution_rules(player):
+    endowment = player.session.config.get('endowment', Constants.endowment)
+    available = float(player.available_endowment or endowment)
+    return validation.spec(
+        validation.number_rule(
+            'contribution',
+            dict(
+                required='投資額を入力してください。',
+                not_finite='投資額は0から20までの範囲で入力してください。',
+                range=f'投資額は0から{int(available)}までの範囲で入力してください。',
+                integer='投資額は整数で入力してください。',
+            ),
+            minimum=0,
+            maximum=available,
+            integer=True,
+        )
+    )
+
+
+def _power_transfer_rules(player):
     session = player.session
+    transfer_unit = session.config.get("punishment_transfer_unit", 0.1)
+    step = ledger.power_step(session)
+    # Keep the paper's per-round cap (1.0), while preventing negative own power.
+    limit_units = max(
+        0,
+        min(
+            ledger.power_units(1.0, step),
+            ledger.power_units(player.punishment_power_before, step)
+            + ledger.power_units(_previous_transfer_total(player), step),
+        ),
+    )
+    max_transfer_limit = ledger.from_power_units(limit_units, step)
+    return validation.spec(
+        validation.edge_rule(
+            "power_transfer_edges",
+            _other_member_ids(player),
+            dict(
+                malformed=_MALFORMED_INPUT_MESSAGE,
+                negative="譲渡量は0以上で入力してください。",
+                grid=f"譲渡量は {transfer_unit} の倍数で入力してください。",
+                max_total=f"譲渡量の合計は {max_transfer_limit:.1f} までです。",
+            ),
+            step=step,
+            grid=ledger.has_transfer_grid(session),
+            max_total_units=limit_units,
+        )
+    )
+
+
+def _punishment_rules(player):
+    config = player.session.config
+    per_target_limit = config.get('per_target_dp_limit', config['deduction_points'])
+    return validation.spec(
+        validation.edge_rule(
+            'punishment_edges',
+            _other_member_ids(player),
+            dict(
+                malformed=_MALFORMED_INPUT_MESSAGE,
+                negative="減点は0以上の整数で入力してください。",
+                integer="減点は整数で入力してください。",
+                max_each=f"各プレイヤーへの減点は {per_target_limit} 以内で入力してください。",
+            ),
+            integer=True,
+            max_each=per_target_limit,
+        )
+    )
+
+
+def _punishment_preview(player):
+    """
+    Inputs of the Punishment page's live preview (_assets/punishment_preview.js):
+    each member's power and MU as the payoff engine will read them.
+    """
+    session = player.session
+    members = sorted(
+        _group_rounds(session, player.group_id).get_players(player.group),
+        key=lambda p: p.id_in_group,
+    )
+    return dict(
+        ids=[member.id_in_group for member in members],
+        power=[float(payoff.member_power(member)) for member in members],
+        available=[payoff.member_available_before(member) for member in members],
+        self_id=player.id_in_group,
+        effectiveness=float(session.config.get('power_effectiveness', Constants.power_effectiveness)),
+        cost_per_point=float(session.config.get('punishment_cost', 1)),
+        decimals=c.get_num_decimal_places(),
+    )
+
+
+def _round_quiz_rules(player):
+    stage = _intro_stage(player)
+    answers = quiz.stage_answers(stage, player.session.config)
+    if answers is None:
+        return validation.spec()
+    return quiz.rules(
+        answers,
+        f"第{player.round_number}ラウンド前クイズの解答が正しくありません。説明を確認して再回答してください。",
+    )
+
+
+def _history_json_default(value):
+    """Serialize Currency values in frozen history records as plain numbers."""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return str(value)
+
+
+def _build_history_round(session, round_number, members):
+    """Build the viewer-independent history record of one finished round."""
     endowment = session.config.get('endowment', 0)
     endowment_currency = c(endowment)
-    rounds = []
-
-    for prev in player.in_previous_rounds():
-        group = prev.group
-        members = group.get_players()
-        per_target_dp_limit = session.config.get(
-            'per_target_dp_limit',
-            session.config.get('deduction_points', 0),
+    per_target_dp_limit = session.config.get(
+        'per_target_dp_limit',
+        session.config.get('deduction_points', 0),
+    )
+    max_total_dp = float(per_target_dp_limit) * max(len(members) - 1, 0)
+    dp_cost_denom = max_total_dp if max_total_dp > 0 else 1.0
+
+    player_entries = []
+    has_power_transfer = (
+        session.config.get('power_transfer_allowed')
+        and round_number >= 3
+    )
+    punish_targets = {member.id_in_group: member.punishment_targets() for member in members}
+
+    for member in members:
+        total_sent = sum(
+            points
+            for target, points in punish_targets[member.id_in_group].items()
+            if target != member.id_in_group
         )
-        max_total_dp = float(per_target_dp_limit) * max(len(members) - 1, 0)
-        dp_cost_denom = max_total_dp if max_total_dp > 0 else 1.0
 
-        player_entries = []
-        has_power_transfer = (
-            session.config.get('power_transfer_allowed')
-            and prev.round_number >= 3
+        effective_sent_points = getattr(member, 'punishment_points_given_actual', None)
+        if effective_sent_points is None:
+            effective_sent_points = total_sent
+        effective_sent_points_int = int(round(float(effective_sent_points or 0)))
+        dp_fill_percent = max(
+            0.0,
+            min(100.0, (float(effective_sent_points_int) / dp_cost_denom) * 100.0),
         )
 
-        for member in members:
-            total_sent = 0
-            for other in members:
-                if other.id_in_group == member.id_in_group:
-                    continue
-                field_name = f'punish_p{other.id_in_group}'
-                total_sent += getattr(member, field_name, 0) or 0
-
-            effective_sent_points = getattr(member, 'punishment_points_given_actual', None)
-            if effective_sent_points is None:
-                effective_sent_points = total_sent
-            effective_sent_points_int = int(round(float(effective_sent_points or 0)))
-            dp_fill_percent = max(
-                0.0,
-                min(100.0, (float(effective_sent_points_int) / dp_cost_denom) * 100.0),
+        player_entries.append(
+            dict(
+                id_in_group=member.id_in_group,
+                contribution=member.contribution,
+                contribution_display=_int_display(member.contribution),
+                endowment=endowment_currency,
+                endowment_display=_int_display(endowment),
+                available_endowment=member.available_endowment,
+                punishment_sent_total=effective_sent_points,
+                punishment_sent_total_display=effective_sent_points_int,
+                punishment_sent_fill_percent=f"{dp_fill_percent:.2f}",
+                punishment_received_total=member.punishment_received,
+                power_before=member.punishment_power_before,
+                power_after=member.punishment_power_after,
+                power_after_display=f"{member.punishment_power_after:.1f}",
+                power_transfer_out=member.power_transfer_out_total,
+                power_transfer_out_display=f"{member.power_transfer_out_total:.1f}",
+                power_transfer_in=member.power_transfer_in_total,
+                power_transfer_in_display=f"{member.power_transfer_in_total:.1f}",
+                power_transfer_cost=member.power_transfer_cost,
             )
+        )
 
-            player_entries.append(
-                dict(
-                    id_in_group=member.id_in_group,
-                    contribution=member.contribution,
-                    contribution_display=_int_display(member.contribution),
-                    endowment=endowment_currency,
-                    endowment_display=_int_display(endowment),
-                    available_endowment=member.available_endowment,
-                    punishment_sent_total=effective_sent_points,
-                    punishment_sent_total_display=effective_sent_points_int,
-                    punishment_sent_fill_percent=f"{dp_fill_percent:.2f}",
-                    punishment_received_total=member.punishment_received,
-                    power_before=member.punishment_power_before,
-                    power_after=member.punishment_power_after,
-                    power_after_display=f"{member.punishment_power_after:.1f}",
-                    power_transfer_out=member.power_transfer_out_total,
-                    power_transfer_out_display=f"{member.power_transfer_out_total:.1f}",
-                    power_transfer_in=member.power_transfer_in_total,
-                    power_transfer_in_display=f"{member.power_transfer_in_total:.1f}",
-                    power_transfer_cost=member.power_transfer_cost,
-                )
+    effectiveness_base = session.config.get('power_effectiveness', Constants.power_effectiveness)
+    matrix_rows = []
+    for victim in members:
+        actual_loss = float(victim.punishment_received or 0)
+        if actual_loss <= 0:
+            victim_before = float(victim.available_before_punishment or victim.available_endowment or 0)
+            victim_after = float(victim.available_endowment or 0)
+            diff = victim_before - victim_after
+            if diff > actual_loss:
+                actual_loss = max(0.0, diff)
+
+        attempted_points = {}
+        effective_power_map = {}
+        for giver in members:
+            if giver.id_in_group == victim.id_in_group:
+                continue
+            points = punish_targets[giver.id_in_group].get(victim.id_in_group, 0)
+            attempted_points[giver.id_in_group] = points
+            effective_power = (
+                giver.punishment_power_after
+                or giver.participant.vars.get('punishment_power', 1.0)
             )
+            effective_power_map[giver.id_in_group] = effective_power
+        cells = []
+        total_received = 0.0
+        for giver in members:
+            is_self = giver.id_in_group == victim.id_in_group
+            if is_self:
+                cells.append(dict(is_self=True, amount=None, amount_display=None))
+            else:
+                points_attempted = attempted_points.get(giver.id_in_group, 0)
+                points_used = points_attempted
+                effective_power = effective_power_map.get(
+                    giver.id_in_group,
+                    giver.punishment_power_after
+                    or giver.participant.vars.get('punishment_power', 1.0),
+                )
+                actual_loss_value = points_used * effectiveness_base * effective_power
+                total_received += actual_loss_value
+                loss_display = c(actual_loss_value)
+                cells.append(
+                    dict(
+                        is_self=False,
+                        amount=loss_display,
+                        amount_display=f"{actual_loss_value:.1f}",
+                    )
+                )
+
+        if victim.punishment_received is not None:
+            summary_loss = victim.punishment_received
+        else:
+            summary_loss = c(total_received)
+
+        for entry in player_entries:
+            if entry['id_in_group'] == victim.id_in_group:
+                entry['punishment_received_total'] = summary_loss
+                break
+
+        matrix_rows.append(dict(victim_id=victim.id_in_group, cells=cells))
 
-        effectiveness_base = session.config.get('power_effectiveness', Constants.power_effectiveness)
-        matrix_rows = []
+    result_matrix_rows = []
+    fill_denom = float(per_target_dp_limit) if float(per_target_dp_limit) > 0 else 1.0
+    for giver in members:
+        giver_power = float(
+            giver.punishment_power_after
+            or giver.participant.vars.get('punishment_power', 1.0)
+        )
+        row_cells = []
         for victim in members:
-            actual_loss = float(victim.punishment_received or 0)
-            if actual_loss <= 0:
-                victim_before = float(victim.available_before_punishment or victim.available_endowment or 0)
-                victim_after = float(victim.available_endowment or 0)
-                diff = victim_before - victim_after
-                if diff > actual_loss:
-                    actual_loss = max(0.0, diff)
-
-            attempted_points = {}
-            effective_power_map = {}
-            for giver in members:
-                if giver.id_in_group == victim.id_in_group:
-                    continue
-                points = getattr(giver, f'punish_p{victim.id_in_group}', 0) or 0
-                attempted_points[giver.id_in_group] = points
-                effective_power = (
-                    giver.punishment_power_after
-                    or giver.participant.vars.get('punishment_power', 1.0)
+            if giver.id_in_group == victim.id_in_group:
+                row_cells.append(dict(is_self=True))
+                continue
+            points_raw = punish_targets[giver.id_in_group].get(victim.id_in_group, 0)
+            points_value = int(round(float(points_raw)))
+            effect_value = points_value * float(effectiveness_base) * giver_power
+            fill_percent = max(
+                0.0,
+                min(100.0, (float(points_value) / fill_denom) * 100.0),
+            )
+            row_cells.append(
+                dict(
+                    is_self=False,
+                    points_display=str(points_value),
+                    effect_display=f"{effect_value:.1f}",
+                    fill_percent=f"{fill_percent:.2f}",
                 )
-                effective_power_map[giver.id_in_group] = effective_power
+            )
+        result_matrix_rows.append(
+            dict(
+                giver_id=giver.id_in_group,
+                is_self=False,
+                power_display=f"{giver_power:.1f}",
+                cells=row_cells,
+            )
+        )
+
+    transfer_rows = []
+    if has_power_transfer:
+        for giver in members:
+            giver_transfers = giver.power_transfer_targets()
             cells = []
-            total_received = 0.0
-            for giver in members:
-                is_self = giver.id_in_group == victim.id_in_group
-                if is_self:
-                    cells.append(dict(is_self=True, amount=None, amount_display=None))
-                else:
-                    points_attempted = attempted_points.get(giver.id_in_group, 0)
-                    points_used = points_attempted
-                    effective_power = effective_power_map.get(
-                        giver.id_in_group,
-                        giver.punishment_power_after
-                        or giver.participant.vars.get('punishment_power', 1.0),
-                    )
-                    actual_loss_value = points_used * effectiveness_base * effective_power
-                    total_received += actual_loss_value
-                    loss_display = c(actual_loss_value)
-                    cells.append(
-                        dict(
-                            is_self=False,
-                            amount=loss_display,
-                            amount_display=f"{actual_loss_value:.1f}",
-                        )
+            for receiver in members:
+                is_self = giver.id_in_group == receiver.id_in_group
+                amount = None
+                if not is_self:
+                    amount = giver_transfers.get(receiver.id_in_group, 0)
+                cells.append(
+                    dict(
+                        is_self=is_self,
+                        amount=amount,
+                        amount_display=(f"{amount:.1f}" if amount is not None else None),
                     )
+                )
+            transfer_rows.append(dict(giver_id=giver.id_in_group, cells=cells))
+
+    return dict(
+        round_number=round_number,
+        players=player_entries,
+        matrix_rows=matrix_rows,
+        result_matrix_rows=result_matrix_rows,
+        transfer_rows=transfer_rows,
+        has_punishment=round_number > 1,
+        has_power_transfer=has_power_transfer,
+        max_total_dp_display=f"{int(max_total_dp)}",
+        per_target_dp_limit=int(per_target_dp_limit),
+    )
+
+
+def freeze_history_snapshot(group):
+    """
+    Serialize the group's round record once its results are final.
+    Later history renders read this snapshot instead of rebuilding the round.
+    """
+    record = _build_history_round(group.session, group.round_number, group.get_players())
+    group.history_snapshot = json.dumps(record, default=_history_json_default, ensure_ascii=False)
+    frozen = json.loads(group.history_snapshot)
+    _HISTORY_SNAPSHOT_CACHE[(group.session.code, group.id)] = frozen
+    return frozen
 
-            if victim.punishment_received is not None:
-                summary_loss = victim.punishment_received
-            else:
-                summary_loss = c(total_received)
 
-            for entry in player_entries:
-                if entry['id_in_group'] == victim.id_in_group:
-                    entry['punishment_received_total'] = summary_loss
-                    break
+def _load_history_snapshot(group):
+    raw = group.field_maybe_none('history_snapshot')
+    if not raw:
+        # Rounds finished before snapshots existed are frozen on first read.
+        return freeze_history_snapshot(group)
+    frozen = json.loads(raw)
+    _HISTORY_SNAPSHOT_CACHE[(group.session.code, group.id)] = frozen
+    return frozen
 
-            matrix_rows.append(dict(victim_id=victim.id_in_group, cells=cells))
 
-        result_matrix_rows = []
-        fill_denom = float(per_target_dp_limit) if float(per_target_dp_limit) > 0 else 1.0
-        for giver in members:
-            giver_power = float(
-                giver.punishment_power_after
-                or giver.participant.vars.get('punishment_power', 1.0)
+def _history_round_for_viewer(record, viewer_id):
+    """Apply self-highlighting without mutating the shared frozen record."""
+    view = dict(record, lazy=False)
+    view['result_matrix_rows'] = [
+        dict(row, is_self=row['giver_id'] == viewer_id)
+        for row in record['result_matrix_rows']
+    ]
+    return view
+
+
+def _history_round_for_player(prev, viewer_id):
+    record = _HISTORY_SNAPSHOT_CACHE.get((prev.session.code, prev.group_id))
+    if record is None:
+        record = _load_history_snapshot(prev.group)
+    return _history_round_for_viewer(record, viewer_id)
+
+
+def build_history_rounds(player):
+    """Collect per-round history data for templates."""
+    rounds = _group_rounds(player.session, player.group_id)
+    return [
+        _history_round_for_player(prev, player.id_in_group)
+        for prev in rounds.in_previous_rounds(player)
+    ]
+
+
+def _history_modal_lazy(player):
+    return bool(player.session.config.get('history_modal_lazy', False))
+
+
+def history_rounds_for_template(player):
+    """
+    Full history for server-side rendering, or empty page shells when the
+    modal fetches rounds over live_method (history_modal_lazy=True).
+    """
+    if _history_modal_lazy(player):
+        return [
+            dict(round_number=round_number, lazy=True)
+            for round_number in range(1, player.round_number)
+        ]
+    return build_history_rounds(player)
+
+
+def build_history_page(player, round_numbers):
+    """Return frozen history records for the requested previous rounds."""
+    rounds = _group_rounds(player.session, player.group_id)
+    records = []
+    for round_number in list(round_numbers)[:HISTORY_PAGE_MAX_ROUNDS]:
+        try:
+            round_number = int(round_number)
+        except (TypeError, ValueError):
+            continue
+        if not 1 <= round_number < player.round_number:
+            continue
+        prev = rounds.in_round(player, round_number)
+        records.append(_history_round_for_player(prev, player.id_in_group))
+    return records
+
+
+def _compact_decimal(value):
+    value_f = float(value or 0)
+    if abs(value_f - round(value_f)) < 1e-9:
+        return str(int(round(value_f)))
+    return f"{value_f:.1f}"
+
+
+def _build_contribution_result(group):
+    """Viewer-independent ContributionResult model for one group."""
+    session = group.session
+    endowment = session.config['endowment']
+    multiplier = float(session.config.get('contribution_multiplier', Constants.multiplier))
+    share = group.individual_share
+    group_players = sorted(group.get_players(), key=lambda p: p.id_in_group)
+
+    players_data = []
+    for member in group_players:
+        contribution = member.contribution
+        remaining = member.available_endowment or c(0)
+        available_before = member.available_before_contribution or remaining + contribution
+        current_total = remaining + share
+        contribution_value = float(contribution or 0)
+        available_before_value = float(available_before or 0)
+        current_total_value = float(current_total or 0)
+        if available_before_value > 0:
+            contribution_fill_percent = max(
+                0.0,
+                min(100.0, (contribution_value / available_before_value) * 100.0),
             )
-            row_cells = []
-            for victim in members:
-                if giver.id_in_group == victim.id_in_group:
-                    row_cells.append(dict(is_self=True))
-                    continue
-                points_raw = getattr(giver, f'punish_p{victim.id_in_group}', 0) or 0
-                points_value = int(round(float(points_raw)))
-                effect_value = points_value * float(effectiveness_base) * giver_power
-                fill_percent = max(
-                    0.0,
-                    min(100.0, (float(points_value) / fill_denom) * 100.0),
-                )
+        else:
+            contribution_fill_percent = 0.0
+
+        players_data.append(
+            dict(
+                id_in_group=member.id_in_group,
+                is_self=False,
+                contribution=contribution,
+                contribution_value=contribution_value,
+                contribution_display=_int_display(contribution_value),
+                contribution_fill_percent=f"{contribution_fill_percent:.2f}",
+                current_total=current_total,
+                current_total_display=f"{current_total_value:.1f}",
+                available_endowment=remaining,
+                available_before_contribution=available_before,
+                available_before_display=_int_display(available_before_value),
+            )
+        )
+
+    members_count = len(group_players) or 1
+    total_contribution_value = float(group.total_contribution or 0)
+    project_outcome_value = total_contribution_value * multiplier
+    project_outcome_max_value = float(endowment) * members_count * multiplier
+    if project_outcome_max_value > 0:
+        project_outcome_fill_percent = max(
+            0.0,
+            min(100.0, (project_outcome_value / project_outcome_max_value) * 100.0),
+        )
+    else:
+        project_outcome_fill_percent = 0.0
+
+    return dict(
+        players_data=players_data,
+        players_count=len(players_data),
+        endowment=endowment,
+        share=share,
+        project_outcome_value=project_outcome_value,
+        project_outcome_max_value=project_outcome_max_value,
+        project_outcome_fill_percent=f"{project_outcome_fill_percent:.2f}",
+        project_outcome_value_display=_compact_decimal(project_outcome_value),
+        project_outcome_max_display=_compact_decimal(project_outcome_max_value),
+    )
+
+
+def _build_power_transfer_result(group):
+    """Viewer-independent PowerTransferResult model for one group."""
+    group_players = sorted(group.get_players(), key=lambda p: p.id_in_group)
+
+    columns = []
+    for member in group_players:
+        transfer_cost_value = member.power_transfer_cost
+        if transfer_cost_value is None:
+            transfer_cost_display = "0.0"
+        else:
+            transfer_cost_display = f"{float(transfer_cost_value):.1f}"
+        final_power_value = float(member.punishment_power_after or 0)
+        columns.append(
+            dict(
+                id_in_group=member.id_in_group,
+                is_self=False,
+                header=f"プレイヤー {member.id_in_group}",
+                base_power_value=float(member.punishment_power_before or 0),
+                final_power_display=f"{member.punishment_power_after:.1f}",
+                final_power_value=final_power_value,
+                net_transfer_display=f"- {member.power_transfer_out_total:.1f} / + {member.power_transfer_in_total:.1f}",
+                transfer_cost_display=transfer_cost_display,
+                current_balance_display="-",
+            )
+        )
+
+    transfer_matrix = []
+    for giver in group_players:
+        giver_transfers = giver.power_transfer_targets()
+        row_cells = []
+        for receiver in group_players:
+            if giver.id_in_group == receiver.id_in_group:
+                row_cells.append(dict(is_self=True, highlight=False, display="-"))
+            else:
+                amount = giver_transfers.get(receiver.id_in_group, 0)
                 row_cells.append(
                     dict(
                         is_self=False,
-                        points_display=str(points_value),
-                        effect_display=f"{effect_value:.1f}",
-                        fill_percent=f"{fill_percent:.2f}",
+                        highlight=False,
+                        receiver_id=receiver.id_in_group,
+                        display=f"{amount:.1f}",
                     )
                 )
-            result_matrix_rows.append(
+        transfer_matrix.append(
+            dict(
+                giver_id=giver.id_in_group,
+                row_label=f"プレイヤー {giver.id_in_group}",
+                is_self=False,
+                cells=row_cells,
+            )
+        )
+
+    return dict(columns=columns, transfer_matrix=transfer_matrix)
+
+
+def _build_punishment_result(group):
+    """Viewer-independent PunishmentResult model for one group."""
+    session = group.session
+    treatment_name = session.config.get('treatment_name', 'fixed')
+    show_power_transfer = bool(
+        session.config.get('power_transfer_allowed')
+        and group.round_number >= 3
+    )
+
+    endowment = session.config['endowment']
+    endowment_display = _int_display(endowment)
+    per_target_dp_limit = session.config.get('per_target_dp_limit', session.config['deduction_points'])
+    endowment_currency = c(endowment)
+
+    players = sorted(group.get_players(), key=lambda p: p.id_in_group)
+    effectiveness_base = session.config.get('power_effectiveness', Constants.power_effectiveness)
+    max_total_dp = float(per_target_dp_limit) * max(len(players) - 1, 0)
+    max_total_dp_display = f"{int(max_total_dp)}"
+    dp_cost_denom = max_total_dp if max_total_dp > 0 else 1.0
+
+    players_map = {}
+    for member in players:
+        available_before_contribution = (
+            member.available_before_contribution
+            or (member.available_endowment or c(0)) + (member.contribution or c(0))
+        )
+        power_after_value = float(
+            member.punishment_power_after
+            or member.participant.vars.get('punishment_power', 1.0)
+        )
+        players_map[member.id_in_group] = dict(
+            id_in_group=member.id_in_group,
+            contribution=member.contribution,
+            contribution_display=_int_display(member.contribution),
+            endowment=endowment_currency,
+            endowment_value=endowment,
+            endowment_display=endowment_display,
+            punishment_sent_total=0,
+            punishment_sent_total_display="0",
+            punishment_cost_total_display="0.0",
+            punishment_received_total=0,
+            power_before=member.punishment_power_before,
+            power_after=power_after_value,
+            power_after_display=f"{power_after_value:.1f}",
+            power_after_value=power_after_value,
+            power_transfer_out=member.power_transfer_out_total,
+            power_transfer_in=member.power_transfer_in_total,
+            power_transfer_out_display=f"{member.power_transfer_out_total:.1f}",
+            power_transfer_in_display=f"{member.power_transfer_in_total:.1f}",
+            power_transfer_cost=member.power_transfer_cost,
+            available_endowment=member.available_endowment,
+            available_before_contribution=available_before_contribution,
+            available_before_contribution_display=_int_display(available_before_contribution),
+            punishment_effect_display="0.0",
+            punishment_sent_fill_percent="0.00",
+        )
+
+    punish_targets = {member.id_in_group: member.punishment_targets() for member in players}
+    for member in players:
+        total_sent = getattr(member, 'punishment_points_given_actual', None)
+        if total_sent is None:
+            total_sent = sum(
+                points
+                for target, points in punish_targets[member.id_in_group].items()
+                if target != member.id_in_group
+            )
+        players_map[member.id_in_group]['punishment_sent_total'] = total_sent
+        players_map[member.id_in_group]['punishment_sent_total_display'] = str(int(round(float(total_sent))))
+        punishment_cost_total = member.punishment_given
+        if punishment_cost_total is None:
+            punishment_cost_total = c(float(total_sent) * float(session.config.get('punishment_cost', 1)))
+        players_map[member.id_in_group]['punishment_cost_total_display'] = f"{float(punishment_cost_total):.1f}"
+        effect_total = float(total_sent) * float(effectiveness_base) * players_map[member.id_in_group]['power_after_value']
+        players_map[member.id_in_group]['punishment_effect_display'] = f"{effect_total:.1f}"
+        players_map[member.id_in_group]['punishment_sent_fill_percent'] = (
+            f"{max(0.0, min(100.0, (float(total_sent) / dp_cost_denom) * 100.0)):.2f}"
+        )
+
+    matrix_rows = []
+    max_per_target = float(per_target_dp_limit) if float(per_target_dp_limit) > 0 else 1.0
+    for giver in players:
+        giver_power = players_map[giver.id_in_group]['power_after_value']
+        row_cells = []
+        for victim in players:
+            is_self = giver.id_in_group == victim.id_in_group
+            if is_self:
+                row_cells.append(dict(is_self=True))
+                continue
+
+            points_raw = punish_targets[giver.id_in_group].get(victim.id_in_group, 0)
+            points_value = int(round(float(points_raw)))
+            effect_value = float(points_value) * float(effectiveness_base) * float(giver_power)
+            fill_percent = max(0.0, min(100.0, (float(points_value) / max_per_target) * 100.0))
+            row_cells.append(
                 dict(
-                    giver_id=giver.id_in_group,
-                    is_self=giver.id_in_group == player.id_in_group,
-                    power_display=f"{giver_power:.1f}",
-                    cells=row_cells,
+                    is_self=False,
+                    points=points_value,
+                    points_display=str(points_value),
+                    effect_display=f"{effect_value:.1f}",
+                    fill_percent=f"{fill_percent:.2f}",
                 )
             )
 
-        transfer_rows = []
-        if has_power_transfer:
-            for giver in members:
-                cells = []
-                for receiver in members:
-                    is_self = giver.id_in_group == receiver.id_in_group
-                    amount = None
-                    if not is_self:
-                        field_name = f'power_transfer_p{receiver.id_in_group}'
-                        amount = getattr(giver, field_name, 0) or 0
-                    cells.append(
-                        dict(
-                            is_self=is_self,
-                            amount=amount,
-                            amount_display=(f"{amount:.1f}" if amount is not None else None),
-                        )
-                    )
-                transfer_rows.append(dict(giver_id=giver.id_in_group, cells=cells))
+        matrix_rows.append(
+            dict(
+                giver_id=giver.id_in_group,
+                is_self=False,
+                power_display=players_map[giver.id_in_group]['power_after_display'],
+                cells=row_cells,
+            )
+        )
 
-        rounds.append(
+    return dict(
+        players_summary=[players_map[idx] for idx in sorted(players_map.keys())],
+        matrix_rows=matrix_rows,
+        matrix_headers=[
+            dict(id_in_group=member.id_in_group, is_self=False) for member in players
+        ],
+        show_power_transfer=show_power_transfer,
+        treatment_name=treatment_name,
+        per_target_dp_limit=per_target_dp_limit,
+        max_total_dp=max_total_dp,
+        max_total_dp_display=max_total_dp_display,
+        round_result_allow_vertical_scroll=len(players) > 5 and (len(players) % 5 == 0),
+    )
+
+
+def _build_round_result(group):
+    """Viewer-independent RoundResult model for one group."""
+    session = group.session
+    multiplier = float(session.config.get('contribution_multiplier', Constants.multiplier))
+    players = sorted(group.get_players(), key=lambda p: p.id_in_group)
+
+    earnings_players = []
+    for member in players:
+        payoff_value = float(member.payoff or 0)
+        earnings_players.append(
             dict(
-                round_number=prev.round_number,
-                players=player_entries,
-                matrix_rows=matrix_rows,
-                result_matrix_rows=result_matrix_rows,
-                transfer_rows=transfer_rows,
-                has_punishment=prev.round_number > 1,
-                has_power_transfer=has_power_transfer,
-                max_total_dp_display=f"{int(max_total_dp)}",
-                per_target_dp_limit=int(per_target_dp_limit),
+                id_in_group=member.id_in_group,
+                is_self=False,
+                payoff=member.payoff,
+                payoff_display=f"{payoff_value:.1f}",
             )
         )
 
-    return rounds
+    total_contribution_value = float(group.total_contribution or 0)
+    project_outcome_value = total_contribution_value * multiplier
+    project_outcome_max_value = 0.0
+    for member in players:
+        available_before = member.available_before_contribution
+        if available_before is None:
+            available_before = session.config.get('endowment', Constants.endowment)
+        project_outcome_max_value += float(available_before or 0) * multiplier
+    if project_outcome_max_value > 0:
+        project_outcome_fill_percent = max(
+            0.0,
+            min(100.0, (project_outcome_value / project_outcome_max_value) * 100.0),
+        )
+    else:
+        project_outcome_fill_percent = 0.0
+
+    return dict(
+        earnings_players=earnings_players,
+        project_outcome_value=project_outcome_value,
+        project_outcome_max_value=project_outcome_max_value,
+        project_outcome_fill_percent=f"{project_outcome_fill_percent:.2f}",
+        project_outcome_value_display=_compact_decimal(project_outcome_value),
+        project_outcome_max_display=_compact_decimal(project_outcome_max_value),
+    )
+
+
+# Result pages whose group-wide tables are frozen by a wait page, by phase key
+_RESULT_SNAPSHOT_BUILDERS = dict(
+    contribution=_build_contribution_result,
+    power_transfer=_build_power_transfer_result,
+    punishment=_build_punishment_result,
+    round=_build_round_result,
+)
+
+
+def freeze_result_snapshot(group, *phases):
+    """
+    Build the named result-page models once for the whole group and store
+    them on Group.result_snapshot. Each member's result page then only
+    looks the model up and applies its own self-highlighting.
+    """
+    raw = group.field_maybe_none('result_snapshot')
+    snapshot = json.loads(raw) if raw else {}
+    for phase in phases:
+        snapshot[phase] = _RESULT_SNAPSHOT_BUILDERS[phase](group)
+    group.result_snapshot = json.dumps(snapshot, default=_history_json_default, ensure_ascii=False)
+    frozen = json.loads(group.result_snapshot)
+    _RESULT_SNAPSHOT_CACHE[(group.session.code, group.id)] = frozen
+    return frozen
+
+
+def _freeze_page_snapshots(group, *phases, history=False):
+    """
+    Freeze the result (and with history the history) snapshots at a wait page.
+    Headless simulator runs that render no page never read them, so they skip it.
+    """
+    session = group.session
+    if getattr(session, 'in_memory_rounds', None) is not None and not session.render_pages:
+        return
+    if history:
+        freeze_history_snapshot(group)
+    freeze_result_snapshot(group, *phases)
+
+
+def _result_snapshot(group, phase):
+    key = (group.session.code, group.id)
+    snapshot = _RESULT_SNAPSHOT_CACHE.get(key)
+    if snapshot is None or phase not in snapshot:
+        raw = group.field_maybe_none('result_snapshot')
+        snapshot = json.loads(raw) if raw else {}
+        _RESULT_SNAPSHOT_CACHE[key] = snapshot
+    if phase not in snapshot:
+        # Groups that reached the page without passing the freezing wait page.
+        snapshot = freeze_result_snapshot(group, phase)
+    return snapshot[phase]
+
+
+def _mark_self(rows, viewer_id, key='id_in_group'):
+    return [dict(row, is_self=row[key] == viewer_id) for row in rows]
 
 
 def _mark_dropout(player, timeout_count=None):
@@ -254,6 +853,115 @@ def _reset_dropout_state(player):
     player.participant.vars['dropout_confirmed'] = False
 
 
+def _server_autoplay(player):
+    """
+    True for confirmed dropouts when dropout_server_autoplay is on, and for the
+    agents seated by ExperimentGroupWait (see grouping.py). Their game pages
+    are skipped without rendering and the wait page after each decision submits
+    the timeout defaults for them (see _autoplay_dropouts).
+    """
+    if player.participant.vars.get('group_wait_agent'):
+        return True
+    return bool(
+        player.session.config.get('dropout_server_autoplay', False)
+        and player.participant.vars.get('dropout_confirmed')
+    )
+
+
+def _autoplay_dropouts(group, page, submitted_key):
+    """Apply page's timeout defaults for server-autoplayed members that skipped it this round."""
+    for player in _group_rounds(group.session, group.id).get_players(group):
+        if (
+            _server_autoplay(player)
+            and player.participant.vars.get(submitted_key) != player.round_number
+        ):
+            page.before_next_page(player, timeout_happened=True)
+
+
+def _record_page(player, page_name, timeout_happened, server=False):
+    """Log a page submission and report it to the live metrics (see eventlog.py and metrics.py)."""
+    eventlog.record_page(player, page_name, timeout_happened, server=server)
+    metrics.record_page(player, page_name)
+
+
+def _record_barrier(group, page_name, players=None):
+    """Log, checkpoint and report a completed wait page (see eventlog.py, checkpoint.py and metrics.py)."""
+    rounds = _group_rounds(group.session, group.id)
+    if players is None:
+        players = rounds.get_players(group)
+    eventlog.record_barrier(group, page_name, players)
+    metrics.record_barrier(group, page_name, players)
+    if checkpoint.checkpoint_dir(group.session) is None:
+        return
+    next_round_players = {}
+    if group.round_number < Constants.num_rounds:
+        next_round_players = {
+            p.participant.code: rounds.in_round(p, group.round_number + 1) for p in players
+        }
+    checkpoint.save(group, page_name, players, next_round_players)
+
+
+def _submission_progress(players, submitted_key, round_number):
+    submitted = sum(
+        1 for p in players if p.participant.vars.get(submitted_key) == round_number
+    )
+    return dict(waiting_progress=submitted, waiting_total=len(players))
+
+
+def _wait_page_vars(player, submitted_key):
+    _force_manual_after_bot_stop_round(player)
+    players = _group_rounds(player.session, player.group_id).get_players(player.group)
+    release_stalled(player, players)
+    return dict(
+        _submission_progress(players, submitted_key, player.round_number),
+        stall_check_seconds=(
+            WAIT_PAGE_STALL_CHECK_SECONDS if stall_threshold(player.session) else None
+        ),
+    )
+
+
+def _wait_page_live(player, data, submitted_key):
+    """Periodic ping from a waiting browser: run the stall watchdog and reply with the progress."""
+    if not isinstance(data, dict) or not data.get('check_stall'):
+        return None
+    players = _group_rounds(player.session, player.group_id).get_players(player.group)
+    release_stalled(player, players)
+    return {
+        player.id_in_group: _submission_progress(players, submitted_key, player.round_number)
+    }
+
+
+def _push_wait_progress(player, submitted_key):
+    """
+    Push "k of n submitted" to the group members already waiting on the wait page
+    right after this decision page, over the wait page's live channel.
+    """
+    if getattr(player.session, 'in_memory_rounds', None) is not None:
+        # Headless simulator sessions have no browsers to notify.
+        return
+    if _server_autoplay(player):
+        # Submitted from after_all_players_arrive; the wait page is completing anyway.
+        return
+    wait_page_index = player.participant._index_in_pages + 1
+    players = _group_rounds(player.session, player.group_id).get_players(player.group)
+    message = dict(
+        otree_success=True,
+        live_method_payload=_submission_progress(players, submitted_key, player.round_number),
+    )
+    for member in players:
+        participant = member.participant
+        if participant._index_in_pages != wait_page_index:
+            continue
+        channel_utils.sync_group_send(
+            group=channel_utils.live_group(participant._session_code, wait_page_index, participant.code),
+            data=message,
+        )
+
+
+def _merged_result_page(session):
+    return bool(session.config.get('merged_result_page', False))
+
+
 def _auto_advance_timeout_seconds(player):
     value = player.session.config.get('auto_advance_timeout_seconds', 1)
     try:
@@ -280,6 +988,11 @@ def _non_decision_timeout_seconds(player):
 
 
 class BasePage(Page):
+    def render_page(self, context):
+        """Rendered page, compressed for the heavy pages and recorded in the size report."""
+        response = super().render_page(context)
+        return compression.compress_response(response, self.request, type(self).__name__, self.player)
+
     @staticmethod
     def js_vars(player):
         _force_manual_after_bot_stop_round(player)
@@ -295,6 +1008,14 @@ class BasePage(Page):
             return
         if data.get('dismiss_dropout_warning'):
             _reset_dropout_state(player)
+            eventlog.record_dismiss(player)
+            metrics.record_member(player)
+        if isinstance(data.get('history_rounds'), list):
+            return {
+                player.id_in_group: dict(
+                    history_rounds=build_history_page(player, data['history_rounds'])
+                )
+            }
 
 
 def _force_manual_after_bot_stop_round(player):
@@ -367,7 +1088,7 @@ class ExperimentGroupWait(WaitPage):
     group_by_arrival_time = True
     template_name = "game/ExperimentGroupWait.html"
     title_text = "実験開始までお待ちください"
-    body_text = "ルール確認を完了した参加者から順に、5人そろい次第グループを作成して実験を開始します。"
+    body_text = "ルール確認を完了した参加者から順に、グループの人数がそろい次第実験を開始します。"
 
     @staticmethod
     def is_displayed(player):
@@ -375,6 +1096,10 @@ class ExperimentGroupWait(WaitPage):
             "group_by_arrival_time", True
         )
 
+    @staticmethod
+    def vars_for_template(player):
+        return dict(players_per_group=group_size(player.session))
+
 
 class RoundInstruction(BasePage):
     @staticmethod
@@ -393,7 +1118,7 @@ class RoundInstruction(BasePage):
             contribution_multiplier=session.config.get(
                 "contribution_multiplier", Constants.multiplier
             ),
-            players_per_group=Constants.players_per_group,
+            players_per_group=player_group_size(player),
             endowment=session.config.get("endowment", Constants.endowment),
         )
 
@@ -431,38 +1156,14 @@ class RoundQuiz(BasePage):
             costly_punishment_transfer=bool(session.config.get("costly_punishment_transfer")),
         )
 
+    @staticmethod
+    def js_vars(player):
+        return dict(BasePage.js_vars(player), validation=validation.client_spec(_round_quiz_rules(player)))
+
     @staticmethod
     def error_message(player, values):
         _force_manual_after_bot_stop_round(player)
-        stage = _intro_stage(player)
-        if stage == "round1":
-            expected = dict(intro1_q1=2, intro1_q2=2, intro1_q3=3, intro1_q4=3)
-            if any(values.get(k) != v for k, v in expected.items()):
-                return "第1ラウンド前クイズの解答が正しくありません。説明を確認して再回答してください。"
-            return None
-
-        if stage == "round2":
-            expected = dict(intro2_q1=3, intro2_q2=3, intro2_q3=3)
-            if any(values.get(k) != v for k, v in expected.items()):
-                return "第2ラウンド前クイズの解答が正しくありません。説明を確認して再回答してください。"
-            return None
-
-        if stage == "round3":
-            if player.session.config.get("power_transfer_allowed"):
-                expected_q1 = 3 if player.session.config.get("costly_punishment_transfer") else 1
-                expected = dict(
-                    intro3_transfer_q1=expected_q1,
-                    intro3_transfer_q2=2,
-                    intro3_transfer_q3=2,
-                )
-                if any(values.get(k) != v for k, v in expected.items()):
-                    return "第3ラウンド前クイズの解答が正しくありません。説明を確認して再回答してください。"
-                return None
-            if values.get("intro3_fixed_q1") != 1:
-                return "第3ラウンド前クイズの解答が正しくありません。説明を確認して再回答してください。"
-            return None
-
-        return None
+        return validation.validate(_round_quiz_rules(player), values)
 
 # =============================================================================
 # CLASS: Contribution
@@ -471,12 +1172,19 @@ class Contribution(BasePage):
     form_model = 'player'
     form_fields = ['contribution']
 
+    @staticmethod
+    def is_displayed(player):
+        return not _server_autoplay(player)
+
     @staticmethod
     def get_timeout_seconds(player):
         return _decision_timeout_seconds(player)
 
     @staticmethod
     def _update_timeout_streak(player, timeout_happened, decision_page=False):
+        if player.participant.vars.get('group_wait_agent'):
+            # 着席させたエージェントは脱落として数えない（早期終了の判定に影響させない）
+            return
         if not player.session.config.get('enable_timeout_autoplay', True):
             _reset_dropout_state(player)
             return
@@ -505,8 +1213,9 @@ class Contribution(BasePage):
     @staticmethod
     def vars_for_template(player):
         # _HistoryModal.html の player.in_all_rounds イテレータが正しい id_range を得られるようにする
-        id_range = list(range(1, Constants.players_per_group + 1))
-        player_count = len(player.group.get_players())
+        id_range = list(range(1, player_group_size(player) + 1))
+        rounds = _group_rounds(player.session, player.group_id)
+        player_count = len(rounds.get_players(player.group))
         history_allow_vertical_scroll = player_count > 5 and (player_count % 5 == 0)
         available = (
             player.available_endowment
@@ -514,10 +1223,11 @@ class Contribution(BasePage):
             else player.session.config.get('endowment', Constants.endowment)
         )
         return dict(
-            history=player.in_previous_rounds(),
+            history=rounds.in_previous_rounds(player),
             id_range=id_range,
             C=Constants,
-            history_rounds=build_history_rounds(player),
+            history_rounds=history_rounds_for_template(player),
+            history_lazy=_history_modal_lazy(player),
             available_endowment=player.available_endowment,
             available_endowment_display=_int_display(available),
             contribution_limit_display=_int_display(available),
@@ -527,25 +1237,17 @@ class Contribution(BasePage):
             history_allow_vertical_scroll=history_allow_vertical_scroll,
         )
 
+    @staticmethod
+    def js_vars(player):
+        return dict(BasePage.js_vars(player), validation=validation.client_spec(_contribution_rules(player)))
+
     @staticmethod
     def error_message(player, values):
-        contribution = values.get('contribution')
-        if contribution is None:
-            return '投資額を入力してください。'
-        endowment = player.session.config.get('endowment', Constants.endowment)
-        amount = float(contribution)
-        if not math.isfinite(amount):
-            return '投資額は0から20までの範囲で入力してください。'
-        available = float(player.available_endowment or endowment)
-        if amount < 0 or amount > available:
-            limit = int(available)
-            return f'投資額は0から{limit}までの範囲で入力してください。'
-        if not amount.is_integer():
-            return '投資額は整数で入力してください。'
-        return None
+        return validation.validate(_contribution_rules(player), values)
 
     @staticmethod
     def before_next_page(player, timeout_happened):
+        server = _server_autoplay(player)
         Contribution._update_timeout_streak(player, timeout_happened, decision_page=True)
         endowment = player.session.config.get('endowment', Constants.endowment)
         available = player.available_endowment if player.available_endowment is not None else c(endowment)
@@ -559,6 +1261,8 @@ class Contribution(BasePage):
         player.available_endowment = remaining
         player.available_before_punishment = remaining
         player.participant.vars['contribution_submitted_round'] = player.round_number
+        _push_wait_progress(player, 'contribution_submitted_round')
+        _record_page(player, 'Contribution', timeout_happened, server=server)
 
 # =============================================================================
 # CLASS: ContributionWaitPage
@@ -566,30 +1270,37 @@ class Contribution(BasePage):
 class ContributionWaitPage(WaitPage):
     template_name = "game/ContributionWait.html"
 
+    @staticmethod
+    def is_displayed(player):
+        return not _server_autoplay(player)
+
     @staticmethod
     def after_all_players_arrive(group):
+        _autoplay_dropouts(group, Contribution, 'contribution_submitted_round')
         group.set_group_contribution()
         if group.round_number == 1:
-            for player in group.get_players():
-                player.set_payoff()
+            group.set_payoff()
+            _freeze_page_snapshots(group, 'contribution', 'round', history=True)
+        else:
+            _freeze_page_snapshots(group, 'contribution')
+        _record_barrier(group, 'ContributionWaitPage')
 
     @staticmethod
     def vars_for_template(player):
-        _force_manual_after_bot_stop_round(player)
-        players = player.group.get_players()
-        current_round = player.round_number
-        submitted = sum(
-            1
-            for p in players
-            if p.participant.vars.get('contribution_submitted_round') == current_round
-        )
-        total = len(players)
-        return dict(waiting_progress=submitted, waiting_total=total)
+        return _wait_page_vars(player, 'contribution_submitted_round')
+
+    @staticmethod
+    def live_method(player, data):
+        return _wait_page_live(player, data, 'contribution_submitted_round')
 
 # =============================================================================
 # CLASS: ContributionResult
 # =============================================================================
 class ContributionResult(BasePage):
+    @staticmethod
+    def is_displayed(player):
+        return not _server_autoplay(player) and not _merged_result_page(player.session)
+
     @staticmethod
     def get_timeout_seconds(player):
         return _non_decision_timeout_seconds(player)
@@ -597,82 +1308,17 @@ class ContributionResult(BasePage):
     @staticmethod
     def before_next_page(player, timeout_happened):
         Contribution._update_timeout_streak(player, timeout_happened)
+        _record_page(player, 'ContributionResult', timeout_happened)
 
     @staticmethod
     def vars_for_template(player):
-        session = player.session
-        endowment = session.config['endowment']
-        multiplier = float(session.config.get('contribution_multiplier', Constants.multiplier))
-        share = player.group.individual_share
-        group_players = sorted(player.group.get_players(), key=lambda p: p.id_in_group)
-
-        def _compact_decimal(value):
-            value_f = float(value or 0)
-            if abs(value_f - round(value_f)) < 1e-9:
-                return str(int(round(value_f)))
-            return f"{value_f:.1f}"
-
-        players_data = []
-        for member in group_players:
-            contribution = member.contribution
-            remaining = member.available_endowment or c(0)
-            available_before = member.available_before_contribution or remaining + contribution
-            current_total = remaining + share
-            contribution_value = float(contribution or 0)
-            available_before_value = float(available_before or 0)
-            current_total_value = float(current_total or 0)
-            if available_before_value > 0:
-                contribution_fill_percent = max(
-                    0.0,
-                    min(100.0, (contribution_value / available_before_value) * 100.0),
-                )
-            else:
-                contribution_fill_percent = 0.0
-
-            players_data.append(
-                dict(
-                    player=member,
-                    id_in_group=member.id_in_group,
-                    is_self=member.id_in_group == player.id_in_group,
-                    contribution=contribution,
-                    contribution_value=contribution_value,
-                    contribution_display=_int_display(contribution_value),
-                    contribution_fill_percent=f"{contribution_fill_percent:.2f}",
-                    current_total=current_total,
-                    current_total_display=f"{current_total_value:.1f}",
-                    available_endowment=remaining,
-                    available_before_contribution=available_before,
-                    available_before_display=_int_display(available_before_value),
-                )
-            )
-
-        group_size = len(group_players) or 1
-        total_contribution_value = float(player.group.total_contribution or 0)
-        project_outcome_value = total_contribution_value * multiplier
-        project_outcome_max_value = float(endowment) * group_size * multiplier
-        if project_outcome_max_value > 0:
-            project_outcome_fill_percent = max(
-                0.0,
-                min(100.0, (project_outcome_value / project_outcome_max_value) * 100.0),
-            )
-        else:
-            project_outcome_fill_percent = 0.0
-
-        return dict(
-            players_data=players_data,
-            players_count=len(players_data),
-            endowment=endowment,
-            share=share,
-            project_outcome_value=project_outcome_value,
-            project_outcome_max_value=project_outcome_max_value,
-            project_outcome_fill_percent=f"{project_outcome_fill_percent:.2f}",
-            project_outcome_value_display=_compact_decimal(project_outcome_value),
-            project_outcome_max_display=_compact_decimal(project_outcome_max_value),
-        )
+        model = _result_snapshot(player.group, 'contribution')
+        return dict(model, players_data=_mark_self(model['players_data'], player.id_in_group))
 
 
 class PowerTransfer(BasePage):
     form_model = "player"
+    form_fields = ["power_transfer_edges"]
 
     @staticmethod
     def get_timeout_seconds(player):
@@ -681,39 +1327,33 @@ class PowerTransfer(BasePage):
     @staticmethod
     def is_displayed(player):
         session = player.session
-        return session.config.get("power_transfer_allowed") and player.round_number >= 3
-
-    @staticmethod
-    def get_form_fields(player):
-        return [
-            f"power_transfer_p{i}"
-            for i in range(1, Constants.players_per_group + 1)
-            if i != player.id_in_group
-        ]
+        return (
+            session.config.get("power_transfer_allowed")
+            and player.round_number >= 3
+            and not _server_autoplay(player)
+        )
 
     @staticmethod
     def vars_for_template(player):
         session = player.session
         transfer_unit = session.config.get("punishment_transfer_unit", 0.1)
         cost_per_unit = session.config.get("power_transfer_cost_rate", 0)
+        rounds = _group_rounds(session, player.group_id)
+        members = rounds.get_players(player.group)
         previous_transfer_values = {}
         # The power-transfer phase starts at round 3, so its second appearance
         # is round 4. From round 4 onward, prefill with last round's decisions.
         if player.round_number >= 4:
-            prev_player = player.in_round(player.round_number - 1)
-            for i in range(1, Constants.players_per_group + 1):
-                if i == player.id_in_group:
+            prev_player = rounds.in_round(player, player.round_number - 1)
+            for target, prev_value in prev_player.power_transfer_targets().items():
+                if target == player.id_in_group:
                     continue
-                field_name = f"power_transfer_p{i}"
-                prev_value = getattr(prev_player, field_name, 0)
-                try:
-                    normalized_value = max(0.0, float(prev_value or 0))
-                except (TypeError, ValueError):
-                    normalized_value = 0.0
-                previous_transfer_values[i] = normalized_value
+                previous_transfer_values[target] = max(0.0, prev_value)
 
         others_data = []
-        for other in player.get_others_in_group():
+        for other in members:
+            if other.id_in_group == player.id_in_group:
+                continue
             others_data.append(
                 dict(
                     id_in_group=other.id_in_group,
@@ -725,7 +1365,7 @@ class PowerTransfer(BasePage):
 
         # Precompute power values for template (otree templates lack round filter)
         members_data = []
-        for member in player.group.get_players():
+        for member in members:
             power_value = member.punishment_power_before
             if power_value is None:
                 power_value = member.participant.vars.get('punishment_power', 1.0)
@@ -778,81 +1418,65 @@ class PowerTransfer(BasePage):
             cost_per_unit_label=cost_per_unit_label,
             players_status=[],
             timeout_seconds=PowerTransfer.get_timeout_seconds(player),
-            power_max=Constants.players_per_group,
+            power_max=player_group_size(player),
         )
 
     @staticmethod
-    def error_message(player, values):
-        transfer_unit = player.session.config.get("punishment_transfer_unit", 0.1)
-        tolerance = 1e-4
-        current_power_value = float(player.punishment_power_before or 0)
-        previous_out_total = _previous_transfer_total(player)
-        max_transfer_limit = max(0.0, min(1.0, current_power_value + previous_out_total))
-        total = 0.0
-        for value in values.values():
-            if value is None:
-                continue
-            amount = float(value)
-            if not math.isfinite(amount):
-                return "譲渡量は0以上で入力してください。"
-            if amount < -tolerance:
-                return "譲渡量は0以上で入力してください。"
-            total += amount
-            if transfer_unit > 0:
-                multiples = amount / transfer_unit
-                if abs(multiples - round(multiples)) > 1e-6:
-                    return f"譲渡量は {transfer_unit} の倍数で入力してください。"
+    def js_vars(player):
+        return dict(BasePage.js_vars(player), validation=validation.client_spec(_power_transfer_rules(player)))
 
-        if total - max_transfer_limit > tolerance:
-            return f"譲渡量の合計は {max_transfer_limit:.1f} までです。"
+    @staticmethod
+    def error_message(player, values):
+        return validation.validate(_power_transfer_rules(player), values)
 
     @staticmethod
     def before_next_page(player, timeout_happened):
+        server = _server_autoplay(player)
         Contribution._update_timeout_streak(player, timeout_happened, decision_page=True)
         session = player.session
-        transfer_unit = session.config.get("punishment_transfer_unit", 0.1)
-        transfer_fields = [
-            f"power_transfer_p{i}"
-            for i in range(1, Constants.players_per_group + 1)
-            if i != player.id_in_group
-        ]
+        step = ledger.power_step(session)
+        other_ids = _other_member_ids(player)
         if timeout_happened:
-            prev_player = player.in_round(player.round_number - 1) if player.round_number >= 4 else None
-            for field in transfer_fields:
-                if prev_player is None:
-                    fallback_value = 0.0
-                else:
-                    try:
-                        fallback_value = max(0.0, float(getattr(prev_player, field, 0) or 0))
-                    except (TypeError, ValueError):
-                        fallback_value = 0.0
-                if transfer_unit > 0:
-                    fallback_value = round(fallback_value / transfer_unit) * transfer_unit
-                setattr(player, field, round(fallback_value, 3))
-        total_out = 0
-        for field in transfer_fields:
-            value = player.field_maybe_none(field)
-            if value is None:
-                value = 0
-                setattr(player, field, value)
-            total_out += value
-        player.power_transfer_out_total = round(total_out, 3)
+            transfer_units = {}
+            if player.round_number >= 4:
+                prev_player = _group_rounds(session, player.group_id).in_round(
+                    player, player.round_number - 1
+                )
+                for target, value in prev_player.power_transfer_targets().items():
+                    if target not in other_ids:
+                        continue
+                    transfer_units[target] = ledger.power_units(max(0.0, value), step)
+        else:
+            transfers = _parse_edge_input(
+                player.field_maybe_none("power_transfer_edges"), other_ids
+            ) or {}
+            transfer_units = {
+                target: ledger.power_units(amount, step)
+                for target, amount in transfers.items()
+            }
+        player.set_power_transfer_targets(
+            {
+                target: ledger.from_power_units(units, step)
+                for target, units in transfer_units.items()
+            }
+        )
+        out_units = sum(transfer_units.values())
+        player.power_transfer_out_total = ledger.from_power_units(out_units, step)
 
         rate = session.config.get("power_transfer_cost_rate", 0)
-        if session.config.get("costly_punishment_transfer") and transfer_unit > 0:
-            units = total_out / transfer_unit
-            cost_value = units * rate
-            player.power_transfer_cost = c(cost_value)
+        if session.config.get("costly_punishment_transfer") and ledger.has_transfer_grid(session):
+            player.power_transfer_cost = c(out_units * rate)
         else:
             player.power_transfer_cost = c(0)
 
         # In each transfer phase, each participant can transfer up to 1 unit.
         # Own retained transfer power before receiving others' transfers is 1 - out.
-        player.punishment_power_after = max(
-            0,
-            round(1.0 - float(player.power_transfer_out_total or 0), 3),
+        player.punishment_power_after = ledger.from_power_units(
+            max(0, ledger.power_units(1.0, step) - out_units), step
         )
         player.participant.vars['power_transfer_submitted_round'] = player.round_number
+        _push_wait_progress(player, 'power_transfer_submitted_round')
+        _record_page(player, 'PowerTransfer', timeout_happened, server=server)
 
 
 class PowerTransferWait(WaitPage):
@@ -861,27 +1485,33 @@ class PowerTransferWait(WaitPage):
     @staticmethod
     def is_displayed(player):
         session = player.session
-        return session.config.get("power_transfer_allowed") and player.round_number >= 3
+        return (
+            session.config.get("power_transfer_allowed")
+            and player.round_number >= 3
+            and not _server_autoplay(player)
+        )
 
     @staticmethod
     def after_all_players_arrive(group):
-        players = group.get_players()
+        _autoplay_dropouts(group, PowerTransfer, 'power_transfer_submitted_round')
+        session = group.session
+        rounds = _group_rounds(session, group.id)
+        players = rounds.get_players(group)
+        step = ledger.power_step(session)
+        base_units = ledger.power_units(1.0, step)
+        endowment_tenths = ledger.to_tenths(session.config.get('endowment', Constants.endowment))
+        # Walk only the non-zero transfer edges, giver by giver in id order.
+        incoming = {player.id_in_group: 0 for player in players}
+        for giver in players:
+            for target, amount in giver.power_transfer_targets().items():
+                if target != giver.id_in_group and target in incoming:
+                    incoming[target] += ledger.power_units(amount, step)
         for player in players:
-            total_in = 0
-            for other in players:
-                if other.id_in_group == player.id_in_group:
-                    continue
-                field_name = f"power_transfer_p{player.id_in_group}"
-                total_in += getattr(other, field_name, 0) or 0
-            player.power_transfer_in_total = round(total_in, 3)
-            player.punishment_power_after = max(
-                0,
-                round(
-                    1.0
-                    - player.power_transfer_out_total
-                    + player.power_transfer_in_total,
-                    3,
-                ),
+            in_units = incoming[player.id_in_group]
+            out_units = ledger.power_units(player.power_transfer_out_total, step)
+            player.power_transfer_in_total = ledger.from_power_units(in_units, step)
+            player.punishment_power_after = ledger.from_power_units(
+                max(0, base_units - out_units + in_units), step
             )
             player.participant.vars["punishment_power"] = player.punishment_power_after
 
@@ -890,28 +1520,24 @@ class PowerTransferWait(WaitPage):
             # experiment starts, meaning the defaults written there (1.0) need
             # to be replaced once we know the actual outcome of this round.
             if player.round_number < Constants.num_rounds:
-                next_player = player.in_round(player.round_number + 1)
+                next_player = rounds.in_round(player, player.round_number + 1)
                 next_player.punishment_power_before = player.punishment_power_after
                 next_player.punishment_power_after = player.punishment_power_after
                 next_player.participant.vars["punishment_power"] = player.punishment_power_after
 
-            endowment = player.session.config.get('endowment', Constants.endowment)
-            cost_value = float(player.power_transfer_cost or 0)
-            remaining = max(0, endowment - cost_value)
-            player.available_endowment = c(remaining)
+            cost_tenths = ledger.to_tenths(player.power_transfer_cost)
+            player.available_endowment = ledger.from_tenths(max(0, endowment_tenths - cost_tenths))
+
+        _freeze_page_snapshots(group, 'power_transfer')
+        _record_barrier(group, 'PowerTransferWait', players)
 
     @staticmethod
     def vars_for_template(player):
-        _force_manual_after_bot_stop_round(player)
-        players = player.group.get_players()
-        current_round = player.round_number
-        submitted = sum(
-            1
-            for p in players
-            if p.participant.vars.get('power_transfer_submitted_round') == current_round
-        )
-        total = len(players)
-        return dict(waiting_progress=submitted, waiting_total=total)
+        return _wait_page_vars(player, 'power_transfer_submitted_round')
+
+    @staticmethod
+    def live_method(player, data):
+        return _wait_page_live(player, data, 'power_transfer_submitted_round')
 
 
 class PowerTransferResult(BasePage):
@@ -922,68 +1548,35 @@ class PowerTransferResult(BasePage):
     @staticmethod
     def before_next_page(player, timeout_happened):
         Contribution._update_timeout_streak(player, timeout_happened)
+        _record_page(player, 'PowerTransferResult', timeout_happened)
 
     @staticmethod
     def is_displayed(player):
         session = player.session
-        return session.config.get("power_transfer_allowed") and player.round_number >= 3
+        return (
+            session.config.get("power_transfer_allowed")
+            and player.round_number >= 3
+            and not _server_autoplay(player)
+        )
 
     @staticmethod
     def vars_for_template(player):
-        session = player.session
-        group_players = sorted(
-            player.group.get_players(), key=lambda p: p.id_in_group
-        )
-
-        columns = []
-        for member in group_players:
-            transfer_cost_value = member.power_transfer_cost
-            if transfer_cost_value is None:
-                transfer_cost_display = "0.0"
-            else:
-                transfer_cost_display = f"{float(transfer_cost_value):.1f}"
-            final_power_value = float(member.punishment_power_after or 0)
-            columns.append(
-                dict(
-                    id_in_group=member.id_in_group,
-                    is_self=member.id_in_group == player.id_in_group,
-                    header=f"プレイヤー {member.id_in_group}",
-                    base_power_value=float(member.punishment_power_before or 0),
-                    final_power_display=f"{member.punishment_power_after:.1f}",
-                    final_power_value=final_power_value,
-                    net_transfer_display=f"- {member.power_transfer_out_total:.1f} / + {member.power_transfer_in_total:.1f}",
-                    transfer_cost_display=transfer_cost_display,
-                    current_balance_display="-",
-                )
-            )
-
-        transfer_matrix = []
-        for giver in group_players:
-            row_cells = []
-            for receiver in group_players:
-                if giver.id_in_group == receiver.id_in_group:
-                    row_cells.append(dict(is_self=True, highlight=False, display="-"))
-                else:
-                    field_name = f"power_transfer_p{receiver.id_in_group}"
-                    amount = getattr(giver, field_name, 0) or 0
-                    row_cells.append(
-                        dict(
-                            is_self=False,
-                            highlight=receiver.id_in_group == player.id_in_group,
-                            display=f"{amount:.1f}",
-                        )
-                    )
-            transfer_matrix.append(
-                dict(
-                    row_label=f"プレイヤー {giver.id_in_group}",
-                    is_self=giver.id_in_group == player.id_in_group,
-                    cells=row_cells,
-                )
+        model = _result_snapshot(player.group, 'power_transfer')
+        columns = _mark_self(model['columns'], player.id_in_group)
+        transfer_matrix = [
+            dict(
+                row,
+                is_self=row['giver_id'] == player.id_in_group,
+                cells=[
+                    dict(cell, highlight=cell.get('receiver_id') == player.id_in_group)
+                    for cell in row['cells']
+                ],
             )
-
+            for row in model['transfer_matrix']
+        ]
         headers = [
-            "あなたへの転移" if p.id_in_group == player.id_in_group else f"プレイヤー {p.id_in_group} への転移"
-            for p in group_players
+            "あなたへの転移" if col['is_self'] else f"プレイヤー {col['id_in_group']} への転移"
+            for col in columns
         ]
         columns_length = len(columns)
 
@@ -994,8 +1587,8 @@ class PowerTransferResult(BasePage):
             transfer_matrix=transfer_matrix,
             transfer_headers=headers,
             round_number=player.round_number,
-            is_costly=session.config.get("costly_punishment_transfer", False),
-            power_max=Constants.players_per_group,
+            is_costly=player.session.config.get("costly_punishment_transfer", False),
+            power_max=player_group_size(player),
         )
 
 
@@ -1005,28 +1598,19 @@ class PowerTransferResult(BasePage):
 # =============================================================================
 class Punishment(BasePage):
     form_model = 'player'
+    form_fields = ['punishment_edges']
 
     @staticmethod
     def get_timeout_seconds(player):
         return _decision_timeout_seconds(player)
 
-    @staticmethod
-    def get_form_fields(player):
-        fields = []
-        group = player.group
-        for i in range(1, Constants.players_per_group + 1):
-            if i == player.id_in_group:
-                continue
-            fields.append(f'punish_p{i}')
-        return fields
-
     @staticmethod
     def is_displayed(player):
-        return player.round_number > 1
+        return player.round_number > 1 and not _server_autoplay(player)
 
     @staticmethod
     def vars_for_template(player):
-        id_range = list(range(1, Constants.players_per_group + 1))
+        id_range = list(range(1, player_group_size(player) + 1))
         session = player.session
         endowment = session.config['endowment']
         contribution = player.contribution if hasattr(player, 'contribution') else 0
@@ -1039,7 +1623,10 @@ class Punishment(BasePage):
             remaining_mu = endowment - contribution
         remaining_mu_value = float(remaining_mu) if remaining_mu is not None else 0.0
 
-        players = sorted(player.group.get_players(), key=lambda p: p.id_in_group)
+        players = sorted(
+            _group_rounds(session, player.group_id).get_players(player.group),
+            key=lambda p: p.id_in_group,
+        )
         history_allow_vertical_scroll = len(players) > 5 and (len(players) % 5 == 0)
         players_data = []
         self_power_value = 1.0
@@ -1058,6 +1645,7 @@ class Punishment(BasePage):
                     contribution_display=_int_display(member.contribution),
                     power_value=float(power_value),
                     power_display=f"{float(power_value):.1f}",
+                    available_display=f"{payoff.member_available_before(member):.1f}",
                 )
             )
 
@@ -1075,7 +1663,8 @@ class Punishment(BasePage):
             endowment=endowment,
             endowment_display=endowment_display,
             id_range=id_range,
-            history_rounds=build_history_rounds(player),
+            history_rounds=history_rounds_for_template(player),
+            history_lazy=_history_modal_lazy(player),
             remaining_mu=remaining_mu,
             remaining_mu_value=remaining_mu_value,
             show_power_info=False,
@@ -1090,39 +1679,39 @@ class Punishment(BasePage):
             history_allow_vertical_scroll=history_allow_vertical_scroll,
         )
 
+    @staticmethod
+    def js_vars(player):
+        return dict(
+            BasePage.js_vars(player),
+            validation=validation.client_spec(_punishment_rules(player)),
+            punishment_preview=_punishment_preview(player),
+        )
+
     @staticmethod
     def error_message(player, values):
-        per_target_limit = player.session.config.get('per_target_dp_limit', player.session.config['deduction_points'])
-        for i in range(1, Constants.players_per_group + 1):
-            field_name = f'punish_p{i}'
-            if field_name in values and values[field_name] is not None:
-                value = float(values[field_name])
-                if not math.isfinite(value):
-                    return "減点は0以上の整数で入力してください。"
-                if value < 0:
-                    return "減点は0以上の整数で入力してください。"
-                if int(value) != value:
-                    return "減点は整数で入力してください。"
-                if value > per_target_limit:
-                    return f"各プレイヤーへの減点は {per_target_limit} 以内で入力してください。"
+        return validation.validate(_punishment_rules(player), values)
 
     @staticmethod
     def before_next_page(player, timeout_happened):
+        server = _server_autoplay(player)
         Contribution._update_timeout_streak(player, timeout_happened, decision_page=True)
         punishment_cost = player.session.config.get('punishment_cost', 1)
-        total_punishment = 0
-        for i in range(1, Constants.players_per_group + 1):
-            field_name = f'punish_p{i}'
-            if hasattr(player, field_name):
-                if timeout_happened:
-                    setattr(player, field_name, 0)
-                value = getattr(player, field_name, 0) or 0
-                total_punishment += value
+        if timeout_happened:
+            punishments = {}
+        else:
+            punishments = _parse_edge_input(
+                player.field_maybe_none('punishment_edges'), _other_member_ids(player)
+            ) or {}
+        punishments = {target: int(points) for target, points in punishments.items()}
+        player.set_punishment_targets(punishments)
+        total_punishment = sum(punishments.values())
         total_cost = c(total_punishment * punishment_cost)
         player.available_before_punishment = player.available_endowment or c(0)
         player.attempted_punishment_cost = total_cost
         player.attempted_punishment_points = total_punishment
         player.participant.vars['punishment_submitted_round'] = player.round_number
+        _push_wait_progress(player, 'punishment_submitted_round')
+        _record_page(player, 'Punishment', timeout_happened, server=server)
 
 # =============================================================================
 # CLASS: PunishmentWaitPage
@@ -1132,24 +1721,22 @@ class PunishmentWaitPage(WaitPage):
 
     @staticmethod
     def is_displayed(player):
-        return player.round_number > 1
+        return player.round_number > 1 and not _server_autoplay(player)
 
     @staticmethod
     def after_all_players_arrive(group):
+        _autoplay_dropouts(group, Punishment, 'punishment_submitted_round')
         group.set_payoff()
+        _freeze_page_snapshots(group, 'punishment', 'round', history=True)
+        _record_barrier(group, 'PunishmentWaitPage')
 
     @staticmethod
     def vars_for_template(player):
-        _force_manual_after_bot_stop_round(player)
-        players = player.group.get_players()
-        current_round = player.round_number
-        submitted = sum(
-            1
-            for p in players
-            if p.participant.vars.get('punishment_submitted_round') == current_round
-        )
-        total = len(players)
-        return dict(waiting_progress=submitted, waiting_total=total)
+        return _wait_page_vars(player, 'punishment_submitted_round')
+
+    @staticmethod
+    def live_method(player, data):
+        return _wait_page_live(player, data, 'punishment_submitted_round')
 
 # =============================================================================
 # CLASS: PunishmentResult
@@ -1161,11 +1748,16 @@ class PunishmentResult(BasePage):
 
     @staticmethod
     def is_displayed(player):
-        return player.round_number > 1
+        return (
+            player.round_number > 1
+            and not _server_autoplay(player)
+            and not _merged_result_page(player.session)
+        )
 
     @staticmethod
     def before_next_page(player, timeout_happened):
         Contribution._update_timeout_streak(player, timeout_happened)
+        _record_page(player, 'PunishmentResult', timeout_happened)
         if (
             player.session.config.get('use_browser_bots')
             and player.session.config.get('browser_bot_stop_stage', 'game') == 'game'
@@ -1176,137 +1768,12 @@ class PunishmentResult(BasePage):
 
     @staticmethod
     def vars_for_template(player):
-        session = player.session
-        treatment_name = session.config.get('treatment_name', 'fixed')
-        show_power_transfer = (
-            session.config.get('power_transfer_allowed')
-            and player.round_number >= 3
-        )
-
-        endowment = session.config['endowment']
-        endowment_display = _int_display(endowment)
-        per_target_dp_limit = session.config.get('per_target_dp_limit', session.config['deduction_points'])
-        endowment_currency = c(endowment)
-
-        players = sorted(player.group.get_players(), key=lambda p: p.id_in_group)
-        effectiveness_base = session.config.get('power_effectiveness', Constants.power_effectiveness)
-        max_total_dp = float(per_target_dp_limit) * max(len(players) - 1, 0)
-        max_total_dp_display = f"{int(max_total_dp)}"
-        dp_cost_denom = max_total_dp if max_total_dp > 0 else 1.0
-
-        players_map = {}
-        for member in players:
-            available_before_contribution = (
-                member.available_before_contribution
-                or (member.available_endowment or c(0)) + (member.contribution or c(0))
-            )
-            power_after_value = float(
-                member.punishment_power_after
-                or member.participant.vars.get('punishment_power', 1.0)
-            )
-            players_map[member.id_in_group] = dict(
-                id_in_group=member.id_in_group,
-                contribution=member.contribution,
-                contribution_display=_int_display(member.contribution),
-                endowment=endowment_currency,
-                endowment_value=endowment,
-                endowment_display=endowment_display,
-                punishment_sent_total=0,
-                punishment_sent_total_display="0",
-                punishment_cost_total_display="0.0",
-                punishment_received_total=0,
-                power_before=member.punishment_power_before,
-                power_after=power_after_value,
-                power_after_display=f"{power_after_value:.1f}",
-                power_after_value=power_after_value,
-                power_transfer_out=member.power_transfer_out_total,
-                power_transfer_in=member.power_transfer_in_total,
-                power_transfer_out_display=f"{member.power_transfer_out_total:.1f}",
-                power_transfer_in_display=f"{member.power_transfer_in_total:.1f}",
-                power_transfer_cost=member.power_transfer_cost,
-                available_endowment=member.available_endowment,
-                available_before_contribution=available_before_contribution,
-                available_before_contribution_display=_int_display(available_before_contribution),
-                punishment_effect_display="0.0",
-                punishment_sent_fill_percent="0.00",
-            )
-
-        for member in players:
-            total_sent = getattr(member, 'punishment_points_given_actual', None)
-            if total_sent is None:
-                total_sent = 0
-                for other in players:
-                    if other.id_in_group == member.id_in_group:
-                        continue
-                    field_name = f'punish_p{other.id_in_group}'
-                    total_sent += getattr(member, field_name, 0) or 0
-            players_map[member.id_in_group]['punishment_sent_total'] = total_sent
-            players_map[member.id_in_group]['punishment_sent_total_display'] = str(int(round(float(total_sent))))
-            punishment_cost_total = member.punishment_given
-            if punishment_cost_total is None:
-                punishment_cost_total = c(float(total_sent) * float(session.config.get('punishment_cost', 1)))
-            players_map[member.id_in_group]['punishment_cost_total_display'] = f"{float(punishment_cost_total):.1f}"
-            effect_total = float(total_sent) * float(effectiveness_base) * players_map[member.id_in_group]['power_after_value']
-            players_map[member.id_in_group]['punishment_effect_display'] = f"{effect_total:.1f}"
-            players_map[member.id_in_group]['punishment_sent_fill_percent'] = (
-                f"{max(0.0, min(100.0, (float(total_sent) / dp_cost_denom) * 100.0)):.2f}"
-            )
-
-        matrix_rows = []
-        max_per_target = float(per_target_dp_limit) if float(per_target_dp_limit) > 0 else 1.0
-        for giver in players:
-            giver_power = players_map[giver.id_in_group]['power_after_value']
-            row_cells = []
-            for victim in players:
-                is_self = giver.id_in_group == victim.id_in_group
-                if is_self:
-                    row_cells.append(dict(is_self=True))
-                    continue
-
-                points_raw = getattr(giver, f'punish_p{victim.id_in_group}', 0) or 0
-                points_value = int(round(float(points_raw)))
-                effect_value = float(points_value) * float(effectiveness_base) * float(giver_power)
-                fill_percent = max(0.0, min(100.0, (float(points_value) / max_per_target) * 100.0))
-                row_cells.append(
-                    dict(
-                        is_self=False,
-                        points=points_value,
-                        points_display=str(points_value),
-                        effect_display=f"{effect_value:.1f}",
-                        fill_percent=f"{fill_percent:.2f}",
-                    )
-                )
-
-            matrix_rows.append(
-                dict(
-                    giver_id=giver.id_in_group,
-                    is_self=giver.id_in_group == player.id_in_group,
-                    power_display=players_map[giver.id_in_group]['power_after_display'],
-                    cells=row_cells,
-                )
-            )
-
-        players_summary = [players_map[idx] for idx in sorted(players_map.keys())]
-        matrix_headers = [
-            dict(
-                id_in_group=member.id_in_group,
-                is_self=member.id_in_group == player.id_in_group,
-            )
-            for member in players
-        ]
-        round_result_allow_vertical_scroll = len(players) > 5 and (len(players) % 5 == 0)
-
+        model = _result_snapshot(player.group, 'punishment')
         return dict(
-            players_summary=players_summary,
-            matrix_rows=matrix_rows,
-            matrix_headers=matrix_headers,
-            show_power_transfer=show_power_transfer,
-            treatment_name=treatment_name,
-            per_target_dp_limit=per_target_dp_limit,
-            max_total_dp=max_total_dp,
-            max_total_dp_display=max_total_dp_display,
-            endowment=endowment_currency,
-            round_result_allow_vertical_scroll=round_result_allow_vertical_scroll,
+            model,
+            matrix_rows=_mark_self(model['matrix_rows'], player.id_in_group, key='giver_id'),
+            matrix_headers=_mark_self(model['matrix_headers'], player.id_in_group),
+            endowment=c(player.session.config['endowment']),
         )
 
 
@@ -1314,12 +1781,21 @@ class PunishmentResult(BasePage):
 # CLASS: RoundResult
 # =============================================================================
 class RoundResult(BasePage):
+    @staticmethod
+    def is_displayed(player):
+        return not _server_autoplay(player) and not _merged_result_page(player.session)
+
     @staticmethod
     def get_timeout_seconds(player):
         return _non_decision_timeout_seconds(player)
 
     @staticmethod
     def before_next_page(player, timeout_happened):
+        RoundResult._finish_round(player, timeout_happened)
+        _record_page(player, 'RoundResult', timeout_happened)
+
+    @staticmethod
+    def _finish_round(player, timeout_happened):
         Contribution._update_timeout_streak(player, timeout_happened)
         if (
             player.session.config.get('use_browser_bots')
@@ -1352,53 +1828,46 @@ class RoundResult(BasePage):
 
     @staticmethod
     def vars_for_template(player):
-        session = player.session
-        multiplier = float(session.config.get('contribution_multiplier', Constants.multiplier))
-        players = sorted(player.group.get_players(), key=lambda p: p.id_in_group)
+        model = _result_snapshot(player.group, 'round')
+        return dict(
+            model,
+            cumulative_payoff=player.participant.vars.get('cumulative_payoff', c(0)),
+            earnings_players=_mark_self(model['earnings_players'], player.id_in_group),
+        )
 
-        def _compact_decimal(value):
-            value_f = float(value or 0)
-            if abs(value_f - round(value_f)) < 1e-9:
-                return str(int(round(value_f)))
-            return f"{value_f:.1f}"
+# =============================================================================
+# CLASS: MergedResult (merged_result_page 有効時の結果ページ)
+# =============================================================================
+class MergedResult(BasePage):
+    """
+    Replaces ContributionResult, PunishmentResult and RoundResult with one page
+    when merged_result_page is on. All three models come from the group's result
+    snapshot, so the page renders the same data as the separate pages.
+    """
 
-        earnings_players = []
-        for member in players:
-            payoff_value = float(member.payoff or 0)
-            earnings_players.append(
-                dict(
-                    id_in_group=member.id_in_group,
-                    is_self=member.id_in_group == player.id_in_group,
-                    payoff=member.payoff,
-                    payoff_display=f"{payoff_value:.1f}",
-                )
-            )
+    @staticmethod
+    def is_displayed(player):
+        return _merged_result_page(player.session) and not _server_autoplay(player)
 
-        total_contribution_value = float(player.group.total_contribution or 0)
-        project_outcome_value = total_contribution_value * multiplier
-        project_outcome_max_value = 0.0
-        for member in players:
-            available_before = member.available_before_contribution
-            if available_before is None:
-                available_before = session.config.get('endowment', Constants.endowment)
-            project_outcome_max_value += float(available_before or 0) * multiplier
-        if project_outcome_max_value > 0:
-            project_outcome_fill_percent = max(
-                0.0,
-                min(100.0, (project_outcome_value / project_outcome_max_value) * 100.0),
-            )
-        else:
-            project_outcome_fill_percent = 0.0
+    @staticmethod
+    def get_timeout_seconds(player):
+        return _non_decision_timeout_seconds(player)
+
+    @staticmethod
+    def before_next_page(player, timeout_happened):
+        RoundResult._finish_round(player, timeout_happened)
+        _record_page(player, 'MergedResult', timeout_happened)
+
+    @staticmethod
+    def vars_for_template(player):
+        show_punishment_result = player.round_number > 1
+        merged = dict(ContributionResult.vars_for_template(player))
+        if show_punishment_result:
+            merged.update(PunishmentResult.vars_for_template(player))
+        merged.update(RoundResult.vars_for_template(player))
+        merged.update(show_punishment_result=show_punishment_result)
+        return merged
 
-        return dict(
-            cumulative_payoff=player.participant.vars.get('cumulative_payoff', c(0)),
-            earnings_players=earnings_players,
-            project_outcome_value=project_outcome_value,
-            project_outcome_max_value=project_outcome_max_value,
-            project_outcome_fill_percent=f"{project_outcome_fill_percent:.2f}",
-            project_outcome_value_display=_compact_decimal(project_outcome_value),
-            project_outcome_max_display=_compact_decimal(project_outcome_max_value),
-        )
 
 # =============================================================================
 # CLASS: FinalResult (ゲームアプリ内の最終ページ)
@@ -1411,9 +1880,12 @@ class FinalResult(BasePage):
     @staticmethod
     def before_next_page(player, timeout_happened):
         Contribution._update_timeout_streak(player, timeout_happened)
+        _record_page(player, 'FinalResult', timeout_happened)
 
     @staticmethod
     def is_displayed(player):
+        if _server_autoplay(player):
+            return False
         early_stop_round = player.participant.vars.get('early_stop_round')
         if early_stop_round:
             return player.round_number == early_stop_round
@@ -1458,5 +1930,12 @@ page_sequence = [
     PunishmentWaitPage,
     PunishmentResult,
     RoundResult,
+    MergedResult,
     FinalResult, # <--- ゲームアプリの最後に表示する最終結果ページ
 ]
+
+# page_timing が有効なセッションでページ処理のサーバー時間を計測する（timing.py）
+timing.instrument_pages(page_sequence)
+
+# ハッシュ付きの静的バンドル（assets.py）を長期キャッシュ可能なヘッダーで配信する
+assets.install_cache_headers()
@@ -0,0 +1,128 @@
+# game/payoff.py
+
+"""
+Matrix payoff engine for one group.
+
+Group.set_payoff loads the group's punishment edges (the non-zero cells of the
+punishment matrix), power vector and contribution inputs once, computes every
+member's punishment cost, loss and payoff in one pass over the edges, and
+writes the results back in a single loop. The work grows with the number of
+punishments actually given, not with the square of the group size.
+
+The arithmetic mirrors the reference Group.adjust_punishments /
+Player.set_payoff pair term for term, including the float summation order,
+so the stored values are identical:
+
+    π_i = E - c_i + (m/n)Σc_j - pc·Σd_ij - pe·Σd_ji
+"""
+
+from otree.api import Currency as c
+
+from .ledger import from_tenths, to_tenths
+
+
+def member_power(player, default_power=1.0):
+    """Punishment power the engine applies to one giver's points."""
+    return player.punishment_power_after or player.participant.vars.get('punishment_power', default_power)
+
+
+def member_available_before(player):
+    """MU a member holds when the punishment stage starts, as a float."""
+    return float(player.available_before_punishment or player.available_endowment or 0)
+
+
+def load_group_state(players, default_power=1.0):
+    """Read one group's punishment inputs into id-ordered vectors and an edge list."""
+    players = sorted(players, key=lambda p: p.id_in_group)
+    ids = [p.id_in_group for p in players]
+    index_of = {id_in_group: index for index, id_in_group in enumerate(ids)}
+
+    # (giver index, victim index, points), ordered by giver then victim
+    edges = []
+    power = []
+    attempted_cost = []
+    available_before = []
+    for g, giver in enumerate(players):
+        targets = giver.punishment_targets()
+        for victim_id in sorted(targets):
+            v = index_of.get(victim_id)
+            if v is None or v == g:
+                continue
+            edges.append((g, v, targets[victim_id]))
+        power.append(member_power(giver, default_power))
+        attempted_cost.append(float(giver.attempted_punishment_cost or 0))
+        available_before.append(member_available_before(giver))
+
+    return dict(
+        players=players,
+        ids=ids,
+        edges=edges,
+        power=power,
+        attempted_cost=attempted_cost,
+        available_before=available_before,
+    )
+
+
+def compute_punishment_outcome(state, cost_per_point, effectiveness):
+    """
+    Sum the punishment edges into per-giver and per-victim totals in one pass.
+
+    Edges are visited giver by giver and victim by victim, so every running
+    sum adds its terms in the same order as the reference implementation.
+    Returns per-member points sent/received, clamped cost, loss and the
+    available MU after the punishment stage, all as floats.
+    """
+    size = len(state['ids'])
+    loss_per_point = [effectiveness * power for power in state['power']]
+
+    points_sent = [0.0] * size
+    raw_cost = [0.0] * size
+    points_received = [0.0] * size
+    loss = [0.0] * size
+    for g, v, points in state['edges']:
+        if points <= 0:
+            continue
+        loss[v] += points * loss_per_point[g]
+        points_received[v] += points
+        points_sent[g] += points
+        raw_cost[g] += points * cost_per_point
+
+    cost = [min(raw, attempted) for raw, attempted in zip(raw_cost, state['attempted_cost'])]
+    available_after = [
+        before - spent - lost
+        for before, spent, lost in zip(state['available_before'], cost, loss)
+    ]
+    return dict(
+        points_sent=points_sent,
+        points_received=points_received,
+        cost=cost,
+        loss=loss,
+        available_after=available_after,
+    )
+
+
+def apply_group_payoffs(state, outcome, individual_share, endowment):
+    """
+    Write punishment results, payoffs and carried-over state back to players.
+    The payoff sum runs on whole tenths of an MU (see ledger.py).
+    """
+    base_tenths = to_tenths(endowment) + to_tenths(individual_share)
+    for i, player in enumerate(state['players']):
+        player.punishment_points_received_actual = outcome['points_received'][i]
+        player.punishment_received = c(outcome['loss'][i])
+        player.available_endowment = c(outcome['available_after'][i])
+        player.punishment_given = c(outcome['cost'][i])
+        player.punishment_points_given_actual = outcome['points_sent'][i]
+
+        payoff_tenths = (
+            base_tenths
+            - to_tenths(player.contribution)
+            - to_tenths(player.punishment_given)
+            - to_tenths(player.punishment_received)
+            - to_tenths(player.power_transfer_cost)
+        )
+        player.payoff = from_tenths(payoff_tenths)
+
+        cumulative_tenths = to_tenths(player.participant.vars.get('cumulative_payoff'))
+        player.participant.vars['cumulative_payoff'] = from_tenths(cumulative_tenths + payoff_tenths)
+        player.participant.vars['punishment_power'] = player.punishment_power_after
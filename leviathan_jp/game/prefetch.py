@@ -0,0 +1,113 @@
+# game/prefetch.py
+
+"""
+Request-scoped prefetch of one group's Player rows across all rounds.
+
+oTree opens a fresh database session for every request, and each
+player.in_round(), player.in_previous_rounds() or group.get_players() call
+issues its own query. group_rounds() loads the Player rows of every
+participant in one group, in all rounds and with their Group and Participant
+rows, in a single query. It caches that result on the current database session,
+so the rest of the request reads from memory.
+
+Lookups that skip a query are counted in GroupRounds.queries_saved.
+count_queries() counts the statements that actually reach the database,
+which lets the bot tests check a per-page query budget.
+"""
+
+import weakref
+from contextlib import contextmanager
+
+from sqlalchemy import event
+from sqlalchemy.orm import joinedload
+
+from otree.database import db, dbq, engine
+
+
+# database session of the current request -> {(Player class, group id): GroupRounds}
+_REQUEST_CACHE = weakref.WeakKeyDictionary()
+
+
+class GroupRounds:
+    """In-memory view of one group's participants across every round."""
+
+    def __init__(self, Player, group_id, expected_group_size=None):
+        member_ids = dbq(Player.participant_id).filter(Player.group_id == group_id)
+        rows = (
+            Player.objects_filter(Player.participant_id.in_(member_ids.subquery()))
+            .options(joinedload(Player.group), joinedload(Player.participant))
+            .order_by(Player.round_number, Player.id_in_group)
+            .all()
+        )
+        self.participant_ids = frozenset(row.participant_id for row in rows)
+        # None: the group's own size, i.e. the participants loaded for group_id
+        self.expected_group_size = len(self.participant_ids) if expected_group_size is None else expected_group_size
+        self.rows = rows
+        self._by_round = {(row.participant_id, row.round_number): row for row in rows}
+        self.queries_saved = 0
+
+    def in_round(self, player, round_number):
+        found = self._by_round.get((player.participant_id, round_number))
+        if found is None:
+            return player.in_round(round_number)
+        self.queries_saved += 1
+        return found
+
+    def in_previous_rounds(self, player):
+        previous = []
+        for round_number in range(1, player.round_number):
+            found = self._by_round.get((player.participant_id, round_number))
+            if found is None:
+                return player.in_previous_rounds()
+            previous.append(found)
+        self.queries_saved += 1
+        return previous
+
+    def get_players(self, group):
+        # Read group_id at call time: round-1 regrouping moves rows between groups.
+        members = [
+            row
+            for row in self.rows
+            if row.round_number == group.round_number and row.group_id == group.id
+        ]
+        if len(members) != self.expected_group_size:
+            # Part of that group lies outside the prefetched participants.
+            return group.get_players()
+        self.queries_saved += 1
+        return members
+
+
+def group_rounds(Player, group_id, expected_group_size=None):
+    """
+    Return the GroupRounds of one group for the current request.
+    expected_group_size defaults to the number of participants in group_id.
+    """
+    request_session = db._db
+    if request_session is None:
+        return GroupRounds(Player, group_id, expected_group_size)
+    cache = _REQUEST_CACHE.setdefault(request_session, {})
+    key = (Player, group_id)
+    accessor = cache.get(key)
+    if accessor is None:
+        accessor = GroupRounds(Player, group_id, expected_group_size)
+        cache[key] = accessor
+    return accessor
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, *args, **kwargs):
+        self.count += 1
+
+
+@contextmanager
+def count_queries():
+    """Count the SQL statements executed inside the block."""
+    counter = QueryCounter()
+    event.listen(engine, 'before_cursor_execute', counter)
+    try:
+        yield counter
+    finally:
+        event.remove(engine, 'before_cursor_execute', counter)
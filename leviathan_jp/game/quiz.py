@@ -0,0 +1,47 @@
+# game/quiz.py
+
+"""
+Answer keys of the comprehension quizzes.
+
+The introduction app's rule quizzes and the game's pre-round quizzes
+(RoundInstruction) ask the same questions, so both read their keys from
+here. The keys only ever reach validation.validate on the server: the pages
+send validation.client_spec() to the browser, which checks that every
+question is answered but not what the answers are.
+"""
+
+from . import validation
+
+
+# Shown in the browser when a quiz question is left unanswered
+REQUIRED_MESSAGE = "すべての設問に回答してください。"
+
+INVESTMENT_ANSWERS = dict(intro1_q1=2, intro1_q2=2, intro1_q3=3, intro1_q4=3)
+PUNISHMENT_ANSWERS = dict(intro2_q1=3, intro2_q2=3, intro2_q3=3)
+
+
+def power_rule_answers(config):
+    """Answers of the third quiz, which depends on the treatment."""
+    if config.get("power_transfer_allowed"):
+        return dict(
+            intro3_transfer_q1=3 if config.get("costly_punishment_transfer") else 1,
+            intro3_transfer_q2=2,
+            intro3_transfer_q3=2,
+        )
+    return dict(intro3_fixed_q1=1)
+
+
+def stage_answers(stage, config):
+    """Answers of the quiz before round1/round2/round3, or None for other stages."""
+    if stage == "round1":
+        return dict(INVESTMENT_ANSWERS)
+    if stage == "round2":
+        return dict(PUNISHMENT_ANSWERS)
+    if stage == "round3":
+        return power_rule_answers(config)
+    return None
+
+
+def rules(answers, message):
+    """Validation spec that rejects any wrong answer with message."""
+    return validation.spec(validation.answers_rule(answers, message, REQUIRED_MESSAGE))
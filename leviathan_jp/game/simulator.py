@@ -0,0 +1,686 @@
+# game/simulator.py
+
+"""
+Headless in-process simulator for the game app.
+
+Subsession/Group/Player state lives in plain in-memory objects that borrow
+the real model methods, and pages.page_sequence is driven directly. For each
+round and page the simulator calls is_displayed, error_message and
+before_next_page, and it calls each wait page's after_all_players_arrive
+once per group. Nothing goes through HTTP or the database. Unless pages
+are rendered, the wait pages also skip the result/history snapshots and
+page methods bypass the game.timing wrappers, since no page reads them. A
+20-round session of five participants takes about 25 ms (fixed) to 45 ms
+(transfer with cost) on one core, i.e. roughly 1,300-2,400 sessions per
+minute per process. game.sweep runs sessions in parallel processes, which
+makes regression runs and power analyses over thousands of sessions
+practical.
+
+Decisions come from pluggable strategies (see Strategy). Only the game app
+is simulated. The introduction and survey apps do not affect payoffs.
+
+Run from the oTree project directory:
+
+    python -m game.simulator pggp_transfer_cost --sessions 1000 --strategy random
+"""
+
+import argparse
+import functools
+import inspect
+import itertools
+import json
+import random
+import time
+import types
+
+from otree.api import Currency as c, WaitPage
+from otree.database import CurrencyType
+from sqlalchemy.sql import sqltypes as st
+
+from . import eventlog, ledger, pages
+from .models import Constants, Group, Player, Subsession, group_size
+
+
+# Returned by a strategy to let a page time out instead of submitting it
+TIMEOUT = object()
+
+# Player-round columns reported in simulate_session()['rows']
+ROW_FIELDS = (
+    'contribution',
+    'payoff',
+    'punishment_points_given_actual',
+    'punishment_points_received_actual',
+    'punishment_given',
+    'punishment_received',
+    'power_transfer_out_total',
+    'power_transfer_in_total',
+    'power_transfer_cost',
+    'punishment_power_after',
+    'available_endowment',
+)
+
+# Columns oTree manages itself rather than through the model's field defaults
+_STRUCTURAL_COLUMNS = frozenset(
+    [
+        'id',
+        'id_in_group',
+        'id_in_subsession',
+        'round_number',
+        '_role',
+        '_payoff',
+        'subsession_id',
+        'group_id',
+        'participant_id',
+        'session_id',
+    ]
+)
+
+_session_counter = itertools.count(1)
+
+
+# =============================================================================
+# In-memory stand-ins for the oTree models
+# =============================================================================
+class _MemoryModel:
+    """Holds field values in memory and borrows methods from the real model class."""
+
+    _model = None
+    _currency_fields = frozenset()
+    _float_fields = frozenset()
+
+    @classmethod
+    def _describe(cls, model):
+        cls._model = model
+        columns = [col for col in model.__table__.columns if col.name not in _STRUCTURAL_COLUMNS]
+        cls._currency_fields = frozenset(
+            col.name for col in columns if isinstance(col.type, CurrencyType)
+        )
+        cls._float_fields = frozenset(col.name for col in columns if isinstance(col.type, st.Float))
+        cls._initial_values = {
+            col.name: (col.default.arg if col.default is not None else None) for col in columns
+        }
+
+    def _init_fields(self):
+        for name, value in self._initial_values.items():
+            setattr(self, name, value)
+
+    def __setattr__(self, name, value):
+        # Mirror the type coercion a database round-trip applies.
+        if value is not None:
+            if name in self._currency_fields:
+                if not isinstance(value, c):
+                    value = c(value)
+            elif name in self._float_fields:
+                value = float(value)
+        object.__setattr__(self, name, value)
+
+    def __getattr__(self, name):
+        method = getattr(self._model, name, None) if not name.startswith('__') else None
+        if inspect.isfunction(method):
+            return types.MethodType(method, self)
+        raise AttributeError(f'{type(self).__name__} has no attribute {name!r}')
+
+    def field_maybe_none(self, name):
+        return getattr(self, name)
+
+
+class SimSession:
+    def __init__(self, config, num_participants, render=False):
+        self.code = f'sim{next(_session_counter)}'
+        self.config = config
+        self.vars = {}
+        self.num_participants = num_participants
+        # pages._group_rounds reads every round from memory through this accessor.
+        self.in_memory_rounds = _MemoryRounds()
+        # Without rendering, the wait pages skip the snapshots only result pages read.
+        self.render_pages = render
+
+
+class SimParticipant:
+    def __init__(self, session, id_in_session):
+        self.session = session
+        self.id = id_in_session
+        self.id_in_session = id_in_session
+        self.code = f'{session.code}p{id_in_session}'
+        self.label = None
+        self.vars = {}
+        self.payoff = c(0)
+        self.is_browser_bot = False
+        self._is_bot = False
+        self._players = {}
+
+    def payoff_plus_participation_fee(self):
+        return self.payoff.to_real_world_currency(self.session) + self.session.config.get(
+            'participation_fee', 0
+        )
+
+
+class SimSubsession(_MemoryModel):
+    def __init__(self, session, round_number):
+        self.session = session
+        self.round_number = round_number
+        self._players = []
+        self._groups = []
+        self._init_fields()
+
+    def get_players(self):
+        return list(self._players)
+
+    def get_groups(self):
+        return list(self._groups)
+
+    def set_group_matrix(self, matrix):
+        groups = []
+        for id_in_subsession, members in enumerate(matrix, start=1):
+            group = SimGroup(self, id_in_subsession)
+            for id_in_group, player in enumerate(members, start=1):
+                player.group = group
+                player.id_in_group = id_in_group
+                group._players.append(player)
+            groups.append(group)
+        self._groups = groups
+
+
+class SimGroup(_MemoryModel):
+    _ids = itertools.count(1)
+
+    def __init__(self, subsession, id_in_subsession):
+        self.id = next(SimGroup._ids)
+        self.id_in_subsession = id_in_subsession
+        self.subsession = subsession
+        self.session = subsession.session
+        self.round_number = subsession.round_number
+        self._players = []
+        self._init_fields()
+
+    def get_players(self):
+        return sorted(self._players, key=lambda p: p.id_in_group)
+
+    def get_player_by_id(self, id_in_group):
+        for player in self._players:
+            if player.id_in_group == id_in_group:
+                return player
+        raise ValueError(f'No player with id_in_group {id_in_group}')
+
+
+class SimPlayer(_MemoryModel):
+    def __init__(self, subsession, participant):
+        self.subsession = subsession
+        self.session = subsession.session
+        self.participant = participant
+        self.participant_id = participant.id
+        self.round_number = subsession.round_number
+        self.group = None
+        self.id_in_group = None
+        self._payoff = c(0)
+        self._init_fields()
+        participant._players[self.round_number] = self
+
+    @property
+    def group_id(self):
+        return self.group.id
+
+    @property
+    def payoff(self):
+        return self._payoff
+
+    @payoff.setter
+    def payoff(self, value):
+        if value is None:
+            value = 0
+        delta = c(value) - self._payoff
+        object.__setattr__(self, '_payoff', self._payoff + delta)
+        self.participant.payoff += delta
+
+    def in_round(self, round_number):
+        return self.participant._players[round_number]
+
+    def in_rounds(self, first, last):
+        return [self.participant._players[r] for r in range(first, last + 1)]
+
+    def in_previous_rounds(self):
+        return self.in_rounds(1, self.round_number - 1)
+
+    def in_all_rounds(self):
+        return self.in_rounds(1, self.round_number)
+
+
+SimSubsession._describe(Subsession)
+SimGroup._describe(Group)
+SimPlayer._describe(Player)
+
+
+class _MemoryRounds:
+    """Same interface as prefetch.GroupRounds, served from the in-memory rows."""
+
+    queries_saved = 0
+
+    def in_round(self, player, round_number):
+        return player.in_round(round_number)
+
+    def in_previous_rounds(self, player):
+        return player.in_previous_rounds()
+
+    def get_players(self, group):
+        return group.get_players()
+
+
+# =============================================================================
+# Strategies
+# =============================================================================
+def _edges_json(targets):
+    return json.dumps({str(target): amount for target, amount in targets.items() if amount})
+
+
+class Strategy:
+    """
+    Decides what each participant submits.
+
+    decide() is called for every page a participant sees and dispatches to a
+    method named after the page (Contribution -> contribution). It returns
+    the submitted form values, or TIMEOUT to let the page time out. Pages
+    without a handler are submitted with no values.
+    """
+
+    def decide(self, page, player):
+        handler = getattr(self, _handler_name(page), None)
+        if handler is None:
+            return {}
+        return handler(player)
+
+    def contribution(self, player):
+        return dict(contribution=0)
+
+    def power_transfer(self, player):
+        return dict(power_transfer_edges=_edges_json({}))
+
+    def punishment(self, player):
+        return dict(punishment_edges=_edges_json({}))
+
+
+class FixedStrategy(Strategy):
+    """The same contribution, per-target punishment and per-target transfer every round."""
+
+    def __init__(self, contribution=0, punishment=0, power_transfer=0.0):
+        self.contribution_amount = contribution
+        self.punishment_points = punishment
+        self.power_transfer_amount = power_transfer
+
+    def contribution(self, player):
+        return dict(contribution=self.contribution_amount)
+
+    def power_transfer(self, player):
+        return dict(
+            power_transfer_edges=_edges_json(
+                {other.id_in_group: self.power_transfer_amount for other in player.get_others_in_group()}
+            )
+        )
+
+    def punishment(self, player):
+        return dict(
+            punishment_edges=_edges_json(
+                {other.id_in_group: self.punishment_points for other in player.get_others_in_group()}
+            )
+        )
+
+
+class RandomStrategy(Strategy):
+    """Valid random decisions; decision pages time out with probability timeout_rate."""
+
+    def __init__(self, seed=None, timeout_rate=0.0, punish_rate=0.3):
+        self.rng = random.Random(seed)
+        self.timeout_rate = timeout_rate
+        self.punish_rate = punish_rate
+
+    def decide(self, page, player):
+        if page.__name__ in _DECISION_PAGES and self.rng.random() < self.timeout_rate:
+            return TIMEOUT
+        return super().decide(page, player)
+
+    def contribution(self, player):
+        available = player.available_endowment
+        if available is None:
+            available = player.session.config.get('endowment', Constants.endowment)
+        return dict(contribution=self.rng.randint(0, int(float(available))))
+
+    def power_transfer(self, player):
+        step = ledger.power_step(player.session)
+        budget_units = ledger.power_units(min(1.0, float(player.punishment_power_before or 0)), step)
+        targets = {}
+        for other in player.get_others_in_group():
+            units = self.rng.randint(0, budget_units)
+            budget_units -= units
+            targets[other.id_in_group] = ledger.from_power_units(units, step)
+        return dict(power_transfer_edges=_edges_json(targets))
+
+    def punishment(self, player):
+        limit = int(player.session.config.get(
+            'per_target_dp_limit', player.session.config.get('deduction_points', 0)
+        ))
+        targets = {
+            other.id_in_group: self.rng.randint(1, limit) if limit and self.rng.random() < self.punish_rate else 0
+            for other in player.get_others_in_group()
+        }
+        return dict(punishment_edges=_edges_json(targets))
+
+
+STRATEGIES = dict(fixed=FixedStrategy, random=RandomStrategy)
+
+_DECISION_PAGES = frozenset(['Contribution', 'PowerTransfer', 'Punishment'])
+
+
+@functools.lru_cache(maxsize=None)
+def _handler_name(page):
+    name = page.__name__
+    return ''.join('_' + ch.lower() if ch.isupper() else ch for ch in name).lstrip('_')
+
+
+# =============================================================================
+# Page driving
+# =============================================================================
+@functools.lru_cache(maxsize=None)
+def _hook(page, name, timed=True):
+    """
+    The page's own static hook, ignoring oTree's base-class defaults.
+    timed=False skips the game.timing wrapper around it.
+    """
+    for klass in page.__mro__:
+        if klass.__module__ == pages.__name__ and name in vars(klass):
+            hook = getattr(page, name)
+            return hook if timed else inspect.unwrap(hook)
+    return None
+
+
+def _is_displayed(page, player, timed=True):
+    is_displayed = _hook(page, 'is_displayed', timed)
+    return is_displayed(player) if is_displayed else True
+
+
+def _form_fields(page, player, timed=True):
+    get_form_fields = _hook(page, 'get_form_fields', timed)
+    if get_form_fields:
+        return list(get_form_fields(player))
+    return list(getattr(page, 'form_fields', None) or [])
+
+
+def _field_error(player, field, value):
+    for suffix, out_of_range in (('min', lambda limit: value < limit), ('max', lambda limit: value > limit)):
+        bound = getattr(Player, f'{field}_{suffix}', None)
+        if inspect.isfunction(bound) and value is not None:
+            limit = bound(player)
+            if limit is not None and out_of_range(limit):
+                return f'{field} is out of range'
+    return None
+
+
+def _submit(run, page, player, strategy, render):
+    # Page methods are timed (game.timing) only in runs that render pages, as on the server.
+    if not _is_displayed(page, player, render):
+        return
+    if render:
+        vars_for_template = _hook(page, 'vars_for_template')
+        if vars_for_template:
+            vars_for_template(player)
+
+    decision = strategy.decide(page, player)
+    timeout_happened = decision is TIMEOUT
+    fields = _form_fields(page, player, render)
+    if fields and not timeout_happened:
+        values = {}
+        for field in fields:
+            value = decision.get(field)
+            if value is not None and field in SimPlayer._currency_fields:
+                value = c(value)
+            values[field] = value
+        error_message = _hook(page, 'error_message', render)
+        error = next(
+            (e for e in (_field_error(player, f, v) for f, v in values.items()) if e),
+            None,
+        ) or (error_message(player, values) if error_message else None)
+        if error:
+            # An invalid decision is left unsubmitted until the page times out.
+            run['errors'].append(
+                dict(
+                    round_number=player.round_number,
+                    page=page.__name__,
+                    id_in_session=player.participant.id_in_session,
+                    error=error,
+                )
+            )
+            timeout_happened = True
+        else:
+            for field, value in values.items():
+                setattr(player, field, value)
+    if timeout_happened:
+        run['timeouts'] += 1
+
+    before_next_page = _hook(page, 'before_next_page', render)
+    if before_next_page:
+        before_next_page(player, timeout_happened)
+
+    app_after_this_page = _hook(page, 'app_after_this_page', render)
+    if app_after_this_page:
+        upcoming_apps = run['upcoming_apps']
+        if app_after_this_page(player, upcoming_apps) or player.round_number == Constants.num_rounds:
+            run['finished'].add(player.participant.id_in_session)
+
+
+def _arrive(run, page, subsession, render):
+    if getattr(page, 'group_by_arrival_time', False):
+        # Arrival-time groups are formed up front in _form_groups.
+        return
+    after_all_players_arrive = _hook(page, 'after_all_players_arrive', render)
+    if not after_all_players_arrive:
+        return
+    for group in subsession.get_groups():
+        # As in oTree, the wait page only completes if someone still in the app stops on it.
+        if any(
+            player.participant.id_in_session not in run['finished'] and _is_displayed(page, player, render)
+            for player in group.get_players()
+        ):
+            after_all_players_arrive(group)
+
+
+def _form_groups(session, subsessions, participants, rng):
+    """Group by arrival order in round 1 and keep those groups, as oTree does."""
+    if not session.config.get('group_by_arrival_time', True):
+        return
+    size = group_size(session)
+    arrivals = list(participants)
+    rng.shuffle(arrivals)
+    for subsession in subsessions:
+        by_participant = {p.participant.id_in_session: p for p in subsession.get_players()}
+        ordered = [by_participant[participant.id_in_session] for participant in arrivals]
+        subsession.set_group_matrix(
+            [ordered[i:i + size] for i in range(0, len(ordered), size)]
+        )
+
+
+def load_session_config(name, **overrides):
+    """SESSION_CONFIG_DEFAULTS merged with the named entry of settings.SESSION_CONFIGS."""
+    import settings
+
+    for entry in settings.SESSION_CONFIGS:
+        if entry['name'] == name:
+            config = dict(settings.SESSION_CONFIG_DEFAULTS)
+            config.update(entry)
+            config.update(overrides)
+            return config
+    raise ValueError(f'Unknown session config: {name}')
+
+
+def simulate_session(
+    config,
+    strategy=None,
+    num_participants=None,
+    seed=None,
+    render=False,
+    group_matrices=None,
+    rounds=None,
+    keep_models=False,
+    agents=(),
+):
+    """
+    Run one full game-app session in memory and return its outcome.
+
+    config is a session config dict (see load_session_config). strategy is a
+    Strategy shared by everyone or a list with one per participant. seed makes
+    grouping and random strategies reproducible. It also seeds the module-level
+    random used by creating_session. render=True also calls vars_for_template
+    on every displayed page, and keeps the snapshots and page timing that a
+    server request would have. group_matrices ({round_number: [[id_in_session, ...], ...]})
+    replaces the grouping of those rounds, and rounds stops the session after
+    that many rounds (both are used by eventlog.replay). keep_models=True adds
+    the played in-memory subsessions as result['subsessions'] (used by game.bench).
+    agents lists the id_in_session of participants seated as server-side
+    agents by ExperimentGroupWait (see game/grouping.py).
+    """
+    rng = random.Random(seed)
+    if seed is not None:
+        random.seed(seed)
+    num_participants = (
+        num_participants
+        or config.get('num_demo_participants')
+        or Constants.default_players_per_group
+    )
+    if isinstance(strategy, (list, tuple)):
+        strategies = list(strategy)
+    else:
+        strategies = [strategy or Strategy()] * num_participants
+
+    session = SimSession(config, num_participants, render)
+    participants = [SimParticipant(session, i) for i in range(1, num_participants + 1)]
+    for id_in_session in agents:
+        participants[id_in_session - 1].vars['group_wait_agent'] = True
+    subsessions = []
+    for round_number in range(1, Constants.num_rounds + 1):
+        subsession = SimSubsession(session, round_number)
+        subsession._players = [SimPlayer(subsession, participant) for participant in participants]
+        # oTree puts everyone in one group until creating_session regroups them.
+        subsession.set_group_matrix([subsession.get_players()])
+        subsessions.append(subsession)
+    for subsession in subsessions:
+        subsession.creating_session()
+    if group_matrices:
+        for subsession in subsessions:
+            matrix = group_matrices.get(subsession.round_number)
+            if matrix:
+                by_participant = {p.participant.id_in_session: p for p in subsession.get_players()}
+                subsession.set_group_matrix(
+                    [[by_participant[id_in_session] for id_in_session in row] for row in matrix]
+                )
+    else:
+        _form_groups(session, subsessions, participants, rng)
+
+    app_sequence = list(config.get('app_sequence', ['game']))
+    run = dict(
+        timeouts=0,
+        errors=[],
+        finished=set(),
+        upcoming_apps=app_sequence[app_sequence.index('game') + 1:] if 'game' in app_sequence else [],
+    )
+    played = []
+    try:
+        for subsession in subsessions[:rounds]:
+            played.append(subsession)
+            for page in pages.page_sequence:
+                if issubclass(page, WaitPage):
+                    _arrive(run, page, subsession, render)
+                    continue
+                for player in subsession.get_players():
+                    if player.participant.id_in_session in run['finished']:
+                        continue
+                    _submit(run, page, player, strategies[player.participant.id_in_session - 1], render)
+            # Server-autoplayed dropouts skip every remaining page, so they leave with the rest.
+            if all(
+                player.participant.id_in_session in run['finished'] or pages._server_autoplay(player)
+                for player in subsession.get_players()
+            ):
+                break
+    finally:
+        _forget_session(session)
+
+    rows = []
+    for subsession in played:
+        for player in subsession.get_players():
+            row = dict(
+                round_number=player.round_number,
+                id_in_session=player.participant.id_in_session,
+                group=player.group.id_in_subsession,
+                id_in_group=player.id_in_group,
+            )
+            for field in ROW_FIELDS:
+                value = getattr(player, field)
+                row[field] = float(value) if value is not None else None
+            rows.append(row)
+
+    result = dict(
+        session_code=session.code,
+        rounds_played=len(played),
+        early_stop_round=session.vars.get('early_stop_round'),
+        timeouts=run['timeouts'],
+        errors=run['errors'],
+        participants=[
+            dict(
+                id_in_session=participant.id_in_session,
+                payoff=float(participant.payoff),
+                cumulative_payoff=float(participant.vars.get('cumulative_payoff', c(0))),
+                punishment_power=participant.vars.get('punishment_power'),
+                dropout=bool(participant.vars.get('dropout_confirmed')),
+            )
+            for participant in participants
+        ],
+        rows=rows,
+    )
+    if keep_models:
+        result['subsessions'] = played
+    return result
+
+
+def _forget_session(session):
+    """Drop the per-process page caches that were keyed by this session."""
+    eventlog.forget(session.code)
+    for cache in (pages._HISTORY_SNAPSHOT_CACHE, pages._RESULT_SNAPSHOT_CACHE):
+        for key in [key for key in cache if key[0] == session.code]:
+            del cache[key]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('config_name')
+    parser.add_argument('--sessions', type=int, default=100)
+    parser.add_argument('--participants', type=int, default=None)
+    parser.add_argument('--strategy', choices=sorted(STRATEGIES), default='random')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--render', action='store_true')
+    args = parser.parse_args(argv)
+
+    config = load_session_config(args.config_name)
+    started = time.perf_counter()
+    payoffs = []
+    timeouts = 0
+    for index in range(args.sessions):
+        seed = args.seed + index
+        if args.strategy == 'random':
+            strategy = RandomStrategy(seed=seed)
+        else:
+            strategy = FixedStrategy()
+        result = simulate_session(
+            config,
+            strategy=strategy,
+            num_participants=args.participants,
+            seed=seed,
+            render=args.render,
+        )
+        payoffs.extend(p['payoff'] for p in result['participants'])
+        timeouts += result['timeouts']
+    elapsed = time.perf_counter() - started
+
+    print(f'sessions: {args.sessions}  elapsed: {elapsed:.2f}s  '
+          f'({args.sessions / elapsed * 60:.0f} sessions/min)')
+    if payoffs:
+        print(f'mean participant payoff: {sum(payoffs) / len(payoffs):.2f}  timeouts: {timeouts}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,323 @@
+# game/sweep.py
+
+"""
+Parameter sweep over the SESSION_CONFIGS in settings.py.
+
+Each base config (pggp_fixed, pggp_transfer_free and pggp_transfer_cost by
+default) is crossed with a parameter grid. Every grid point is run as
+simulated sessions through game.simulator, which uses the game's real
+payoff and transfer logic. Work is split into batches of sessions, and the
+batches run in a process pool. Each worker reduces its own sessions to
+per-round samples, so very little data crosses process boundaries and
+throughput grows with the number of cores.
+
+As soon as all batches of a grid point finish, its per-round aggregates are
+written to the output, one row per (config, grid point, round) and one
+column per metric. With pyarrow installed the output is a Parquet file,
+written through game.columnar with one row group per grid point. Without
+pyarrow, for stdout, for a .csv path or with --format csv it is a CSV.
+
+Run from the oTree project directory:
+
+    python -m game.sweep --grid contribution_multiplier=1.5,2.0 \\
+        --grid punishment_cost=0.5,1 --sessions 200 --output sweep.parquet
+"""
+
+import argparse
+import csv
+import itertools
+import json
+import os
+import statistics
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from . import columnar, simulator
+
+
+# Parameters the request asked to sweep; any other session config key also works.
+SWEEP_PARAMETERS = (
+    'contribution_multiplier',
+    'punishment_cost',
+    'power_transfer_cost_rate',
+    'punishment_transfer_unit',
+    'per_target_dp_limit',
+)
+
+BASE_CONFIGS = ('pggp_fixed', 'pggp_transfer_free', 'pggp_transfer_cost')
+
+METRIC_COLUMNS = (
+    'sessions',
+    'mean_contribution',
+    'mean_punishment_points',
+    'power_concentration',
+    'payoff_mean',
+    'payoff_sd',
+    'payoff_min',
+    'payoff_p25',
+    'payoff_median',
+    'payoff_p75',
+    'payoff_max',
+)
+
+
+def have_pyarrow():
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def output_columns(grid):
+    """(name, kind) of every output column, with the kinds game.columnar uses."""
+    params = []
+    for key, values in grid.items():
+        if all(isinstance(value, int) and not isinstance(value, bool) for value in values):
+            kind = 'int'
+        elif all(isinstance(value, (int, float)) and not isinstance(value, bool) for value in values):
+            kind = 'float'
+        else:
+            kind = 'str'
+        params.append((key, kind))
+    metrics = [(name, 'int' if name == 'sessions' else 'float') for name in METRIC_COLUMNS]
+    return [('config_name', 'str'), *params, ('round_number', 'int'), *metrics]
+
+
+class CsvOutput:
+    def __init__(self, output, columns):
+        self._output = output
+        self._writer = csv.DictWriter(output, fieldnames=[name for name, _ in columns])
+        self._writer.writeheader()
+
+    def write(self, rows):
+        self._writer.writerows(rows)
+        self._output.flush()
+
+    def close(self):
+        pass
+
+
+class ParquetOutput:
+    def __init__(self, path, columns):
+        self._columns = columns
+        self._writer = columnar.parquet_writer(path, columns)
+
+    def write(self, rows):
+        table = {
+            name: [
+                None if row.get(name) is None else str(row[name]) if kind == 'str' else row[name]
+                for row in rows
+            ]
+            for name, kind in self._columns
+        }
+        self._writer.write_table(columnar.arrow_table(table, self._columns))
+
+    def close(self):
+        self._writer.close()
+
+
+def parse_grid(specs):
+    """['key=v1,v2', ...] -> {key: [v1, v2]}; values are parsed as JSON when possible."""
+    grid = {}
+    for spec in specs or []:
+        key, sep, raw_values = spec.partition('=')
+        if not sep or not key:
+            raise ValueError(f'Grid entries look like key=v1,v2 (got {spec!r})')
+        values = []
+        for raw in raw_values.split(','):
+            try:
+                values.append(json.loads(raw))
+            except ValueError:
+                values.append(raw)
+        grid[key] = values
+    return grid
+
+
+def expand_grid(grid):
+    """Cartesian product of the grid as a list of override dicts."""
+    keys = list(grid)
+    return [dict(zip(keys, combo)) for combo in itertools.product(*(grid[k] for k in keys))]
+
+
+def _power_concentration(powers):
+    """Herfindahl index of deduction power in one group: 1/n when equal, 1 when one holds all."""
+    total = sum(powers)
+    if total <= 0:
+        return None
+    return sum((power / total) ** 2 for power in powers)
+
+
+def run_batch(config, strategy_name, seeds):
+    """Simulate one batch of sessions and reduce it to per-round samples."""
+    by_round = {}
+    for seed in seeds:
+        if strategy_name == 'random':
+            strategy = simulator.RandomStrategy(seed=seed)
+        else:
+            strategy = simulator.STRATEGIES[strategy_name]()
+        result = simulator.simulate_session(config, strategy=strategy, seed=seed)
+
+        groups = {}
+        for row in result['rows']:
+            sample = by_round.setdefault(
+                row['round_number'],
+                dict(sessions=set(), contributions=[], punishment_points=[], payoffs=[], concentration=[]),
+            )
+            sample['sessions'].add(seed)
+            sample['contributions'].append(row['contribution'] or 0.0)
+            sample['punishment_points'].append(row['punishment_points_given_actual'] or 0.0)
+            sample['payoffs'].append(row['payoff'] or 0.0)
+            groups.setdefault((row['round_number'], row['group']), []).append(
+                row['punishment_power_after'] or 0.0
+            )
+        for (round_number, _group), powers in groups.items():
+            concentration = _power_concentration(powers)
+            if concentration is not None:
+                by_round[round_number]['concentration'].append(concentration)
+
+    for sample in by_round.values():
+        sample['sessions'] = len(sample['sessions'])
+    return by_round
+
+
+def _merge(into, batch):
+    for round_number, sample in batch.items():
+        target = into.setdefault(
+            round_number,
+            dict(sessions=0, contributions=[], punishment_points=[], payoffs=[], concentration=[]),
+        )
+        target['sessions'] += sample['sessions']
+        for key in ('contributions', 'punishment_points', 'payoffs', 'concentration'):
+            target[key].extend(sample[key])
+
+
+def _mean(values):
+    return statistics.fmean(values) if values else None
+
+
+def aggregate(by_round):
+    """Per-round metric rows from merged samples."""
+    rows = []
+    for round_number in sorted(by_round):
+        sample = by_round[round_number]
+        payoffs = sorted(sample['payoffs'])
+        if len(payoffs) >= 2:
+            p25, median, p75 = statistics.quantiles(payoffs, n=4)
+            payoff_sd = statistics.stdev(payoffs)
+        else:
+            p25 = median = p75 = payoffs[0] if payoffs else None
+            payoff_sd = 0.0 if payoffs else None
+        rows.append(
+            dict(
+                round_number=round_number,
+                sessions=sample['sessions'],
+                mean_contribution=_mean(sample['contributions']),
+                mean_punishment_points=_mean(sample['punishment_points']),
+                power_concentration=_mean(sample['concentration']),
+                payoff_mean=_mean(payoffs),
+                payoff_sd=payoff_sd,
+                payoff_min=payoffs[0] if payoffs else None,
+                payoff_p25=p25,
+                payoff_median=median,
+                payoff_p75=p75,
+                payoff_max=payoffs[-1] if payoffs else None,
+            )
+        )
+    return rows
+
+
+def plan(base_names, grid, sessions, batch_size, seed):
+    """
+    Yield (point_key, config, overrides, seeds) batches for every config x grid point.
+    Every point reuses the same seeds, so points differ only in their parameters.
+    """
+    points = expand_grid(grid) or [{}]
+    for base_name in base_names:
+        for overrides in points:
+            config = simulator.load_session_config(base_name, **overrides)
+            point_key = (base_name, json.dumps(overrides, sort_keys=True))
+            for start in range(0, sessions, batch_size):
+                stop = min(start + batch_size, sessions)
+                yield point_key, config, overrides, list(range(seed + start, seed + stop))
+
+
+def run_sweep(base_names, grid, sessions, output, workers=None, batch_size=25, seed=0, strategy='random'):
+    """Run the sweep and stream aggregated rows to output (a CsvOutput or ParquetOutput)."""
+    batches = list(plan(base_names, grid, sessions, batch_size, seed))
+    pending = {}
+    for point_key, _config, overrides, _seeds in batches:
+        pending.setdefault(point_key, dict(batches=0, overrides=overrides, samples={}))
+        pending[point_key]['batches'] += 1
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(run_batch, config, strategy, seeds): point_key
+            for point_key, config, _overrides, seeds in batches
+        }
+        for future in as_completed(futures):
+            point_key = futures[future]
+            point = pending[point_key]
+            _merge(point['samples'], future.result())
+            point['batches'] -= 1
+            if point['batches']:
+                continue
+            output.write(
+                [dict(row, config_name=point_key[0], **point['overrides']) for row in aggregate(point['samples'])]
+            )
+            del pending[point_key]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--configs', nargs='+', default=list(BASE_CONFIGS))
+    parser.add_argument(
+        '--grid',
+        action='append',
+        default=[],
+        help=f'key=v1,v2 (repeatable), e.g. one of {", ".join(SWEEP_PARAMETERS)}',
+    )
+    parser.add_argument('--sessions', type=int, default=100, help='sessions per grid point')
+    parser.add_argument('--batch-size', type=int, default=25)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--strategy', choices=sorted(simulator.STRATEGIES), default='random')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='-', help='output path, or - for CSV on stdout')
+    parser.add_argument(
+        '--format',
+        choices=('auto', 'parquet', 'csv'),
+        default='auto',
+        help='auto: Parquet when pyarrow is installed, else CSV',
+    )
+    args = parser.parse_args(argv)
+
+    output_format = args.format
+    if output_format == 'auto':
+        use_csv = args.output == '-' or args.output.endswith('.csv') or not have_pyarrow()
+        output_format = 'csv' if use_csv else 'parquet'
+        if use_csv and args.output != '-' and not args.output.endswith('.csv'):
+            args.output = os.path.splitext(args.output)[0] + '.csv'
+            print(f'pyarrow is not installed; writing CSV to {args.output}', file=sys.stderr)
+    if output_format == 'parquet' and not have_pyarrow():
+        parser.error('Parquet output needs pyarrow: pip install pyarrow')
+    if output_format == 'parquet' and args.output == '-':
+        parser.error('Parquet output needs an --output path')
+
+    grid = parse_grid(args.grid)
+    columns = output_columns(grid)
+    run_args = (args.workers, args.batch_size, args.seed, args.strategy)
+    if output_format == 'parquet':
+        output = ParquetOutput(args.output, columns)
+        try:
+            run_sweep(args.configs, grid, args.sessions, output, *run_args)
+        finally:
+            output.close()
+    elif args.output == '-':
+        run_sweep(args.configs, grid, args.sessions, CsvOutput(sys.stdout, columns), *run_args)
+    else:
+        with open(args.output, 'w', newline='', encoding='utf-8') as stream:
+            run_sweep(args.configs, grid, args.sessions, CsvOutput(stream, columns), *run_args)
+
+
+if __name__ == '__main__':
+    main()
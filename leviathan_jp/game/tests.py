@@ -1,17 +1,76 @@
+import contextlib
+import csv
+import inspect
+import io
+import json
 import logging
+import math
+import os
+import random
+import re
+import shutil
+import statistics
+import subprocess
 import sys
+import tempfile
+import time
+import urllib.request
+from decimal import Decimal
+from types import SimpleNamespace
 
-from otree.api import Bot, Submission, SubmissionMustFail
+from otree.api import Bot, Submission, SubmissionMustFail, Currency as c
 from otree.database import db
 
-from . import pages
-from .models import Constants
+from . import (
+    assets,
+    bench,
+    checkpoint,
+    compression,
+    columnar,
+    eventlog,
+    export,
+    grouping,
+    ledger,
+    metrics,
+    pages,
+    payoff,
+    prefetch,
+    quiz,
+    simulator,
+    sweep,
+    timing,
+    validation,
+    watchdog,
+)
+from . import creating_session
+from .models import Constants, Group, Player, decode_edges, encode_edges, group_size
 
 
 logging.getLogger("otree.bots").setLevel(logging.WARNING)
 
 
 LOG_STATE_KEY = "_staggered_bot_test_log"
+# Most SQL statements one decision-page render may issue once the group's
+# rounds are prefetched (see game/prefetch.py)
+PAGE_QUERY_BUDGET = 2
+PAYOFF_DIFF_SEED = 20260501
+VALIDATION_PARITY_SEED = 20260523
+VALIDATION_PARITY_CASES = 400
+PREVIEW_PARITY_SEED = 20260524
+PREVIEW_PARITY_CASES = 300
+PAYOFF_DIFF_GROUPS = 200
+PAYOFF_RESULT_FIELDS = (
+    "punishment_points_given_actual",
+    "punishment_points_received_actual",
+    "punishment_given",
+    "punishment_received",
+    "available_endowment",
+    "payoff",
+)
+# (participant, round) of the pages bots let time out. Neither changes payoffs: a timed-out
+# transfer repeats the previous round's, and ContributionResult stores nothing.
+TRANSFER_TIMEOUT = (2, 6)
+RESULT_TIMEOUT = (3, 7)
 STAGE1_BORDER = "+-------+--------------+-------+-------------+"
 STAGE2_BORDER = "+-------+---------------------+--------------------+"
 PAGE_ORDER = [
@@ -157,7 +216,7 @@ def _record_arrival(player):
     log_state = _session_log_state(player.session)
     arrivals = log_state["arrivals"]
     schedule = log_state["schedule"].get(participant.id_in_session, {})
-    group_number = (len(arrivals) // Constants.players_per_group) + 1
+    group_number = (len(arrivals) // group_size(player.session)) + 1
 
     arrivals.append(
         dict(
@@ -228,28 +287,46 @@ def _record_page_completion(player, page_key):
     _save_session_log_state(player.session, log_state)
 
 
+def _bot_times_out(player, at):
+    return (player.participant.id_in_session, player.round_number) == at
+
+
 def punishment_form(player, points):
-    data = {}
-    for i in range(1, Constants.players_per_group + 1):
-        if i == player.id_in_group:
-            continue
-        data[f"punish_p{i}"] = points
-    return data
+    targets = {
+        str(other.id_in_group): points for other in player.get_others_in_group() if points
+    }
+    return {"punishment_edges": json.dumps(targets)}
 
 
 def power_transfer_form(player, amount):
-    data = {}
-    for i in range(1, Constants.players_per_group + 1):
-        if i == player.id_in_group:
-            continue
-        data[f"power_transfer_p{i}"] = amount
-    return data
+    targets = {
+        str(other.id_in_group): amount for other in player.get_others_in_group() if amount
+    }
+    return {"power_transfer_edges": json.dumps(targets)}
+
+
+def assert_power_ledger(player):
+    """Transfers keep every power on the unit grid and conserve the group's total power exactly."""
+    step = ledger.power_step(player.session)
+    members = player.group.get_players()
+    units = []
+    for member in members:
+        member_units = ledger.exact_power_units(member.punishment_power_after, step)
+        assert member_units is not None, (
+            f"Power off the transfer grid: round={player.round_number} "
+            f"player={member.id_in_group} power={member.punishment_power_after} step={step}"
+        )
+        units.append(member_units)
+    expected = ledger.power_units(1.0, step) * len(members)
+    assert sum(units) == expected, (
+        f"Group power not conserved: round={player.round_number} units={units} expected_total={expected}"
+    )
 
 
 def assert_grouping(player, page_name="GroupingCheck"):
     group_players = player.group.get_players()
     _record_arrival(player)
-    expected_size = Constants.players_per_group
+    expected_size = group_size(player.session)
     actual_size = len(group_players)
     assert actual_size == expected_size, (
         f"Grouping failed: round={player.round_number} page={page_name} "
@@ -280,6 +357,42 @@ def assert_grouping(player, page_name="GroupingCheck"):
     )
 
 
+def _sim_round_one(config, num_participants):
+    session = simulator.SimSession(config, num_participants)
+    subsession = simulator.SimSubsession(session, 1)
+    subsession._players = [
+        simulator.SimPlayer(subsession, simulator.SimParticipant(session, i))
+        for i in range(1, num_participants + 1)
+    ]
+    subsession.set_group_matrix([subsession.get_players()])
+    return subsession
+
+
+def assert_creating_session_checks_headcount(player):
+    """oTree's creating_session hook rejects a headcount that is not a multiple of the group size, like the simulator."""
+    if player.round_number != 1 or player.participant.id_in_session != 1:
+        return
+    size = group_size(player.session)
+    config = dict(player.session.config, group_by_arrival_time=False)
+    for run in (
+        lambda: creating_session(_sim_round_one(config, size + 1)),
+        lambda: simulator.simulate_session(config, num_participants=size + 1),
+    ):
+        try:
+            run()
+        except ValueError:
+            continue
+        raise AssertionError(f"{size + 1} participants were accepted for groups of {size}")
+
+    subsession = _sim_round_one(config, 2 * size)
+    creating_session(subsession)
+    groups = [len(group.get_players()) for group in subsession.get_groups()]
+    assert groups == [size, size], f"creating_session did not regroup without arrival-time grouping: {groups}"
+    assert all(
+        p.participant.vars.get("punishment_power") == 1.0 for p in subsession.get_players()
+    ), "creating_session did not set the initial deduction power"
+
+
 def assert_punishment_balance(player):
     available_before = float(player.available_before_punishment or 0)
     punishment_given = float(player.punishment_given or 0)
@@ -348,6 +461,1196 @@ def assert_punishment_overdraw_allowed(player):
     )
 
 
+def assert_history_snapshot(player):
+    history_rounds = pages.build_history_rounds(player)
+    previous_rounds = player.in_previous_rounds()
+    assert len(history_rounds) == len(previous_rounds), (
+        f"History round count mismatch: round={player.round_number} "
+        f"bot={_participant_label(player.participant)} "
+        f"expected={len(previous_rounds)} actual={len(history_rounds)}"
+    )
+    for prev, record in zip(previous_rounds, history_rounds):
+        rebuilt = pages._build_history_round(
+            player.session, prev.round_number, prev.group.get_players()
+        )
+        rebuilt = json.loads(
+            json.dumps(rebuilt, default=pages._history_json_default, ensure_ascii=False)
+        )
+        expected = pages._history_round_for_viewer(rebuilt, player.id_in_group)
+        assert record == expected, (
+            f"History snapshot mismatch: round={player.round_number} "
+            f"history_round={prev.round_number} "
+            f"bot={_participant_label(player.participant)}"
+        )
+
+    for cache in (pages._HISTORY_SNAPSHOT_CACHE, pages._RESULT_SNAPSHOT_CACHE):
+        assert len(cache) <= pages.SNAPSHOT_CACHE_SIZE
+    if player.round_number == 3 and player.participant.id_in_session == 1:
+        assert_snapshot_cache_evicts()
+
+    round_numbers = [prev.round_number for prev in previous_rounds]
+    response = pages.BasePage.live_method(player, dict(history_rounds=round_numbers))
+    live_rounds = response[player.id_in_group]["history_rounds"]
+    expected_rounds = history_rounds[:pages.HISTORY_PAGE_MAX_ROUNDS]
+    assert live_rounds == expected_rounds, (
+        f"Lazy history page mismatch: round={player.round_number} "
+        f"bot={_participant_label(player.participant)} "
+        f"requested={round_numbers[:pages.HISTORY_PAGE_MAX_ROUNDS]}"
+    )
+
+
+def assert_snapshot_cache_evicts():
+    """The snapshot caches drop their least recently used entries past maxsize."""
+    cache = pages._LRUCache(3)
+    for key in "abc":
+        cache[key] = key
+    assert cache.get("a") == "a"
+    cache["d"] = "d"
+    assert list(cache) == ["c", "a", "d"], f"LRU order wrong: {list(cache)}"
+    assert cache.get("b") is None
+
+
+def assert_page_query_budget(player, page):
+    """Render a page's vars as a fresh request would and count the SQL it issues."""
+    prefetch._REQUEST_CACHE.clear()
+    with prefetch.count_queries() as counter:
+        page.vars_for_template(player)
+    assert counter.count <= PAGE_QUERY_BUDGET, (
+        f"Query budget exceeded: round={player.round_number} page={page.__name__} "
+        f"bot={_participant_label(player.participant)} "
+        f"queries={counter.count} budget={PAGE_QUERY_BUDGET}"
+    )
+
+
+def assert_simulator_matches_session(player, rules):
+    """The headless simulator reproduces this bot session's payoffs round by round."""
+    if player.round_number != Constants.num_rounds or player.participant.id_in_session != 1:
+        return
+    result = simulator.simulate_session(
+        dict(player.session.config),
+        strategy=simulator.FixedStrategy(**rules),
+        num_participants=player.session.num_participants,
+        seed=PAYOFF_DIFF_SEED,
+        keep_models=True,
+    )
+    unread = [
+        group.id_in_subsession
+        for subsession in result["subsessions"]
+        for group in subsession.get_groups()
+        if group.result_snapshot is not None or group.history_snapshot is not None
+    ]
+    assert not unread, f"Headless run without rendering froze page snapshots: groups={unread}"
+    members = {member.participant.id_in_session for member in player.group.get_players()}
+    for round_number in range(1, Constants.num_rounds + 1):
+        actual = sorted(
+            float(member.in_round(round_number).payoff) for member in player.group.get_players()
+        )
+        simulated = sorted(
+            row["payoff"]
+            for row in result["rows"]
+            if row["round_number"] == round_number and row["group"] == 1
+        )
+        assert actual == simulated, (
+            f"Simulator payoff mismatch: round={round_number} "
+            f"members={sorted(members)} actual={actual} simulated={simulated}"
+        )
+    assert not result["errors"], f"Simulator rejected bot decisions: {result['errors'][:3]}"
+
+
+def assert_wait_page_watchdog_idle(player):
+    """Once ContributionWaitPage has completed, the watchdog finds nobody to force past it."""
+    wait_page_index = player.participant._index_in_pages - 1
+    stalled = watchdog.stalled_members(
+        player.group.get_players(), wait_page_index, threshold=0, now=time.time() + 3600
+    )
+    assert not stalled, (
+        f"Watchdog would force members past a completed wait page: round={player.round_number} "
+        f"stalled={[pp.id_in_session for pp in stalled]}"
+    )
+
+
+def assert_wait_page_live_progress(player):
+    """The wait page's live ping reports everyone as submitted once the wait page has completed."""
+    reply = pages.ContributionWaitPage.live_method(player, {"check_stall": True})
+    progress = reply[player.id_in_group]
+    assert progress["waiting_progress"] == progress["waiting_total"] == group_size(player.session), (
+        f"Wait-page progress mismatch: round={player.round_number} "
+        f"bot={_participant_label(player.participant)} progress={progress}"
+    )
+
+
+def _fake_gbat_player(
+    session, id_in_session, since=None, visited=True, started_at=None, page_times=(), rules_completed=False, seat=False
+):
+    participant_vars = dict(intro_page_times=list(page_times), rules_completed=rules_completed)
+    if seat:
+        participant_vars["group_wait_agent_seat"] = True
+    if since is not None:
+        participant_vars["group_wait_since"] = since
+    if started_at is not None:
+        participant_vars["intro_started_at"] = started_at
+    participant = SimpleNamespace(
+        id_in_session=id_in_session,
+        visited=visited,
+        vars=participant_vars,
+        _gbat_grouped=False,
+        _index_in_pages=0,
+        _max_page_index=session._max_page_index,
+    )
+    return SimpleNamespace(participant=participant)
+
+
+def assert_group_formation(player):
+    """ExperimentGroupWait forms full groups at once and falls back after the maximum wait."""
+    if player.round_number != 1 or player.participant.id_in_session != 1:
+        return
+    participant = player.participant
+    assert len(participant.vars.get("intro_page_times") or []) == grouping._intro_pages(player.session), (
+        f"Introduction pages not timestamped: {participant.vars.get('intro_page_times')}"
+    )
+    if player.session.config.get("group_by_arrival_time", True):
+        # session.vars is rewritten by the bot test log, so the group log is checked on fakes below
+        assert participant.vars.get("group_members") == group_size(player.session)
+        assert "group_wait_since" in participant.vars and not participant.vars.get("group_wait_agent")
+
+    rounds = prefetch.group_rounds(Player, player.group_id)
+    assert rounds.expected_group_size == len(player.group.get_players()), "Prefetch expects another group size"
+
+    intro_pages = grouping._intro_pages(player.session)
+    slow = dict(visited=True, started_at=900, page_times=[960], rules_completed=False)
+    assert grouping.predict_arrival(slow, 1000, 30, intro_pages) == 960 + (intro_pages - 1) * 60
+    assert grouping.predict_arrival(dict(slow, rules_completed=True), 1000, 30, intro_pages) == 1000
+    unvisited = dict(visited=False, started_at=None, page_times=[], rules_completed=False)
+    assert grouping.predict_arrival(unvisited, 1000, 30, intro_pages) == 1000 + intro_pages * 30
+    assert grouping.typical_page_seconds([slow, unvisited]) == 60
+    assert grouping.typical_page_seconds([unvisited]) == grouping.DEFAULT_PAGE_SECONDS
+
+    def choose(waiting, pending=(), now=1000, **config):
+        session = SimpleNamespace(
+            code=player.session.code,
+            config=dict(player.session.config, event_log_dir=None, **config),
+            vars={},
+            _max_page_index=participant._max_page_index,
+        )
+        waiting = [_fake_gbat_player(session, *args, **kwargs) for args, kwargs in waiting]
+        pending = [_fake_gbat_player(session, *args, **kwargs) for args, kwargs in pending]
+        subsession = SimpleNamespace(session=session, get_players=lambda: waiting + pending)
+        group = grouping.choose_group(subsession, waiting, 5, now=now)
+        ids = None if group is None else [member.participant.id_in_session for member in group]
+        return ids, session, pending
+
+    waiting_six = [((i,), dict(since=906 - i)) for i in range(1, 7)]
+    ids, session, _ = choose(waiting_six)
+    assert ids == [6, 5, 4, 3, 2], f"Full group not formed in arrival order: {ids}"
+    assert session.vars["group_waits"][0]["reason"] == "full"
+
+    three = [((i,), dict(since=990)) for i in range(1, 4)]
+    assert choose(three, group_wait_max_seconds=None)[0] is None
+    on_the_way = [((i,), dict(rules_completed=True)) for i in (4, 5)]
+    assert choose(three, on_the_way, group_wait_max_seconds=120)[0] is None
+    ids, session, _ = choose(three, on_the_way, now=1110, group_wait_max_seconds=120)
+    assert ids == [1, 2, 3], f"Group not formed after the maximum wait: {ids}"
+
+    slow_pending = [((i,), dict(started_at=900, page_times=[960])) for i in (4, 5)]
+    ids, session, _ = choose(three, slow_pending, group_wait_max_seconds=120)
+    entry = session.vars["group_waits"][0]
+    assert ids == [1, 2, 3] and entry["reason"] == "smaller", f"Slow arrivals not given up on: {entry}"
+    assert entry["full_group_in_seconds"] == 960 + (intro_pages - 1) * 60 - 1000, entry
+    assert [member["wait_seconds"] for member in entry["members"]] == [10, 10, 10], entry
+
+    no_shows = [((i,), dict(visited=False)) for i in (4, 5)]
+    seats = [((i,), dict(seat=True)) for i in (6, 7)]
+    ids, session, pending = choose(three, no_shows + seats, group_wait_max_seconds=120, group_wait_fallback="bots")
+    entry = session.vars["group_waits"][0]
+    assert ids == [1, 2, 3, 6, 7] and entry["agents"] == [6, 7], f"Agents not seated on reserved seats: {entry}"
+    index_after_game = grouping._index_after_game(player.session, participant)
+    no_show_players, seat_players = pending[:2], pending[2:]
+    for agent in seat_players:
+        assert agent.participant.vars["group_wait_agent"]
+        assert agent.participant._index_in_pages == index_after_game
+        assert agent.participant.vars["group_members"] == 5
+        assert pages._server_autoplay(agent)
+    for late in no_show_players:
+        assert not late.participant.visited and late.participant._index_in_pages == 0, "A late arrival was replaced"
+        assert "group_wait_agent" not in late.participant.vars
+    assert grouping.admin_rows(session)[0]["agents"] == "6, 7"
+
+    ids, session, _ = choose(three, no_shows, group_wait_max_seconds=120, group_wait_fallback="bots")
+    assert ids == [1, 2, 3] and session.vars["group_waits"][0]["reason"] == "smaller", "Agents seated without seats"
+    # Seats are never expected to arrive, so the group stops waiting at once.
+    ids, session, _ = choose(three, seats, group_wait_max_seconds=120)
+    assert ids == [1, 2, 3] and session.vars["group_waits"][0]["full_group_in_seconds"] is None
+    mixed = [((4,), dict(visited=False)), ((5,), dict(started_at=900, page_times=[960])), ((6,), dict(seat=True))]
+    ids, session, _ = choose(three, mixed, group_wait_max_seconds=120, group_wait_fallback="bots")
+    assert ids == [1, 2, 3] and session.vars["group_waits"][0]["reason"] == "smaller"
+    assert choose([((1,), dict(since=900))], now=1200, group_wait_max_seconds=120)[0] is None
+
+    seat_session = SimpleNamespace(config=dict(group_wait_agent_seats=2))
+    fakes = [_fake_gbat_player(SimpleNamespace(_max_page_index=0), i, visited=False) for i in (3, 1, 4, 2)]
+    grouping.reserve_agent_seats(seat_session, fakes)
+    reserved = sorted(fake.participant.id_in_session for fake in fakes if fake.participant.visited)
+    assert reserved == [3, 4] and all(
+        bool(fake.participant.vars.get("group_wait_agent_seat")) == (fake.participant.id_in_session in reserved)
+        for fake in fakes
+    ), f"Wrong agent seats reserved: {reserved}"
+
+
+def assert_group_wait_agents_match_timeouts(player, rules):
+    """An agent seated at ExperimentGroupWait plays the timeout defaults and is not a dropout."""
+    if player.round_number != Constants.num_rounds or player.participant.id_in_session != 1:
+        return
+    num_participants = player.session.num_participants
+    strategies = [simulator.FixedStrategy(**rules)] * (num_participants - 1) + [_AbsentStrategy()]
+    config = dict(player.session.config, enable_timeout_autoplay=False)
+    timed_out = simulator.simulate_session(
+        config, strategy=strategies, num_participants=num_participants, seed=PAYOFF_DIFF_SEED
+    )
+    seated = simulator.simulate_session(
+        config, strategy=strategies, num_participants=num_participants, seed=PAYOFF_DIFF_SEED, agents=[num_participants]
+    )
+    assert seated["rows"] == timed_out["rows"], "An agent seat played differently from the timeout defaults"
+    assert seated["early_stop_round"] == timed_out["early_stop_round"]
+    assert not seated["participants"][-1]["dropout"], "An agent seat was counted as a dropout"
+    assert seated["timeouts"] < timed_out["timeouts"], "The group waited on an agent seat's pages"
+
+
+class _AbsentStrategy(simulator.Strategy):
+    """Never submits anything, so every page times out and the participant becomes a dropout."""
+
+    def decide(self, page, player):
+        return simulator.TIMEOUT
+
+
+def assert_dropout_autoplay_matches_timeouts(player, rules):
+    """Server-side autoplay of a dropout gives the same rows as letting each page time out."""
+    if player.round_number != Constants.num_rounds or player.participant.id_in_session != 1:
+        return
+    num_participants = player.session.num_participants
+    strategies = [simulator.FixedStrategy(**rules)] * (num_participants - 1) + [_AbsentStrategy()]
+    results = {
+        autoplay: simulator.simulate_session(
+            dict(player.session.config, dropout_server_autoplay=autoplay),
+            strategy=strategies,
+            num_participants=num_participants,
+            seed=PAYOFF_DIFF_SEED,
+        )
+        for autoplay in (False, True)
+    }
+    timed_out, autoplayed = results[False], results[True]
+    assert timed_out["participants"][-1]["dropout"], "Absent participant was not flagged as a dropout"
+    assert autoplayed["early_stop_round"] == timed_out["early_stop_round"], (
+        f"Dropout autoplay changed early stop: {autoplayed['early_stop_round']} "
+        f"!= {timed_out['early_stop_round']}"
+    )
+    assert autoplayed["rows"] == timed_out["rows"], "Dropout autoplay changed the session rows"
+    assert autoplayed["participants"] == timed_out["participants"], (
+        "Dropout autoplay changed participant payoffs"
+    )
+    assert autoplayed["timeouts"] < timed_out["timeouts"], "Autoplayed dropout still waited on pages"
+
+
+def assert_merged_result_page_matches(player, rules):
+    """merged_result_page shows one result page per round without changing outcomes or early stop."""
+    if player.round_number != Constants.num_rounds or player.participant.id_in_session != 1:
+        return
+    num_participants = player.session.num_participants
+    strategies = [simulator.FixedStrategy(**rules)] * (num_participants - 1) + [_AbsentStrategy()]
+    results = {
+        merged: simulator.simulate_session(
+            dict(player.session.config, merged_result_page=merged),
+            strategy=strategies,
+            num_participants=num_participants,
+            seed=PAYOFF_DIFF_SEED,
+            render=merged,
+        )
+        for merged in (False, True)
+    }
+    separate, merged = results[False], results[True]
+    assert merged["early_stop_round"] == separate["early_stop_round"], (
+        f"Merged result page changed early stop: {merged['early_stop_round']} "
+        f"!= {separate['early_stop_round']}"
+    )
+    assert merged["rows"] == separate["rows"], "Merged result page changed the session rows"
+    assert merged["participants"] == separate["participants"], (
+        "Merged result page changed participant payoffs"
+    )
+
+
+def assert_page_timing(player, rules):
+    """page_timing records every timed page method of a simulated round, and stays off otherwise."""
+    if player.round_number != Constants.num_rounds or player.participant.id_in_session != 1:
+        return
+    assert str(inspect.signature(pages.PunishmentWaitPage.after_all_players_arrive)) == "(group)", (
+        "Timing wrapper hides the after_all_players_arrive signature from oTree"
+    )
+    num_participants = player.session.num_participants
+    num_groups = num_participants // group_size(player.session)
+    strategies = [simulator.FixedStrategy(**rules)] * num_participants
+    timing.reset()
+    simulator.simulate_session(
+        dict(player.session.config, page_timing=False),
+        strategy=strategies,
+        num_participants=num_participants,
+        rounds=2,
+        render=True,
+    )
+    assert timing.snapshot() == [], "Timing recorded calls with page_timing off"
+    with tempfile.TemporaryDirectory() as dump_dir:
+        dump_path = os.path.join(dump_dir, "timing.json")
+        config = dict(
+            player.session.config, page_timing=True, page_timing_file=dump_path, page_timing_payload=True
+        )
+        simulator.simulate_session(
+            config, strategy=strategies, num_participants=num_participants, rounds=2, render=True
+        )
+        rows = {(row["page"], row["method"], row["round_number"]): row for row in timing.snapshot()}
+        timing.dump(dump_path)
+        with open(dump_path, encoding="utf-8") as dump_file:
+            dumped = json.load(dump_file)["rows"]
+    timing.reset()
+
+    contribution = rows[("Contribution", "vars_for_template", 2)]
+    assert contribution["count"] == num_participants, contribution
+    assert contribution["group_size"] == group_size(player.session)
+    assert contribution["mean_payload_bytes"] > 0
+    assert sum(contribution["buckets"].values()) == contribution["count"]
+    assert rows[("Contribution", "before_next_page", 2)]["count"] == num_participants
+    assert rows[("Punishment", "error_message", 2)]["count"] == num_participants
+    assert rows[("PunishmentWaitPage", "after_all_players_arrive", 2)]["count"] == num_groups
+    assert ("Punishment", "vars_for_template", 1) not in rows, "Punishment is not shown in round 1"
+    assert len(dumped) == len(rows)
+
+    simulator.simulate_session(
+        dict(player.session.config, page_timing=True, merged_result_page=True),
+        strategy=strategies,
+        num_participants=num_participants,
+        rounds=2,
+        render=True,
+    )
+    merged_rows = {(row["page"], row["method"], row["round_number"]): row for row in timing.snapshot()}
+    timing.reset()
+    assert merged_rows[("MergedResult", "vars_for_template", 2)]["count"] == num_participants
+    assert merged_rows[("MergedResult", "vars_for_template", 2)]["mean_payload_bytes"] == 0, (
+        "Payload size was measured without page_timing_payload"
+    )
+    nested = [key for key in merged_rows if key[0] in ("ContributionResult", "PunishmentResult", "RoundResult")]
+    assert not nested, f"Result pages timed again inside MergedResult: {nested}"
+
+
+def assert_benchmark_case(player, rules):
+    """A benchmark case plays every requested round, times the hot paths and flags slowdowns."""
+    if player.round_number != Constants.num_rounds or player.participant.id_in_session != 1:
+        return
+    rounds = Constants.num_rounds + 1
+    case = bench.run_case(player.session.config["name"], 6, rounds, repeat=1)
+    assert Constants.num_rounds == rounds - 1, "Benchmark left num_rounds raised"
+    assert case["rounds_played"] == rounds, case["rounds_played"]
+    assert set(case["functions"]) == {
+        "build_history_rounds", "Group.adjust_punishments", "Group.set_payoff", "Player.set_payoff"
+    }
+    assert case["functions"]["build_history_rounds"]["calls"] == 6
+    assert case["page_methods"]["Contribution.vars_for_template"]["calls"] == 6 * rounds
+    if player.session.config.get("power_transfer_allowed"):
+        assert "PowerTransferWait.after_all_players_arrive" in case["page_methods"]
+    assert timing.snapshot() == [], "Benchmark left rows in the timing histogram"
+
+    baseline = dict(cases=[case])
+    slower = json.loads(json.dumps(case))
+    slower["functions"]["Group.set_payoff"]["mean_ms"] = case["functions"]["Group.set_payoff"]["mean_ms"] * 2 + 1
+    regressions = bench.compare(baseline, dict(cases=[slower]))
+    assert [regression["name"] for regression in regressions] == ["Group.set_payoff"], regressions
+    assert bench.compare(baseline, baseline) == []
+
+
+class _ListOutput:
+    def __init__(self):
+        self.rows = []
+
+    def write(self, rows):
+        self.rows.extend(rows)
+
+
+def assert_parameter_sweep(player):
+    """A tiny sweep aggregates the simulated sessions of each grid point, in the output's column layout."""
+    if player.round_number != Constants.num_rounds or player.participant.id_in_session != 1:
+        return
+    base_name = player.session.config["name"]
+    grid = sweep.parse_grid(["contribution_multiplier=1.5,2.0", "note=a"])
+    assert grid == {"contribution_multiplier": [1.5, 2.0], "note": ["a"]}, grid
+    assert sweep.expand_grid(grid) == [
+        {"contribution_multiplier": 1.5, "note": "a"},
+        {"contribution_multiplier": 2.0, "note": "a"},
+    ]
+    columns = sweep.output_columns(grid)
+    assert [kind for name, kind in columns if name in grid] == ["float", "str"], columns
+
+    # run_batch reduces its sessions to the same per-round means as the simulator rows.
+    seeds = [0, 1]
+    config = simulator.load_session_config(base_name, contribution_multiplier=2.0)
+    batch = sweep.run_batch(config, "random", seeds)
+    simulated = [
+        row
+        for seed in seeds
+        for row in simulator.simulate_session(config, strategy=simulator.RandomStrategy(seed=seed), seed=seed)["rows"]
+    ]
+    aggregated = {row["round_number"]: row for row in sweep.aggregate(batch)}
+    assert sorted(aggregated) == sorted({row["round_number"] for row in simulated}), sorted(aggregated)
+    for round_number, row in aggregated.items():
+        round_rows = [r for r in simulated if r["round_number"] == round_number]
+        payoffs = sorted(r["payoff"] or 0.0 for r in round_rows)
+        assert row["sessions"] == len(seeds), row
+        assert row["mean_contribution"] == statistics.fmean(r["contribution"] or 0.0 for r in round_rows), row
+        assert (row["payoff_min"], row["payoff_max"]) == (payoffs[0], payoffs[-1]), row
+
+    # The process pool writes one block of rows per grid point once its batches finish.
+    output = _ListOutput()
+    sweep.run_sweep([base_name], grid, 2, output, workers=2, batch_size=1, seed=0)
+    names = [name for name, _ in columns]
+    assert all(set(row) == set(names) for row in output.rows), output.rows[:1]
+    for multiplier in grid["contribution_multiplier"]:
+        point_rows = [row for row in output.rows if row["contribution_multiplier"] == multiplier]
+        assert point_rows and all(row["sessions"] == 2 and row["config_name"] == base_name for row in point_rows)
+    seed_point = [row for row in output.rows if row["contribution_multiplier"] == 2.0]
+    assert all(
+        math.isclose(row["mean_contribution"], aggregated[row["round_number"]]["mean_contribution"])
+        for row in seed_point
+    ), "The process pool changed the aggregates of a grid point"
+
+    with tempfile.TemporaryDirectory() as root:
+        if sweep.have_pyarrow():
+            import pyarrow.parquet
+
+            parquet_path = os.path.join(root, "sweep.parquet")
+            parquet_output = sweep.ParquetOutput(parquet_path, columns)
+            parquet_output.write(output.rows)
+            parquet_output.close()
+            assert pyarrow.parquet.read_table(parquet_path).column_names == names
+
+        # Without pyarrow, the default format falls back to CSV next to the requested path.
+        requested = os.path.join(root, "out.parquet")
+        have_pyarrow = sweep.have_pyarrow
+        sweep.have_pyarrow = lambda: False
+        stderr = io.StringIO()
+        try:
+            with contextlib.redirect_stderr(stderr):
+                sweep.main([
+                    "--configs", base_name, "--grid", "note=a", "--sessions", "1",
+                    "--workers", "1", "--strategy", "fixed", "--output", requested,
+                ])
+        finally:
+            sweep.have_pyarrow = have_pyarrow
+        csv_path = os.path.join(root, "out.csv")
+        assert not os.path.exists(requested) and os.path.exists(csv_path), os.listdir(root)
+        assert csv_path in stderr.getvalue(), stderr.getvalue()
+        with open(csv_path, newline="", encoding="utf-8") as csv_file:
+            csv_rows = list(csv.DictReader(csv_file))
+        assert list(csv_rows[0]) == [name for name, _ in sweep.output_columns({"note": ["a"]})], list(csv_rows[0])
+        assert {row["note"] for row in csv_rows} == {"a"} and all(row["sessions"] == "1" for row in csv_rows)
+
+
+def assert_static_bundles(player, html):
+    """The Punishment page loads the hashed bundles, which are current and served as immutable."""
+    if player.round_number != 2 or player.participant.id_in_session != 1:
+        return
+    assert assets.build(check=True) == [], "Bundles are out of date: run python -m game.assets"
+    for name, kind in (("page", "css"), ("page", "js"), ("punishment", "css"), ("punishment", "js")):
+        with open(os.path.join(assets.INCLUDE_DIR, f"{name}.{kind}.html"), encoding="utf-8") as include:
+            filename = re.search(r"bundle/([^']+)'", include.read()).group(1)
+        assert f"/static/bundle/{filename}" in html, f"Punishment page does not load {filename}"
+    assert "<style>" not in html and "initFloatingTimer" not in html, "Page CSS/JS is still inlined"
+    assert 'id="punishment-config"' in html and "data-per-target-limit=" in html
+
+    from otree.common2 import static_files_app
+
+    assert assets.install_cache_headers(), "Bundle cache headers are not installed"
+    assert assets._signature_mismatches(static_files_app) == []
+    changed = SimpleNamespace(file_response=lambda path, scope: None, is_not_modified=static_files_app.is_not_modified)
+    assert [m.split("(")[0] for m in assets._signature_mismatches(changed)] == ["file_response"], (
+        "A changed file_response signature was not detected"
+    )
+    bundle_path = os.path.join(assets.BUNDLE_DIR, filename)
+    scope = dict(type="http", method="GET", headers=[])
+    response = static_files_app.file_response(bundle_path, os.stat(bundle_path), scope)
+    assert response.headers["cache-control"] == assets.IMMUTABLE_CACHE_CONTROL
+    other_path = os.path.join(assets.PROJECT_DIR, "_static", "global", "empty.css")
+    response = static_files_app.file_response(other_path, os.stat(other_path), scope)
+    assert "cache-control" not in response.headers
+
+
+def assert_page_compression(player):
+    """Heavy pages go out compressed and are counted in the size report; bundles are precompressed."""
+    if player.round_number != 2 or player.participant.id_in_session != 1:
+        return
+    rows = {row["page"]: row for row in compression.snapshot(2)}
+    punishment = rows["Punishment"]
+    assert punishment["responses"] >= player.session.num_participants, punishment
+    assert punishment["sent_bytes"] < punishment["html_bytes"] / 2, punishment
+    if "ContributionResult" in rows:
+        assert rows["ContributionResult"]["sent_bytes"] == rows["ContributionResult"]["html_bytes"]
+    [total] = compression.round_totals(list(rows.values()))
+    assert total["page"] is None and total["html_bytes"] == sum(row["html_bytes"] for row in rows.values())
+
+    assert compression.accepted_encodings("gzip;q=0, BR, deflate") == {"br", "deflate"}
+    assert compression.choose_encoding("identity") is None
+    from starlette.responses import HTMLResponse
+
+    body = "<p>罰</p>" * 500
+    fake = SimpleNamespace(
+        session=SimpleNamespace(config=dict(compress_pages=False)),
+        participant=SimpleNamespace(is_browser_bot=False),
+        round_number=99,
+    )
+    request = SimpleNamespace(headers={"accept-encoding": "gzip"})
+    response = compression.compress_response(HTMLResponse(body), request, "Punishment", fake)
+    assert "content-encoding" not in response.headers
+    fake.session.config["compress_pages"] = True
+    response = compression.compress_response(HTMLResponse(body), request, "Punishment", fake)
+    assert response.headers["content-encoding"] == "gzip"
+    assert int(response.headers["content-length"]) == len(response.body)
+    assert compression.decompress(response.body, "gzip").decode("utf-8") == body
+    assert [row["responses"] for row in compression.snapshot(99)] == [2]
+
+    for row in assets.bundle_sizes():
+        assert row["gzip_bytes"] and row["gzip_bytes"] < row["bytes"], row
+    from otree.common2 import static_files_app
+
+    bundle_path = os.path.join(assets.BUNDLE_DIR, assets.bundle_sizes()[0]["bundle"])
+    scope = dict(type="http", method="GET", headers=[(b"accept-encoding", b"gzip, deflate")])
+    response = static_files_app.file_response(bundle_path, os.stat(bundle_path), scope)
+    assert response.headers["content-encoding"] == "gzip"
+    assert int(response.headers["content-length"]) == os.path.getsize(bundle_path + ".gz")
+    scope["headers"] = [(b"accept-encoding", b"*")]
+    response = static_files_app.file_response(bundle_path, os.stat(bundle_path), scope)
+    expected = "br" if os.path.isfile(bundle_path + ".br") else "gzip"
+    assert response.headers["content-encoding"] == expected, "Accept-Encoding: * got no precompressed bundle"
+    scope["headers"] = [(b"accept-encoding", b"identity")]
+    response = static_files_app.file_response(bundle_path, os.stat(bundle_path), scope)
+    assert "content-encoding" not in response.headers
+
+
+_NODE_VALIDATE = """
+const engine = require(process.argv[1]);
+let text = '';
+process.stdin.on('data', (chunk) => { text += chunk; });
+process.stdin.on('end', () => {
+    const cases = Function('return ' + text)();
+    console.log(JSON.stringify(cases.map(([spec, values]) => engine.validate(spec, values))));
+});
+"""
+
+
+def _random_edge_payload(rng, targets):
+    roll = rng.random()
+    if roll < 0.05:
+        return rng.choice([None, "", "not json", "[]", '{"x": 1}', '{"2": null}', '{"2": "abc"}'])
+    amounts = [
+        0, 0.05, 0.1, 0.15, 0.2, 0.25, 0.3, 0.30000000000000004, 0.7, 1, 1.04, 1.05, 1.1, 1.5, 2,
+        3, 10, 11, -0.1, -1, "0.2", " 1_0 ", "nan", "-inf", True,
+    ]
+    edges = {}
+    for _ in range(rng.randint(0, len(targets))):
+        target = rng.choice(targets + [0] if rng.random() < 0.05 else targets)
+        edges[str(target)] = rng.choice(amounts)
+    return json.dumps(edges)
+
+
+def assert_validation_parity(player, html):
+    """The browser validation engine returns the server's message for the same form values."""
+    if player.round_number != 3 or player.participant.id_in_session != 1:
+        return
+    assert "/static/bundle/validation." in html, "Punishment page does not load the validation bundle"
+    assert '"validation"' in html, "Punishment page has no js_vars.validation"
+
+    punishment_rules = pages._punishment_rules(player)
+    assert validation.validate(punishment_rules, punishment_form(player, 0)) is None
+    other = pages._other_member_ids(player)[0]
+    assert validation.validate(punishment_rules, dict(punishment_edges=json.dumps({other: 1.5}))) == "減点は整数で入力してください。"
+    assert validation.validate(punishment_rules, dict(punishment_edges=json.dumps({player.id_in_group: 1}))) == (
+        "入力内容を読み取れませんでした。もう一度入力してください。"
+    )
+    assert validation.validate(pages._contribution_rules(player), dict(contribution=None)) == "投資額を入力してください。"
+    quiz_rules = quiz.rules(quiz.INVESTMENT_ANSWERS, "quiz")
+    client_rules = validation.client_spec(quiz_rules)
+    assert "expected" not in json.dumps(client_rules), f"Quiz answers sent to the browser: {client_rules}"
+    assert validation.validate(client_rules, dict(quiz.INVESTMENT_ANSWERS, intro1_q2=None)) == quiz.REQUIRED_MESSAGE
+    assert validation.validate(client_rules, {field: 1 for field in quiz.INVESTMENT_ANSWERS}) is None
+    assert validation.validate(quiz_rules, {field: 1 for field in quiz.INVESTMENT_ANSWERS}) == "quiz"
+    assert validation.validate(quiz_rules, quiz.INVESTMENT_ANSWERS) is None
+
+    node = shutil.which("node")
+    if node is None:
+        return
+    rng = random.Random(VALIDATION_PARITY_SEED)
+    targets = pages._other_member_ids(player)
+    specs = [
+        pages._contribution_rules(player),
+        pages._power_transfer_rules(player),
+        punishment_rules,
+        client_rules,
+    ]
+    for step in ("0.1", "0.25", "0.05", "1"):
+        for grid in (False, True):
+            specs.append(
+                validation.spec(
+                    validation.edge_rule(
+                        "edges",
+                        targets,
+                        dict(malformed="m", negative="n", integer="i", max_each="e", grid="g", max_total="t"),
+                        step=Decimal(step),
+                        grid=grid,
+                        max_total_units=rng.randint(0, 12),
+                    )
+                )
+            )
+    cases = []
+    for _ in range(VALIDATION_PARITY_CASES):
+        form_spec = rng.choice(specs)
+        [rule] = form_spec["rules"]
+        if rule["kind"] == "number":
+            values = {rule["field"]: rng.choice([None, -1, 0, 5, 5.5, 20, 20.5, 21, float("inf"), float("nan")])}
+        elif rule["kind"] == "required":
+            values = {field: rng.choice([None, 1, 2, 3]) for field in rule["fields"]}
+        else:
+            values = {rule["field"]: _random_edge_payload(rng, targets)}
+        cases.append((form_spec, values))
+    script_path = os.path.join(assets.SOURCE_DIR, "validation.js")
+    completed = subprocess.run(
+        [node, "-e", _NODE_VALIDATE, script_path],
+        input=json.dumps(cases),
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    browser_messages = json.loads(completed.stdout)
+    for (form_spec, values), browser_message in zip(cases, browser_messages):
+        server_message = validation.validate(form_spec, values)
+        assert browser_message == server_message, (values, form_spec["rules"][0]["kind"], server_message, browser_message)
+
+
+_NODE_PREVIEW = """
+const engine = require(process.argv[1]);
+let text = '';
+process.stdin.on('data', (chunk) => { text += chunk; });
+process.stdin.on('end', () => {
+    const cases = JSON.parse(text);
+    console.log(JSON.stringify(cases.map(([preview, points]) => engine.project(preview, points))));
+});
+"""
+
+
+def _reference_preview(preview, points_by_target):
+    """The payoff engine's cost, loss and MU when only the viewer punishes, as stored in Currency fields."""
+    ids = preview["ids"]
+    index_of = {id_in_group: index for index, id_in_group in enumerate(ids)}
+    giver = index_of[preview["self_id"]]
+    edges = [
+        (giver, index_of[target], points)
+        for target, points in sorted(points_by_target.items())
+        if target != preview["self_id"]
+    ]
+    total_points = sum(points for _, _, points in edges)
+    attempted_cost = [0.0] * len(ids)
+    attempted_cost[giver] = float(c(total_points * preview["cost_per_point"]))
+    state = dict(
+        ids=ids,
+        edges=edges,
+        power=preview["power"],
+        attempted_cost=attempted_cost,
+        available_before=preview["available"],
+    )
+    outcome = payoff.compute_punishment_outcome(state, preview["cost_per_point"], preview["effectiveness"])
+    return dict(
+        points=total_points,
+        cost=float(c(outcome["cost"][giver])),
+        loss={str(id_in_group): float(c(outcome["loss"][index])) for id_in_group, index in index_of.items()},
+        available={str(id_in_group): float(c(outcome["available_after"][index])) for id_in_group, index in index_of.items()},
+    )
+
+
+def assert_punishment_preview(player, html):
+    """The Punishment page's live preview computes what the payoff engine will store."""
+    if player.round_number != 2 or player.participant.id_in_session != 1:
+        return
+    assert "/static/bundle/punishment_preview." in html and '"punishment_preview"' in html
+    preview = pages._punishment_preview(player)
+    assert preview["ids"] == sorted(p.id_in_group for p in player.group.get_players())
+    assert preview["available"][preview["ids"].index(player.id_in_group)] == float(player.available_endowment or 0)
+
+    node = shutil.which("node")
+    if node is None:
+        return
+    rng = random.Random(PREVIEW_PARITY_SEED)
+    cases = []
+    for case_index in range(PREVIEW_PARITY_CASES):
+        if case_index % 3 == 0:
+            case_preview = preview
+        else:
+            size = rng.randint(2, 8)
+            case_preview = dict(
+                ids=list(range(1, size + 1)),
+                power=[rng.choice([0.0, 0.1, 0.15, 0.3, 0.7, 1.0, 1.1, 1.35, 2.05]) for _ in range(size)],
+                available=[rng.choice([0.0, 3.15, 8.25, 10.05, 12.35, 20.0]) for _ in range(size)],
+                self_id=rng.randint(1, size),
+                effectiveness=rng.choice([1.0, 1.5, 0.35, 3.0]),
+                cost_per_point=rng.choice([1.0, 0.5, 1.5, 0.3, 0.1]),
+                decimals=1,
+            )
+        points = {
+            target: rng.randint(0, 10)
+            for target in case_preview["ids"]
+            if target != case_preview["self_id"] and rng.random() < 0.7
+        }
+        cases.append((case_preview, points))
+    script_path = os.path.join(assets.SOURCE_DIR, "punishment_preview.js")
+    completed = subprocess.run(
+        [node, "-e", _NODE_PREVIEW, script_path],
+        input=json.dumps([(case_preview, {str(k): v for k, v in points.items()}) for case_preview, points in cases]),
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    for (case_preview, points), projected in zip(cases, json.loads(completed.stdout)):
+        expected = _reference_preview(case_preview, points)
+        assert projected == expected, (case_preview, points, expected, projected)
+
+
+def assert_live_metrics(player, rules):
+    """The metrics endpoint reports each group's phase, dropouts and streaks without touching the DB."""
+    if player.round_number != Constants.num_rounds or player.participant.id_in_session != 1:
+        return
+    num_participants = player.session.num_participants
+    strategies = [simulator.FixedStrategy(**rules)] * (num_participants - 1) + [_AbsentStrategy()]
+    result = simulator.simulate_session(
+        dict(player.session.config, metrics_port=0),
+        strategy=strategies,
+        num_participants=num_participants,
+        seed=PAYOFF_DIFF_SEED,
+        rounds=3,
+    )
+    code = result["session_code"]
+    base_url = f"http://127.0.0.1:{metrics.server_port(0)}"
+    try:
+        with prefetch.count_queries() as counter:
+            with urllib.request.urlopen(f"{base_url}/metrics.json", timeout=5) as response:
+                data = json.load(response)
+            with urllib.request.urlopen(f"{base_url}/metrics", timeout=5) as response:
+                text = response.read().decode("utf-8")
+        assert counter.count == 0, f"Metrics polling ran {counter.count} queries"
+    finally:
+        metrics.forget(code)
+
+    session = next(entry for entry in data["sessions"] if entry["session"] == code)
+    assert len(session["groups"]) == num_participants // group_size(player.session)
+    first_phase = "power_transfer" if player.session.config.get("power_transfer_allowed") else "contribution"
+    for group in session["groups"]:
+        assert (group["round"], group["phase"]) == (4, first_phase), group
+        assert group["phase_seconds"] >= 0
+    absent = str(num_participants)
+    absent_group = next(group for group in session["groups"] if absent in group["timeout_streaks"])
+    assert absent_group["timeout_streaks"][absent] >= player.session.config.get("dropout_timeout_pages", 3)
+    assert absent_group["dropouts"] == 1, absent_group
+    assert session["early_stop_armed"] is False
+    assert f'leviathan_group_round{{session="{code}",group="1"}} 4' in text
+    assert "# TYPE leviathan_group_phase_seconds gauge" in text
+
+
+def assert_event_log_replay(player, rules):
+    """Replaying an event log rebuilds every row, payoff and the early stop, for the simulator's log and this bot session's."""
+    if player.round_number != Constants.num_rounds or player.participant.id_in_session != 1:
+        return
+    num_participants = player.session.num_participants
+    strategies = [simulator.RandomStrategy(seed=i, timeout_rate=0.2) for i in range(num_participants - 2)]
+    strategies += [_AbsentStrategy()] * 2
+    with tempfile.TemporaryDirectory() as log_dir:
+        config = dict(player.session.config, event_log_dir=log_dir)
+        expected = simulator.simulate_session(
+            config, strategy=strategies, num_participants=num_participants, seed=PAYOFF_DIFF_SEED
+        )
+        path = eventlog.log_path(SimpleNamespace(config=config, code=expected["session_code"]))
+        replayed = eventlog.replay(path)
+
+        with open(path, encoding="utf-8") as log_file:
+            lines = log_file.readlines()
+        with open(path, "w", encoding="utf-8") as log_file:
+            log_file.writelines(lines[: len(lines) // 2])
+        truncated = eventlog.replay(path)
+
+    assert replayed["early_stop_round"] == expected["early_stop_round"], (
+        f"Replay changed early stop: {replayed['early_stop_round']} != {expected['early_stop_round']}"
+    )
+    assert replayed["rows"] == expected["rows"], "Replay did not rebuild the session rows"
+    assert replayed["participants"] == expected["participants"], "Replay did not rebuild participant payoffs"
+    settled = truncated["rounds_played"]
+    assert 0 < settled < expected["rounds_played"], f"Unexpected rounds replayed from a cut log: {settled}"
+    assert truncated["rows"] == [row for row in expected["rows"] if row["round_number"] <= settled], (
+        "Replay of a cut log did not match the settled rounds"
+    )
+    _assert_bot_log_replays(player)
+
+
+def _assert_bot_log_replays(player):
+    """The event log this bot session wrote (see introduction/tests.py) replays to the database's rows."""
+    session = player.session
+    path = eventlog.log_path(session)
+    if path is None:
+        return
+    log_dir = os.path.dirname(path)
+    eventlog.forget(session.code)
+    try:
+        events = eventlog.read_events(path)
+        replayed = eventlog.replay(path)
+    finally:
+        # Pages submitted after this check are not replayed; stop logging and drop the log.
+        session.config = dict(session.config, event_log_dir=None)
+        shutil.rmtree(log_dir, ignore_errors=True)
+
+    timeouts = {
+        (event["participant"], event["round"], event["page"])
+        for event in events
+        if event["event"] == "page" and event["timeout"]
+    }
+    assert (*RESULT_TIMEOUT, "ContributionResult") in timeouts, f"Bot timeouts missing from the log: {timeouts}"
+    if session.config.get("power_transfer_allowed"):
+        assert (*TRANSFER_TIMEOUT, "PowerTransfer") in timeouts, f"Bot timeouts missing from the log: {timeouts}"
+    assert replayed["rounds_played"] == Constants.num_rounds, replayed["rounds_played"]
+    assert replayed["early_stop_round"] == session.vars.get("early_stop_round")
+
+    by_key = {(row["round_number"], row["id_in_session"]): row for row in replayed["rows"]}
+    for round_number in range(1, replayed["rounds_played"] + 1):
+        for member in player.in_round(round_number).subsession.get_players():
+            row = by_key[(round_number, member.participant.id_in_session)]
+            stored = {
+                field: None if member.field_maybe_none(field) is None else float(member.field_maybe_none(field))
+                for field in simulator.ROW_FIELDS
+            }
+            replayed_fields = {field: row[field] for field in simulator.ROW_FIELDS}
+            assert stored == replayed_fields, (
+                f"Replay of the bot log differs from the database: round={round_number} "
+                f"participant={member.participant.id_in_session} db={stored} replay={replayed_fields}"
+            )
+    participants = {p.id_in_session: p for p in session.get_participants()}
+    for participant in replayed["participants"]:
+        stored = participants[participant["id_in_session"]]
+        assert participant["punishment_power"] == stored.vars.get("punishment_power"), participant
+        assert participant["cumulative_payoff"] == float(stored.vars.get("cumulative_payoff")), participant
+
+
+def assert_checkpoint_resume(player):
+    """A barrier checkpoint matches the database, resume restores state corrupted after it, and skips a barrier that never committed."""
+    if player.round_number != 5 or player.participant.id_in_session != 1:
+        return
+    session = player.session
+    config = dict(session.config)
+    participant = player.participant
+    power = participant.vars.get("punishment_power")
+    available_before = player.available_before_punishment
+    members = player.group.get_players()
+    cumulative = [member.participant.vars.get("cumulative_payoff") for member in members]
+    with tempfile.TemporaryDirectory() as root:
+        session.config = dict(config, checkpoint_dir=root)
+        try:
+            pages._record_barrier(player.group, "PunishmentWaitPage")
+            report = checkpoint.resume_session(session)
+            assert report and not any(entry["problems"] for entry in report), (
+                f"Fresh checkpoint differs from the database: {report}"
+            )
+
+            participant.vars["punishment_power"] = (power or 0) + 1
+            player.available_before_punishment = available_before + 1
+            report = checkpoint.resume_session(session, apply=True)
+            restored = [entry for entry in report if entry["restored"]]
+            assert len(restored) == 1 and len(restored[0]["problems"]) == 2, (
+                f"Resume did not find the corrupted state: {report}"
+            )
+            report = checkpoint.resume_session(session)
+            assert not any(entry["problems"] for entry in report), (
+                f"Resume left the group inconsistent: {report}"
+            )
+
+            # Crash after the checkpoint file is written but before the barrier commits:
+            # the database still has the previous barrier and the payoff not yet added.
+            pages._record_barrier(player.group, "PunishmentWaitPage")
+            for member in members:
+                member.participant.vars[checkpoint.APPLIED_VAR] = [player.round_number, "ContributionWaitPage"]
+                member.participant.vars["cumulative_payoff"] -= member.payoff
+            before_resume = [member.participant.vars["cumulative_payoff"] for member in members]
+            report = checkpoint.resume_session(session, apply=True)
+            assert [entry["committed"] for entry in report] == [False] and not report[0]["restored"], (
+                f"Resume applied a checkpoint whose barrier never committed: {report}"
+            )
+            assert [member.participant.vars["cumulative_payoff"] for member in members] == before_resume, (
+                "Resume added the uncommitted round's payoff before the wait page runs again"
+            )
+        finally:
+            session.config = config
+            for member, value in zip(members, cumulative):
+                member.participant.vars["cumulative_payoff"] = value
+                member.participant.vars.pop(checkpoint.APPLIED_VAR, None)
+    assert participant.vars.get("punishment_power") == power
+    assert player.available_before_punishment == available_before
+
+
+RESULT_SNAPSHOT_PAGES = dict(
+    contribution=(pages.ContributionResult, "players_data"),
+    power_transfer=(pages.PowerTransferResult, "columns"),
+    punishment=(pages.PunishmentResult, "matrix_rows"),
+    round=(pages.RoundResult, "earnings_players"),
+)
+
+
+def assert_edge_export(player):
+    """The edge-list export adds up to each member's stored totals, and the chunked reader agrees."""
+    if player.round_number != Constants.num_rounds or player.participant.id_in_session != 1:
+        return
+    session = player.session
+    players = Player.objects_filter(session_id=session.id).order_by(Player.id).all()
+    rows = list(export.custom_export(players))
+    assert rows[0] == export.HEADER
+    rows = rows[1:]
+    assert rows == list(export.iter_rows(session.code, chunk_size=7)), (
+        "Chunked edge export differs from custom_export"
+    )
+
+    columns = {name: index for index, name in enumerate(export.HEADER)}
+    totals = {}
+    for row in rows:
+        for code, prefix in ((row[columns["giver_participant_code"]], "out"),
+                             (row[columns["receiver_participant_code"]], "in")):
+            entry = totals.setdefault((row[columns["round_number"]], code, prefix), [0, 0.0, 0.0])
+            entry[0] += 1
+            entry[1] += row[columns["punishment_loss"]] if prefix == "in" else row[columns["punishment_cost"]]
+            entry[2] += row[columns["power_transfer"]]
+    assert rows, "Edge export is empty"
+    for member in players:
+        out_total = totals.get((member.round_number, member.participant.code, "out"))
+        in_total = totals.get((member.round_number, member.participant.code, "in"))
+        if out_total is None:
+            continue
+        size = len(member.group.get_players())
+        assert out_total[0] == in_total[0] == size - 1, f"Missing edges for {member.participant.code}"
+        assert abs(out_total[2] - (member.power_transfer_out_total or 0)) < 1e-9
+        assert abs(in_total[2] - (member.power_transfer_in_total or 0)) < 1e-9
+        received = member.field_maybe_none("punishment_received")
+        if received is not None:
+            assert abs(in_total[1] - float(received)) < 0.051, (
+                f"Edge losses {in_total[1]} != punishment_received {received}"
+            )
+            assert abs(out_total[1] - float(member.punishment_given)) < 0.051
+
+
+def assert_columnar_tables(player):
+    """The columnar tables cover every row of the session, and round-trip through Parquet when pyarrow is installed."""
+    if player.round_number != Constants.num_rounds or player.participant.id_in_session != 1:
+        return
+    session = player.session
+    tables, kinds = columnar.session_tables(session)
+    for table_name, columns in kinds.items():
+        lengths = {len(tables[table_name][name]) for name, _ in columns}
+        assert len(lengths) == 1, f"Ragged columns in {table_name}: {lengths}"
+
+    num_participants = session.num_participants
+    players = tables["players"]
+    assert len(players["participant_code"]) == num_participants * Constants.num_rounds
+    assert len(tables["groups"]["group_id"]) == (num_participants // group_size(session)) * Constants.num_rounds
+    assert len(tables["survey"]["participant_code"]) == num_participants
+    edge_rows = list(export.iter_rows(session.code))
+    index = export.HEADER.index("punishment_points")
+    assert len(tables["punishment_edges"]["punishment_points"]) == sum(1 for row in edge_rows if row[index])
+    assert all(tables["punishment_edges"]["punishment_points"])
+    assert all(tables["transfer_edges"]["power_transfer"])
+
+    payoff = {
+        (code, round_number): value
+        for code, round_number, value in zip(players["participant_code"], players["round_number"], players["payoff"])
+    }
+    for member in player.group.get_players():
+        stored = member.in_round(1).payoff
+        assert abs(payoff[(member.participant.code, 1)] - float(stored)) < 1e-9
+
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return
+    with tempfile.TemporaryDirectory() as output_dir:
+        written = columnar.write_session(output_dir, session)
+        loaded = columnar.load_table(output_dir, "players")
+        assert loaded.num_rows == written["players"] == len(players["participant_code"])
+        assert set(loaded.column("session_code").to_pylist()) == {session.code}
+        assert set(loaded.column("treatment_name").to_pylist()) == {columnar.treatment_name(session)}
+
+
+def assert_result_snapshot(player, *phases):
+    """The frozen group model matches a fresh build and highlights only the viewer."""
+    snapshot = json.loads(player.group.result_snapshot)
+    for phase in phases:
+        rebuilt = json.loads(
+            json.dumps(
+                pages._RESULT_SNAPSHOT_BUILDERS[phase](player.group),
+                default=pages._history_json_default,
+                ensure_ascii=False,
+            )
+        )
+        assert snapshot.get(phase) == rebuilt, (
+            f"Result snapshot mismatch: round={player.round_number} phase={phase} "
+            f"bot={_participant_label(player.participant)}"
+        )
+        page, rows_key = RESULT_SNAPSHOT_PAGES[phase]
+        rows = page.vars_for_template(player)[rows_key]
+        self_rows = [row for row in rows if row["is_self"]]
+        assert len(self_rows) == 1, (
+            f"Result self-highlight mismatch: round={player.round_number} phase={phase} "
+            f"bot={_participant_label(player.participant)} self_rows={len(self_rows)}"
+        )
+
+
+class _DetachedMember(SimpleNamespace):
+    # The reference implementation keys dicts by player objects.
+    __eq__ = object.__eq__
+    __hash__ = object.__hash__
+
+
+def _payoff_fixture(config, member_inputs, individual_share):
+    """Detached stand-ins for one group so both payoff paths run on equal inputs."""
+    session = SimpleNamespace(config=config)
+    group = SimpleNamespace(session=session, individual_share=individual_share)
+    members = []
+    for member_input in member_inputs:
+        members.append(
+            _DetachedMember(
+                session=session,
+                group=group,
+                participant=SimpleNamespace(vars=dict(member_input["vars"])),
+                punishment_points_given_actual=0,
+                punishment_points_received_actual=0,
+                punishment_given=None,
+                punishment_received=None,
+                payoff=None,
+                **member_input["fields"],
+            )
+        )
+    for member in members:
+        member.punishment_targets = (
+            lambda me: lambda: decode_edges(me.punishment_edges, int)
+        )(member)
+        member.get_others_in_group = (
+            lambda me: lambda: [other for other in members if other is not me]
+        )(member)
+    group.get_players = lambda: list(members)
+    return group, members
+
+
+def _payoff_results(members):
+    results = []
+    for member in members:
+        row = {field: getattr(member, field) for field in PAYOFF_RESULT_FIELDS}
+        row["cumulative_payoff"] = member.participant.vars.get("cumulative_payoff")
+        results.append(row)
+    return results
+
+
+def _reference_payoffs(config, member_inputs, individual_share):
+    group, members = _payoff_fixture(config, member_inputs, individual_share)
+    Group.adjust_punishments(group)
+    for member in members:
+        Player.set_payoff(member)
+    return _payoff_results(members)
+
+
+def _engine_payoffs(config, member_inputs, individual_share):
+    group, members = _payoff_fixture(config, member_inputs, individual_share)
+    Group.set_payoff(group)
+    return _payoff_results(members)
+
+
+def _random_payoff_case(rng):
+    size = rng.choice([2, 3, 5, 8, 12])
+    config = dict(
+        endowment=20,
+        punishment_cost=rng.choice([1, 1.0, 0.5, 2.0]),
+        power_effectiveness=rng.choice([1, 1.0, 1.5, 0.3]),
+    )
+    member_inputs = []
+    contributions = []
+    for id_in_group in range(1, size + 1):
+        punish = {
+            i: rng.choice([0, 0, 0, rng.randint(1, 10)])
+            for i in range(1, size + 1)
+            if i != id_in_group
+        }
+        power = round(rng.randint(0, 20) * 0.1, 3)
+        transfer_cost = c(rng.choice([0, 0, rng.randint(1, 10) * 0.1]))
+        available = c(config["endowment"]) - transfer_cost
+        contribution = c(rng.randint(0, int(available)))
+        remaining = available - contribution
+        attempted_points = sum(punish.values())
+        contributions.append(contribution)
+        member_inputs.append(
+            dict(
+                fields=dict(
+                    id_in_group=id_in_group,
+                    contribution=contribution,
+                    punishment_power_after=power,
+                    power_transfer_cost=transfer_cost,
+                    attempted_punishment_cost=c(attempted_points * config["punishment_cost"]),
+                    available_before_punishment=remaining,
+                    available_endowment=remaining,
+                    punishment_edges=encode_edges(punish),
+                ),
+                vars=dict(punishment_power=power, cumulative_payoff=c(rng.randint(0, 300))),
+            )
+        )
+    individual_share = c(float(sum(contributions)) * 1.5 / size)
+    return config, member_inputs, individual_share
+
+
+def assert_payoff_engine_matches_reference(player):
+    """Differential check of Group.set_payoff against adjust_punishments + Player.set_payoff."""
+    members = player.group.get_players()
+    member_inputs = []
+    for member in members:
+        fields = dict(
+            id_in_group=member.id_in_group,
+            contribution=member.contribution,
+            punishment_power_after=member.punishment_power_after,
+            power_transfer_cost=member.power_transfer_cost,
+            attempted_punishment_cost=member.attempted_punishment_cost,
+            available_before_punishment=member.available_before_punishment,
+            available_endowment=member.available_before_punishment,
+            punishment_edges=member.punishment_edges,
+        )
+        cumulative_before = member.participant.vars.get("cumulative_payoff", c(0)) - member.payoff
+        member_inputs.append(
+            dict(
+                fields=fields,
+                vars=dict(
+                    punishment_power=member.participant.vars.get("punishment_power", 1.0),
+                    cumulative_payoff=cumulative_before,
+                ),
+            )
+        )
+    expected = _reference_payoffs(
+        dict(player.session.config), member_inputs, player.group.individual_share
+    )
+    actual = _payoff_results(members)
+    assert actual == expected, (
+        f"Payoff engine mismatch: round={player.round_number} "
+        f"bot={_participant_label(player.participant)} "
+        f"expected={expected} actual={actual}"
+    )
+
+    if player.round_number != 2 or player.participant.id_in_session != 1:
+        return
+    rng = random.Random(PAYOFF_DIFF_SEED)
+    for case_number in range(PAYOFF_DIFF_GROUPS):
+        config, case_inputs, individual_share = _random_payoff_case(rng)
+        expected = _reference_payoffs(config, case_inputs, individual_share)
+        actual = _engine_payoffs(config, case_inputs, individual_share)
+        assert actual == expected, (
+            f"Payoff engine mismatch on random case {case_number}: "
+            f"config={config} expected={expected} actual={actual}"
+        )
+
+
 class PlayerBot(Bot):
     def play_round(self):
         if (
@@ -359,6 +1662,10 @@ class PlayerBot(Bot):
             return
 
         assert_grouping(self.player)
+        assert_creating_session_checks_headcount(self.player)
+        assert_group_formation(self.player)
+        assert_history_snapshot(self.player)
+        assert_page_query_budget(self.player, pages.Contribution)
 
         treatment = self.session.config.get("treatment_name", "fixed")
         bot_rules = {
@@ -371,13 +1678,24 @@ class PlayerBot(Bot):
         power_transfer_allowed = self.session.config.get("power_transfer_allowed")
         if power_transfer_allowed and self.player.round_number >= 3:
             transfer_amount = rules.get("power_transfer", 0.0) or 0.0
+            assert_page_query_budget(self.player, pages.PowerTransfer)
+            if self.player.round_number == 3 and ledger.has_transfer_grid(self.session):
+                off_grid = float(ledger.power_step(self.session)) / 2
+                yield SubmissionMustFail(
+                    pages.PowerTransfer,
+                    power_transfer_form(self.player, off_grid),
+                    check_html=False,
+                )
             yield Submission(
                 pages.PowerTransfer,
                 power_transfer_form(self.player, transfer_amount),
                 check_html=False,
+                timeout_happened=_bot_times_out(self.player, TRANSFER_TIMEOUT),
             )
             _record_page_completion(self.player, "PowerTransfer")
             yield pages.PowerTransferResult
+            assert_result_snapshot(self.player, "power_transfer")
+            assert_power_ledger(self.player)
             _record_page_completion(self.player, "PowerTransferResult")
 
         assert_contribution_budget(self.player)
@@ -403,16 +1721,28 @@ class PlayerBot(Bot):
             check_html=False,
         )
         _record_page_completion(self.player, "Contribution")
-        yield pages.ContributionResult
+        yield Submission(
+            pages.ContributionResult,
+            check_html=False,
+            timeout_happened=_bot_times_out(self.player, RESULT_TIMEOUT),
+        )
         assert_contribution_balance(self.player)
+        assert_wait_page_watchdog_idle(self.player)
+        assert_wait_page_live_progress(self.player)
         _record_page_completion(self.player, "ContributionResult")
 
         if self.player.round_number == 1:
+            assert_result_snapshot(self.player, "contribution", "round")
             yield pages.RoundResult
             _record_page_completion(self.player, "RoundResult")
 
         if self.player.round_number > 1:
             punishment_points = rules.get("punishment", 0) or 0
+            assert_page_query_budget(self.player, pages.Punishment)
+            assert_static_bundles(self.player, self.html)
+            assert_page_compression(self.player)
+            assert_validation_parity(self.player, self.html)
+            assert_punishment_preview(self.player, self.html)
             yield Submission(
                 pages.Punishment,
                 punishment_form(self.player, punishment_points),
@@ -421,10 +1751,24 @@ class PlayerBot(Bot):
             _record_page_completion(self.player, "Punishment")
             yield pages.PunishmentResult
             assert_punishment_balance(self.player)
+            assert_payoff_engine_matches_reference(self.player)
+            assert_result_snapshot(self.player, "punishment", "round")
             assert_punishment_overdraw_allowed(self.player)
+            assert_checkpoint_resume(self.player)
             _record_page_completion(self.player, "PunishmentResult")
             yield pages.RoundResult
             _record_page_completion(self.player, "RoundResult")
+            assert_simulator_matches_session(self.player, rules)
+            assert_dropout_autoplay_matches_timeouts(self.player, rules)
+            assert_group_wait_agents_match_timeouts(self.player, rules)
+            assert_merged_result_page_matches(self.player, rules)
+            assert_page_timing(self.player, rules)
+            assert_live_metrics(self.player, rules)
+            assert_benchmark_case(self.player, rules)
+            assert_parameter_sweep(self.player)
+            assert_event_log_replay(self.player, rules)
+            assert_edge_export(self.player)
+            assert_columnar_tables(self.player)
 
         if self.player.round_number == Constants.num_rounds:
             yield pages.FinalResult
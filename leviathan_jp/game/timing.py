@@ -0,0 +1,287 @@
+# game/timing.py
+
+"""
+Server-time instrumentation for the game's page methods.
+
+instrument_pages() wraps vars_for_template, before_next_page, error_message
+and after_all_players_arrive of every page in page_sequence. When a
+session's config sets page_timing, each call records into an in-memory
+histogram keyed by (page, method, round, group size), where the group size
+is the size of the caller's own group (smaller groups formed at
+ExperimentGroupWait get their own rows):
+
+- wall time, in fixed millisecond buckets, plus count, total and max
+- SQL statements executed during the call (one engine listener, installed
+  the first time a call is timed)
+- payload size, only when the config also sets page_timing_payload: the
+  JSON size of the vars_for_template dict, and the length of an
+  error_message result. It costs one JSON encoding per call, so it is off by
+  default and recorded as 0
+
+With page_timing off, a wrapped call costs one config lookup. A timed method
+called from inside another timed call (MergedResult's vars_for_template
+runs the result pages' own) is not recorded again; its time belongs to the
+outer call.
+
+The histogram lives in the server process and covers every session that
+has timing on. To read it:
+
+- the game app's admin report (session page, "Reports" tab) shows the rows
+  of the selected round
+- snapshot() returns every row, and dump(path) writes them as JSON
+- with page_timing_file set, the rows are written to that file every
+  DUMP_EVERY timed calls and when the process exits
+"""
+
+import atexit
+import functools
+import inspect
+import json
+import os
+import threading
+import time
+
+from .models import group_size, player_group_size
+
+
+TIMED_METHODS = ('vars_for_template', 'before_next_page', 'error_message', 'after_all_players_arrive')
+
+# Upper bounds (ms) of the wall-time buckets; slower calls go in a last, open bucket
+BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+# Timed calls between two writes of page_timing_file
+DUMP_EVERY = 500
+
+# (page, method, round_number, group_size) -> Histogram
+_HISTOGRAMS = {}
+
+# SQL statements executed by this process since the listener was installed
+_QUERIES = [0]
+_listening = False
+
+# Per thread: True while a timed call is running
+_active = threading.local()
+
+# page_timing_file paths seen in this process, and timed calls since the last write
+_DUMP_PATHS = set()
+_since_dump = [0]
+
+
+class Histogram:
+    __slots__ = ('count', 'total_ms', 'max_ms', 'buckets', 'queries', 'max_queries', 'payload_bytes', 'max_payload_bytes')
+
+    def __init__(self):
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.buckets = [0] * (len(BUCKETS_MS) + 1)
+        self.queries = 0
+        self.max_queries = 0
+        self.payload_bytes = 0
+        self.max_payload_bytes = 0
+
+    def add(self, ms, queries, payload_bytes):
+        self.count += 1
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+        index = 0
+        while index < len(BUCKETS_MS) and ms > BUCKETS_MS[index]:
+            index += 1
+        self.buckets[index] += 1
+        self.queries += queries
+        self.max_queries = max(self.max_queries, queries)
+        self.payload_bytes += payload_bytes
+        self.max_payload_bytes = max(self.max_payload_bytes, payload_bytes)
+
+    def merge(self, other):
+        self.count += other.count
+        self.total_ms += other.total_ms
+        self.max_ms = max(self.max_ms, other.max_ms)
+        self.buckets = [mine + theirs for mine, theirs in zip(self.buckets, other.buckets)]
+        self.queries += other.queries
+        self.max_queries = max(self.max_queries, other.max_queries)
+        self.payload_bytes += other.payload_bytes
+        self.max_payload_bytes = max(self.max_payload_bytes, other.max_payload_bytes)
+
+    def quantile_ms(self, q):
+        """Upper bound of the bucket holding the q-quantile (max_ms for the open bucket)."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.buckets):
+            seen += bucket_count
+            if seen >= rank:
+                return float(BUCKETS_MS[index]) if index < len(BUCKETS_MS) else self.max_ms
+        return self.max_ms
+
+
+def _count_query(*args, **kwargs):
+    _QUERIES[0] += 1
+
+
+def _listen_queries():
+    global _listening
+    if _listening:
+        return
+    from sqlalchemy import event
+    from otree.database import engine
+
+    event.listen(engine, 'before_cursor_execute', _count_query)
+    _listening = True
+
+
+def _payload_bytes(method, result):
+    if not result:
+        return 0
+    if method == 'vars_for_template':
+        return len(json.dumps(result, default=str, ensure_ascii=False).encode('utf-8'))
+    if method == 'error_message':
+        text = result if isinstance(result, str) else json.dumps(result, default=str, ensure_ascii=False)
+        return len(text.encode('utf-8'))
+    return 0
+
+
+def _timing_config(target):
+    session = getattr(target, 'session', None)
+    config = getattr(session, 'config', None)
+    if not config or not config.get('page_timing'):
+        return None
+    return session
+
+
+def record(page_name, method, round_number, size, ms, queries=0, payload_bytes=0):
+    key = (page_name, method, round_number, size)
+    histogram = _HISTOGRAMS.get(key)
+    if histogram is None:
+        histogram = _HISTOGRAMS[key] = Histogram()
+    histogram.add(ms, queries, payload_bytes)
+
+
+def _group_size(target, session):
+    """Size of the target's own group; target is a Player or, on wait pages, a Group."""
+    if session.config.get('group_wait_max_seconds') is None:
+        return group_size(session)
+    if hasattr(target, 'participant'):
+        return player_group_size(target)
+    return len(target.get_players())
+
+
+def _timed(page_name, method, func):
+    @functools.wraps(func)
+    def timed(*args, **kwargs):
+        target = args[0] if args else next(iter(kwargs.values()), None)
+        session = _timing_config(target)
+        if session is None or getattr(_active, 'timing', False):
+            return func(*args, **kwargs)
+        _listen_queries()
+        queries_before = _QUERIES[0]
+        _active.timing = True
+        start = time.perf_counter()
+        try:
+            result = func(*args, **kwargs)
+        finally:
+            _active.timing = False
+        ms = (time.perf_counter() - start) * 1000
+        queries = _QUERIES[0] - queries_before
+        record(
+            page_name,
+            method,
+            target.round_number,
+            _group_size(target, session),
+            ms,
+            queries,
+            _payload_bytes(method, result) if session.config.get('page_timing_payload', False) else 0,
+        )
+        _after_record(session)
+        return result
+
+    return timed
+
+
+def instrument_pages(page_classes):
+    """Wrap the timed methods that each page class defines or inherits from game code."""
+    for page in page_classes:
+        for method in TIMED_METHODS:
+            attribute = inspect.getattr_static(page, method, None)
+            if not isinstance(attribute, staticmethod):
+                continue
+            func = inspect.unwrap(attribute.__func__)
+            if not func.__module__.startswith(__package__):
+                continue
+            setattr(page, method, staticmethod(_timed(page.__name__, method, func)))
+
+
+def snapshot(round_number=None, merge_rounds=False):
+    """
+    Histogram rows, slowest total first. round_number keeps only that round;
+    merge_rounds combines the rounds of each page, method and group size
+    (their round_number is None).
+    """
+    histograms = {}
+    for (page_name, method, row_round, size), histogram in _HISTOGRAMS.items():
+        if round_number is not None and row_round != round_number:
+            continue
+        if merge_rounds:
+            key = (page_name, method, None, size)
+            merged = histograms.get(key)
+            if merged is None:
+                merged = histograms[key] = Histogram()
+            merged.merge(histogram)
+        else:
+            histograms[(page_name, method, row_round, size)] = histogram
+    rows = []
+    for (page_name, method, row_round, size), histogram in histograms.items():
+        count = histogram.count
+        rows.append(
+            dict(
+                page=page_name,
+                method=method,
+                round_number=row_round,
+                group_size=size,
+                count=count,
+                total_ms=round(histogram.total_ms, 3),
+                mean_ms=round(histogram.total_ms / count, 3) if count else 0.0,
+                p50_ms=histogram.quantile_ms(0.5),
+                p95_ms=histogram.quantile_ms(0.95),
+                max_ms=round(histogram.max_ms, 3),
+                buckets=dict(zip([f'le_{bound}' for bound in BUCKETS_MS] + ['inf'], histogram.buckets)),
+                mean_queries=round(histogram.queries / count, 2) if count else 0.0,
+                max_queries=histogram.max_queries,
+                mean_payload_bytes=round(histogram.payload_bytes / count) if count else 0,
+                max_payload_bytes=histogram.max_payload_bytes,
+            )
+        )
+    rows.sort(key=lambda row: row['total_ms'], reverse=True)
+    return rows
+
+
+def reset():
+    _HISTOGRAMS.clear()
+
+
+def dump(path):
+    """Write every histogram row to path as JSON (atomically)."""
+    directory = os.path.dirname(path) or '.'
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as dump_file:
+        json.dump(dict(written_at=time.time(), rows=snapshot()), dump_file, indent=1)
+    os.replace(tmp_path, path)
+
+
+def _after_record(session):
+    path = session.config.get('page_timing_file')
+    if not path:
+        return
+    _DUMP_PATHS.add(path)
+    _since_dump[0] += 1
+    if _since_dump[0] >= DUMP_EVERY:
+        _since_dump[0] = 0
+        dump(path)
+
+
+@atexit.register
+def dump_all():
+    for path in _DUMP_PATHS:
+        dump(path)
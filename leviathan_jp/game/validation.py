@@ -0,0 +1,191 @@
+# game/validation.py
+
+"""
+Form validation rules shared by the server and the browser.
+
+A page describes its checks once, as a JSON-serializable spec built from
+the rules below:
+
+    number_rule    one numeric field: required, finite, min/max, integer
+    edge_rule      a {"target id": amount} JSON field (punishment_edges,
+                   power_transfer_edges): allowed targets, non-negative,
+                   integer, per-target maximum, transfer-unit grid and a
+                   total in units
+    answers_rule   quiz answers that must all equal the expected values
+    required_rule  fields that must all be filled in
+
+The page's error_message returns validate(spec, values), which stays the
+authoritative check. js_vars passes client_spec(spec) to the page as
+js_vars.validation: the same rules, except that answers rules become
+required rules, so quiz answer keys never reach the browser.
+_assets/validation.js applies it to the form before the form is submitted,
+so invalid input is rejected without a round trip, with the same message.
+Each rule carries its own messages.
+
+Transfer amounts are compared on integers, as in game.ledger. The unit step
+is sent as step_units / step_scale (e.g. 1 / 10 for 0.1), and an amount,
+rounded to INPUT_DECIMALS decimals, counts as units of that step.
+"""
+
+import json
+import math
+from decimal import Decimal
+
+from . import ledger
+
+
+# Scaled-integer resolution of submitted amounts (same as ledger.INPUT_DECIMALS)
+INPUT_DECIMALS = ledger.INPUT_DECIMALS
+
+
+def number_rule(field, messages, minimum=None, maximum=None, integer=False):
+    """messages: required, not_finite, range, integer."""
+    return dict(kind='number', field=field, min=minimum, max=maximum, integer=integer, messages=messages)
+
+
+def edge_rule(field, targets, messages, integer=False, max_each=None, step=None, grid=False, max_total_units=None):
+    """
+    messages: malformed, negative, integer, max_each, grid, max_total.
+    step (a Decimal) is needed for grid and max_total_units.
+    """
+    rule = dict(
+        kind='edges',
+        field=field,
+        targets=sorted(int(target) for target in targets),
+        integer=integer,
+        max_each=max_each,
+        grid=grid,
+        max_total_units=max_total_units,
+        messages=messages,
+    )
+    if step is not None:
+        rule['step_scale'] = 10 ** max(0, -step.as_tuple().exponent)
+        rule['step_units'] = int(step * rule['step_scale'])
+    return rule
+
+
+def answers_rule(expected, message, required_message):
+    """Server-only; client_spec() sends required_message for unanswered fields instead."""
+    return dict(kind='answers', expected=dict(expected), message=message, required_message=required_message)
+
+
+def required_rule(fields, message):
+    return dict(kind='required', fields=list(fields), message=message)
+
+
+def spec(*rules):
+    return dict(rules=list(rules))
+
+
+def client_spec(form_spec):
+    """The spec for js_vars: answers rules become required rules over the same fields."""
+    return spec(
+        *(
+            required_rule(sorted(rule['expected']), rule['required_message']) if rule['kind'] == 'answers' else rule
+            for rule in form_spec['rules']
+        )
+    )
+
+
+def parse_edges(raw, targets):
+    """
+    Parse a submitted {"target id": amount} JSON object.
+    Returns None when the payload is malformed or names a target not in targets.
+    """
+    if raw in (None, ''):
+        return {}
+    try:
+        data = json.loads(raw)
+    except (TypeError, ValueError):
+        return None
+    if not isinstance(data, dict):
+        return None
+    edges = {}
+    for key, value in data.items():
+        try:
+            target = int(key)
+            amount = float(value)
+        except (TypeError, ValueError):
+            return None
+        if target not in targets:
+            return None
+        edges[target] = amount
+    return edges
+
+
+def _round_half_even(numerator, denominator):
+    quotient, remainder = divmod(numerator, denominator)
+    if 2 * remainder > denominator or (2 * remainder == denominator and quotient % 2):
+        quotient += 1
+    return quotient
+
+
+def amount_units(amount, rule):
+    """(units, exact) of one amount on the rule's step, as ledger.power_units/exact_power_units."""
+    scaled = int(Decimal(str(round(amount, INPUT_DECIMALS))) * 10 ** INPUT_DECIMALS)
+    numerator = scaled * rule['step_scale']
+    denominator = rule['step_units'] * 10 ** INPUT_DECIMALS
+    return _round_half_even(numerator, denominator), numerator % denominator == 0
+
+
+def _check_number(rule, values):
+    messages = rule['messages']
+    value = values.get(rule['field'])
+    if value is None:
+        return messages['required']
+    amount = float(value)
+    if not math.isfinite(amount):
+        return messages['not_finite']
+    if (rule['min'] is not None and amount < rule['min']) or (rule['max'] is not None and amount > rule['max']):
+        return messages['range']
+    if rule['integer'] and not amount.is_integer():
+        return messages['integer']
+    return None
+
+
+def _check_edges(rule, values):
+    messages = rule['messages']
+    edges = parse_edges(values.get(rule['field']), set(rule['targets']))
+    if edges is None:
+        return messages['malformed']
+    total_units = 0
+    for target in sorted(edges):
+        amount = edges[target]
+        if not math.isfinite(amount) or amount < 0:
+            return messages['negative']
+        if rule['integer'] and int(amount) != amount:
+            return messages['integer']
+        if rule['max_each'] is not None and amount > rule['max_each']:
+            return messages['max_each']
+        if 'step_units' in rule:
+            units, exact = amount_units(amount, rule)
+            if rule['grid'] and not exact:
+                return messages['grid']
+            total_units += units
+    if rule['max_total_units'] is not None and total_units > rule['max_total_units']:
+        return messages['max_total']
+    return None
+
+
+def _check_answers(rule, values):
+    if any(values.get(field) != answer for field, answer in rule['expected'].items()):
+        return rule['message']
+    return None
+
+
+def _check_required(rule, values):
+    if any(values.get(field) is None for field in rule['fields']):
+        return rule['message']
+    return None
+
+
+CHECKS = dict(number=_check_number, edges=_check_edges, answers=_check_answers, required=_check_required)
+
+
+def validate(form_spec, values):
+    """The first rule message that values violate, or None."""
+    for rule in form_spec['rules']:
+        message = CHECKS[rule['kind']](rule, values)
+        if message:
+            return message
+    return None
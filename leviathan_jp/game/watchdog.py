@@ -0,0 +1,87 @@
+# game/watchdog.py
+
+"""
+Stalled-group watchdog for the game's wait pages.
+
+oTree's timeout worker only runs under prodserver. It can also only submit a
+page whose timeout was scheduled when that page was loaded. So if a
+participant's tab closes before the next page loads, that page never times
+out, and the wait page after it blocks the rest of the group indefinitely.
+
+Waiting browsers ping their wait page's live_method every few seconds, and
+every ping (like every render of the wait page) calls release_stalled(). The
+first call at a wait page records when that player started waiting. Once
+the earliest waiting member of a group has waited longer than the session's
+wait_page_stall_seconds, the watchdog advances the members who have not
+reached the wait page, the same way as the admin "advance slowest
+participants" button: each one's current page is submitted as a timeout
+until they reach the wait page. Every forced
+submission runs that page's before_next_page with timeout_happened=True, so
+the timeout streak and dropout marking behave exactly as for a real timeout.
+"""
+
+import time
+
+
+# Safety bound on the pages forced for one participant in one check
+MAX_FORCED_PAGES = 20
+
+
+def stall_threshold(session):
+    """Seconds a group may wait before the watchdog steps in, or None when disabled."""
+    value = session.config.get('wait_page_stall_seconds', 120)
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return value if value > 0 else None
+
+
+def waiting_since(participant):
+    """Record (once per wait page) and return when this participant started waiting."""
+    page_index = participant._index_in_pages
+    mark = participant.vars.get('wait_page_since')
+    if not mark or mark[0] != page_index:
+        mark = [page_index, time.time()]
+        participant.vars['wait_page_since'] = mark
+    return mark[1]
+
+
+def stalled_members(members, page_index, threshold, now=None):
+    """
+    Participants among members who are still behind the wait page at page_index,
+    once the group has been waiting there for more than threshold seconds.
+    """
+    participants = [member.participant for member in members]
+    missing = [pp for pp in participants if pp._index_in_pages < page_index]
+    if not missing or threshold is None:
+        return []
+    marks = [pp.vars.get('wait_page_since') for pp in participants]
+    started = [mark[1] for mark in marks if mark and mark[0] == page_index]
+    if not started:
+        return []
+    now = time.time() if now is None else now
+    if now - min(started) <= threshold:
+        return []
+    return missing
+
+
+def release_stalled(player, members):
+    """
+    Called from a wait page's vars_for_template and live_method: force the timeouts of
+    group members who keep the group waiting past the stall threshold. Returns the
+    participants advanced.
+    """
+    participant = player.participant
+    waiting_since(participant)
+    page_index = participant._index_in_pages
+    missing = stalled_members(members, page_index, stall_threshold(player.session))
+    for pp in missing:
+        for _ in range(MAX_FORCED_PAGES):
+            if pp._index_in_pages >= page_index:
+                break
+            before = pp._index_in_pages
+            player.session.advance_selected_participants([pp])
+            if pp._index_in_pages == before:
+                break
+    return missing
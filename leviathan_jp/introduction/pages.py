@@ -1,7 +1,10 @@
 from otree.api import Page
 
+from game import grouping, quiz, validation
+
 
 def _base_vars(player, intro_stage):
+    grouping.record_intro_start(player)
     session = player.session
     return dict(
         intro_stage=intro_stage,
@@ -14,7 +17,38 @@ def _base_vars(player, intro_stage):
     )
 
 
-class InvestmentInstruction(Page):
+def _investment_quiz_rules():
+    return quiz.rules(
+        quiz.INVESTMENT_ANSWERS,
+        "投資ルールの解答が正しくありません。説明を確認して再回答してください。",
+    )
+
+
+def _punishment_quiz_rules():
+    return quiz.rules(
+        quiz.PUNISHMENT_ANSWERS,
+        "減点ルールの解答が正しくありません。説明を確認して再回答してください。",
+    )
+
+
+def _power_rule_quiz_rules(player):
+    config = player.session.config
+    if config.get("power_transfer_allowed"):
+        message = "減点効果移譲ルールの解答が正しくありません。説明を確認して再回答してください。"
+    else:
+        message = "固定条件の進行ルールの解答が正しくありません。説明を確認して再回答してください。"
+    return quiz.rules(quiz.power_rule_answers(config), message)
+
+
+class IntroPage(Page):
+    """Records each completed page, which ExperimentGroupWait uses to predict arrivals."""
+
+    @staticmethod
+    def before_next_page(player, timeout_happened):
+        grouping.record_intro_page(player)
+
+
+class InvestmentInstruction(IntroPage):
     template_name = "introduction/RuleInstruction.html"
 
     @staticmethod
@@ -22,7 +56,7 @@ class InvestmentInstruction(Page):
         return _base_vars(player, "round1")
 
 
-class InvestmentQuiz(Page):
+class InvestmentQuiz(IntroPage):
     template_name = "introduction/RuleQuiz.html"
     form_model = "player"
     form_fields = ["intro1_q1", "intro1_q2", "intro1_q3", "intro1_q4"]
@@ -31,14 +65,16 @@ class InvestmentQuiz(Page):
     def vars_for_template(player):
         return _base_vars(player, "round1")
 
+    @staticmethod
+    def js_vars(player):
+        return dict(validation=validation.client_spec(_investment_quiz_rules()))
+
     @staticmethod
     def error_message(player, values):
-        expected = dict(intro1_q1=2, intro1_q2=2, intro1_q3=3, intro1_q4=3)
-        if any(values.get(k) != v for k, v in expected.items()):
-            return "投資ルールの解答が正しくありません。説明を確認して再回答してください。"
+        return validation.validate(_investment_quiz_rules(), values)
 
 
-class PunishmentInstruction(Page):
+class PunishmentInstruction(IntroPage):
     template_name = "introduction/RuleInstruction.html"
 
     @staticmethod
@@ -46,7 +82,7 @@ class PunishmentInstruction(Page):
         return _base_vars(player, "round2")
 
 
-class PunishmentQuiz(Page):
+class PunishmentQuiz(IntroPage):
     template_name = "introduction/RuleQuiz.html"
     form_model = "player"
     form_fields = ["intro2_q1", "intro2_q2", "intro2_q3"]
@@ -55,14 +91,16 @@ class PunishmentQuiz(Page):
     def vars_for_template(player):
         return _base_vars(player, "round2")
 
+    @staticmethod
+    def js_vars(player):
+        return dict(validation=validation.client_spec(_punishment_quiz_rules()))
+
     @staticmethod
     def error_message(player, values):
-        expected = dict(intro2_q1=3, intro2_q2=3, intro2_q3=3)
-        if any(values.get(k) != v for k, v in expected.items()):
-            return "減点ルールの解答が正しくありません。説明を確認して再回答してください。"
+        return validation.validate(_punishment_quiz_rules(), values)
 
 
-class PowerRuleInstruction(Page):
+class PowerRuleInstruction(IntroPage):
     template_name = "introduction/RuleInstruction.html"
 
     @staticmethod
@@ -70,7 +108,7 @@ class PowerRuleInstruction(Page):
         return _base_vars(player, "round3")
 
 
-class PowerRuleQuiz(Page):
+class PowerRuleQuiz(IntroPage):
     template_name = "introduction/RuleQuiz.html"
     form_model = "player"
 
@@ -84,22 +122,17 @@ class PowerRuleQuiz(Page):
     def vars_for_template(player):
         return _base_vars(player, "round3")
 
+    @staticmethod
+    def js_vars(player):
+        return dict(validation=validation.client_spec(_power_rule_quiz_rules(player)))
+
     @staticmethod
     def error_message(player, values):
-        if player.session.config.get("power_transfer_allowed"):
-            expected_q1 = 3 if player.session.config.get("costly_punishment_transfer") else 1
-            expected = dict(
-                intro3_transfer_q1=expected_q1,
-                intro3_transfer_q2=2,
-                intro3_transfer_q3=2,
-            )
-            if any(values.get(k) != v for k, v in expected.items()):
-                return "減点効果移譲ルールの解答が正しくありません。説明を確認して再回答してください。"
-        elif values.get("intro3_fixed_q1") != 1:
-            return "固定条件の進行ルールの解答が正しくありません。説明を確認して再回答してください。"
+        return validation.validate(_power_rule_quiz_rules(player), values)
 
     @staticmethod
     def before_next_page(player, timeout_happened):
+        grouping.record_intro_page(player)
         player.participant.vars["rules_completed"] = True
 
 
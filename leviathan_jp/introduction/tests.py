@@ -1,5 +1,6 @@
 import logging
 import random
+import tempfile
 
 from otree.api import Bot, Submission, SubmissionMustFail
 from otree.database import db
@@ -48,6 +49,16 @@ def _setup_bot_identity(player_bot):
     db.commit()
 
 
+def _enable_bot_event_log(session):
+    """Log the game's events for the whole bot run; game/tests.py replays the log against the database."""
+    if session.config.get("use_browser_bots") or session.config.get("event_log_dir"):
+        return
+    session.config = dict(
+        session.config, event_log_dir=tempfile.mkdtemp(prefix="leviathan_bot_events_")
+    )
+    db.commit()
+
+
 def _wrong_power_rule_form(player):
     if player.session.config.get('power_transfer_allowed'):
         return dict(
@@ -74,6 +85,7 @@ def _disable_browser_bot(participant):
 class PlayerBot(Bot):
     def play_round(self):
         _setup_bot_identity(self)
+        _enable_bot_event_log(self.session)
         if (
             self.session.config.get("use_browser_bots")
             and _browser_bot_stop_stage(self.session) == "introduction"
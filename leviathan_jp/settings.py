@@ -36,10 +36,25 @@ SESSION_CONFIG_DEFAULTS = dict(
     decision_timeout_seconds=30,
     dropout_timeout_pages=3,
     auto_advance_timeout_seconds=1,
+    dropout_server_autoplay=False,
+    wait_page_stall_seconds=120,
+    merged_result_page=False,
+    event_log_dir=None,
+    checkpoint_dir=None,
+    page_timing=False,
+    page_timing_file=None,
+    page_timing_payload=False,
+    compress_pages=True,
+    metrics_port=None,
     early_stop_min_rounds=14,
     early_stop_dropout_count=1,
     non_decision_timeout_seconds=30,
     group_by_arrival_time=True,
+    group_wait_max_seconds=None,
+    group_wait_fallback='smaller',
+    group_wait_min_size=2,
+    group_wait_agent_seats=0,
+    history_modal_lazy=False,
     browser_bot_stop_stage='game',
     browser_bot_stop_round=3,
 )